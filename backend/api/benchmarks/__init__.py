@@ -0,0 +1,5 @@
+"""
+Query-count and latency benchmarks for the API.
+
+See api.benchmarks.runner and the benchmark_api management command.
+"""
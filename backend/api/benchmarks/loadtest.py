@@ -0,0 +1,130 @@
+"""
+Concurrent HTTP load test for comparing the sync and async API paths.
+
+Runs against a live server, with no dependencies beyond the standard
+library. For example, to compare note lists under 100 concurrent clients::
+
+    python -m api.benchmarks.loadtest http://localhost:8000 --token KEY \\
+        --path /api/v1/notes/ --path /api/v1/async/notes/ --concurrency 100
+
+or autosave traffic against one note::
+
+    python -m api.benchmarks.loadtest http://localhost:8000 --token KEY \\
+        --method PATCH --body '{"content": "draft"}' \\
+        --path /api/v1/notes/1/ --path /api/v1/async/notes/1/
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from api.benchmarks.stats import percentile
+
+logger = logging.getLogger(__name__)
+
+
+async def request(host, port, raw, ssl):
+    reader, writer = await asyncio.open_connection(host, port, ssl=ssl)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+def build_request(url, path, method, token, body):
+    parts = urlsplit(url)
+    headers = [
+        f"{method} {path} HTTP/1.1",
+        f"Host: {parts.netloc}",
+        "Connection: close",
+        "Accept: application/json",
+    ]
+    if token:
+        headers.append(f"Authorization: Token {token}")
+    payload = body.encode() if body else b""
+    if payload:
+        headers.append("Content-Type: application/json")
+    headers.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + payload
+
+
+async def run_path(url, path, method="GET", token=None, body=None,
+                   concurrency=50, duration=10.0):
+    """
+    Keep ``concurrency`` clients requesting ``path`` for ``duration``
+    seconds and return the throughput and latency percentiles.
+    """
+    parts = urlsplit(url)
+    ssl = parts.scheme == "https"
+    port = parts.port or (443 if ssl else 80)
+    raw = build_request(url, path, method, token, body)
+    timings = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await request(parts.hostname, port, raw, ssl)
+            except OSError:
+                status = None
+            if status is None or status >= 400:
+                errors += 1
+            else:
+                timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "method": method,
+        "concurrency": concurrency,
+        "requests": len(timings),
+        "errors": errors,
+        "rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 50) * 1000, 3) if timings else None,
+        "p99_ms": round(percentile(timings, 99) * 1000, 3) if timings else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url", help="Base URL of the server, e.g. http://localhost:8000")
+    parser.add_argument("--path", action="append", required=True, help="Path to load (repeatable).")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--token", help="API token of the user to authenticate as.")
+    parser.add_argument("--body", help="JSON request body.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per path.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    results = []
+    for path in args.path:
+        result = asyncio.run(run_path(
+            args.url, path, args.method.upper(), args.token, args.body,
+            args.concurrency, args.duration,
+        ))
+        results.append(result)
+        logger.info(
+            "%s %s: %s req/s, p50=%sms p99=%sms, %s errors",
+            result["method"], path, result["rps"],
+            result["p50_ms"], result["p99_ms"], result["errors"],
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Benchmark runner for the API routes.
+
+For every dataset size a user is seeded with that many notes, each route
+is requested a number of times and the number of queries, the p50/p99
+latency and the size of the response body are recorded. Seeding and
+requests run inside a transaction that is rolled back, so a run leaves the
+database as it found it.
+
+Query counts of most routes must not depend on the number of notes the
+user has; query_growth() reports the routes for which they do.
+"""
+import json
+import platform
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import timedelta
+from io import BytesIO
+from itertools import count
+from typing import Callable, Optional
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.benchmarks.stats import percentile
+from api.notes.models import Note, NoteCounter
+from api.notes.sync import SyncCursor
+from api.users.models import Category
+
+DEFAULT_SIZES = (1, 100, 10_000, 100_000)
+DEFAULT_ITERATIONS = 20
+SEED_BATCH_SIZE = 5000
+SEED_CATEGORIES = 5
+BENCHMARK_PASSWORD = 'benchmark-password'
+SEED_COLOR = '#4A90D9'
+
+WORDS = (
+    'meeting agenda project idea draft review budget travel recipe list '
+    'follow up call design notes weekly plan release bug report summary '
+    'reading book quote research todo reminder grocery workout journal'
+).split()
+
+
+class Context:
+    """
+    The seeded data a benchmark run works against.
+    """
+    def __init__(self, user, categories, notes):
+        self.user = user
+        self.categories = categories
+        self.category = categories[0]
+        self.note = notes[0]
+        self.sequence = count()
+
+    def next(self):
+        return next(self.sequence)
+
+    def new_note(self):
+        return Note.objects.create(
+            user=self.user, category=self.category, title='Scratch note'
+        )
+
+    def new_category(self):
+        return Category.objects.create(
+            user=self.user, name=f'Scratch category {self.next()}', color=SEED_COLOR
+        )
+
+    def note_version(self):
+        return Note.objects.values_list('version', flat=True).get(pk=self.note.pk)
+
+
+@dataclass
+class Route:
+    """
+    A request to benchmark. ``path`` and ``data`` are called with the
+    Context before every request and are not timed; ``constant_queries``
+    is False for routes that are expected to scale with the data.
+    """
+    name: str
+    method: str
+    path: Callable
+    data: Optional[Callable] = None
+    format: Optional[str] = 'json'
+    authenticated: bool = True
+    constant_queries: bool = True
+    params: dict = field(default_factory=dict)
+
+
+def _import_file(ctx):
+    line = json.dumps({'title': f'Imported {ctx.next()}', 'category': {'id': ctx.category.id}})
+    upload = BytesIO(line.encode())
+    upload.name = 'notes.ndjson'
+    return {'file': upload}
+
+
+def _sync_since(ctx):
+    # A cursor from before seeding, so the seeded notes are sent as changes
+    cursor = SyncCursor(timezone.now() - timedelta(hours=1))
+    return '?' + urlencode({'since': cursor.encode()})
+
+
+ROUTES = [
+    Route('notes.list', 'get', lambda ctx: reverse('note-list')),
+    Route(
+        'notes.list.cursor', 'get', lambda ctx: reverse('note-list'),
+        params={'pagination': 'cursor'},
+    ),
+    Route(
+        'notes.list.compact', 'get', lambda ctx: reverse('note-list'),
+        params={'compact': '1'},
+    ),
+    Route(
+        'notes.list.category', 'get',
+        lambda ctx: reverse('note-list') + f'?category_id={ctx.category.id}',
+    ),
+    Route(
+        'notes.list.search', 'get', lambda ctx: reverse('note-list'),
+        params={'search': 'project plan'},
+    ),
+    Route('notes.retrieve', 'get', lambda ctx: reverse('note-detail', args=[ctx.note.pk])),
+    Route(
+        'notes.create', 'post', lambda ctx: reverse('note-list'),
+        data=lambda ctx: {'title': 'New note', 'content': 'Body', 'category_id': ctx.category.id},
+    ),
+    Route(
+        'notes.update', 'patch', lambda ctx: reverse('note-detail', args=[ctx.note.pk]),
+        data=lambda ctx: {'title': f'Renamed {ctx.next()}'},
+    ),
+    Route(
+        'notes.delta', 'post', lambda ctx: reverse('note-delta', args=[ctx.note.pk]),
+        data=lambda ctx: {
+            'base_version': ctx.note_version(),
+            'operations': [{'position': 0, 'insert': 'x'}],
+        },
+    ),
+    Route(
+        'notes.revisions', 'get', lambda ctx: reverse('note-revisions', args=[ctx.note.pk]),
+    ),
+    Route(
+        'notes.revision', 'get',
+        # The routes above changed the note, so its previous version is kept
+        lambda ctx: reverse('note-revision', args=[ctx.note.pk, ctx.note_version() - 1]),
+    ),
+    Route('notes.delete', 'delete', lambda ctx: reverse('note-detail', args=[ctx.new_note().pk])),
+    Route(
+        'notes.bulk', 'post', lambda ctx: reverse('note-bulk'),
+        data=lambda ctx: {'operations': [
+            {'op': 'create', 'title': 'Bulk note', 'category_id': ctx.category.id},
+            {'op': 'update', 'id': ctx.note.pk, 'title': f'Bulk {ctx.next()}'},
+            {'op': 'delete', 'id': ctx.new_note().pk},
+        ]},
+    ),
+    Route(
+        'notes.export', 'get', lambda ctx: reverse('note-export'),
+        params={'type': 'ndjson'}, constant_queries=False,
+    ),
+    Route(
+        'notes.import', 'post', lambda ctx: reverse('note-import'),
+        data=_import_file, format='multipart',
+    ),
+    Route('sync.full', 'get', lambda ctx: reverse('sync')),
+    Route('sync.incremental', 'get', lambda ctx: reverse('sync') + _sync_since(ctx)),
+    Route('categories.list', 'get', lambda ctx: reverse('category-list')),
+    Route(
+        'categories.retrieve', 'get',
+        lambda ctx: reverse('category-detail', args=[ctx.category.pk]),
+    ),
+    Route(
+        'categories.create', 'post', lambda ctx: reverse('category-list'),
+        data=lambda ctx: {'name': f'Benchmark {ctx.next()}', 'color': '#123456'},
+    ),
+    Route(
+        'categories.update', 'patch',
+        lambda ctx: reverse('category-detail', args=[ctx.category.pk]),
+        data=lambda ctx: {'name': f'Renamed {ctx.next()}'},
+    ),
+    Route(
+        'categories.delete', 'delete',
+        lambda ctx: reverse('category-detail', args=[ctx.new_category().pk]),
+    ),
+    Route('async.notes.list', 'get', lambda ctx: reverse('async-note-list')),
+    Route(
+        'async.notes.retrieve', 'get',
+        lambda ctx: reverse('async-note-detail', args=[ctx.note.pk]),
+    ),
+    Route(
+        'async.notes.update', 'patch',
+        lambda ctx: reverse('async-note-detail', args=[ctx.note.pk]),
+        data=lambda ctx: {'title': f'Async {ctx.next()}'},
+    ),
+    Route('async.categories.list', 'get', lambda ctx: reverse('async-category-list')),
+    Route(
+        'async.categories.retrieve', 'get',
+        lambda ctx: reverse('async-category-detail', args=[ctx.category.pk]),
+    ),
+    Route(
+        'async.categories.update', 'patch',
+        lambda ctx: reverse('async-category-detail', args=[ctx.category.pk]),
+        data=lambda ctx: {'name': f'Async {ctx.next()}'},
+    ),
+    Route('users.me', 'get', lambda ctx: reverse('user-me')),
+    Route('users.retrieve', 'get', lambda ctx: reverse('user-detail', args=[ctx.user.pk])),
+    Route(
+        'users.update', 'patch', lambda ctx: reverse('user-detail', args=[ctx.user.pk]),
+        data=lambda ctx: {'first_name': f'Bench {ctx.next()}'},
+    ),
+    Route(
+        'auth.register', 'post', lambda ctx: reverse('register'),
+        data=lambda ctx: {
+            'email': f'benchmark-{ctx.next()}@example.com',
+            'password': BENCHMARK_PASSWORD,
+        },
+        authenticated=False,
+    ),
+    Route(
+        'auth.token', 'post', lambda ctx: '/api/auth-token/',
+        data=lambda ctx: {'username': ctx.user.email, 'password': BENCHMARK_PASSWORD},
+        authenticated=False,
+    ),
+]
+
+
+def seed(size, categories=SEED_CATEGORIES, rng=None):
+    """
+    Create a user with ``size`` notes spread over its own categories.
+    """
+    rng = rng or random.Random(size)
+    # Seeded with the ORM rather than the test factories, which need the
+    # development requirements
+    user = get_user_model().objects.create_user(
+        f'benchmark-{uuid.uuid4().hex}@example.com', BENCHMARK_PASSWORD
+    )
+    owned = [
+        Category.objects.create(user=user, name=f'Benchmark {i}', color=SEED_COLOR)
+        for i in range(categories)
+    ]
+
+    batch = []
+    for i in range(size):
+        note = Note(
+            user=user,
+            category=owned[i % len(owned)],
+            title=' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+            content=' '.join(rng.choices(WORDS, k=rng.randint(20, 400))),
+        )
+        note.update_text_stats()
+        batch.append(note)
+        if len(batch) == SEED_BATCH_SIZE:
+            Note.objects.bulk_create(batch)
+            batch = []
+    Note.objects.bulk_create(batch)
+    # bulk_create skips save(), which keeps the note counters
+    NoteCounter.objects.reconcile(user_ids=[user.pk])
+
+    notes = list(Note.objects.filter(user=user).order_by('-id')[:1])
+    return Context(user, owned, notes)
+
+
+def _response_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(route, ctx, iterations):
+    """
+    Request a route ``iterations`` times and summarize the measurements.
+    """
+    client = APIClient()
+    if route.authenticated:
+        client.force_authenticate(user=ctx.user)
+        # The async views authenticate outside of DRF
+        client.credentials(HTTP_AUTHORIZATION=f'Token {ctx.user.auth_token.key}')
+
+    timings = []
+    queries = set()
+    transactions = set()
+    size = status_code = None
+    for _ in range(iterations):
+        path = route.path(ctx)
+        if route.method == 'get':
+            kwargs = {'data': route.params}
+        else:
+            data = route.data(ctx) if route.data else None
+            kwargs = {'data': data, 'format': route.format} if data else {}
+        request = getattr(client, route.method)
+
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request(path, **kwargs)
+            size = _response_size(response)
+            timings.append(time.perf_counter() - start)
+        status_code = response.status_code
+        # The run is wrapped in a transaction, so the transactions opened by
+        # the views show up as savepoints. They are counted separately.
+        statements = [query['sql'].upper() for query in captured.captured_queries]
+        savepoints = sum(1 for sql in statements if 'SAVEPOINT' in sql)
+        queries.add(len(statements) - savepoints)
+        transactions.add(savepoints)
+
+    return {
+        'route': route.name,
+        'method': route.method.upper(),
+        'status': status_code,
+        'queries': max(queries),
+        'queries_min': min(queries),
+        'transaction_queries': max(transactions),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'bytes': size,
+    }
+
+
+def run(sizes=DEFAULT_SIZES, iterations=DEFAULT_ITERATIONS, routes=None,
+        use_cache=False, log=None):
+    """
+    Benchmark every route at every dataset size.
+
+    Returns a report dict that can be serialized as JSON. The API response
+    cache is disabled unless ``use_cache`` is set, so that the numbers
+    reflect the work done by the views.
+    """
+    routes = ROUTES if routes is None else routes
+    results = []
+    # The test client sends requests for the 'testserver' host
+    allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+    with override_settings(API_CACHE_ENABLED=use_cache, ALLOWED_HOSTS=allowed_hosts):
+        for size in sizes:
+            with transaction.atomic():
+                if log:
+                    log(f'Seeding {size} notes')
+                ctx = seed(size)
+                for route in routes:
+                    result = measure(route, ctx, iterations)
+                    result['size'] = size
+                    results.append(result)
+                    if log:
+                        log(
+                            f"{route.name:<22} size={size:<7} queries={result['queries']:<3} "
+                            f"transaction={result['transaction_queries']:<2} "
+                            f"p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                            f"bytes={result['bytes']}"
+                        )
+                transaction.set_rollback(True)
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'sizes': list(sizes),
+        'iterations': iterations,
+        'cache': use_cache,
+        'results': results,
+    }
+
+
+def query_growth(report, routes=None):
+    """
+    Return the routes whose query count grows with the dataset size, as a
+    mapping of route name to its query count per size.
+    """
+    routes = ROUTES if routes is None else routes
+    constant = {route.name for route in routes if route.constant_queries}
+    counts = {}
+    for result in report['results']:
+        if result['route'] in constant:
+            counts.setdefault(result['route'], {})[result['size']] = result['queries']
+
+    growth = {}
+    for name, by_size in counts.items():
+        ordered = [by_size[size] for size in sorted(by_size)]
+        if any(later > ordered[0] for later in ordered[1:]):
+            growth[name] = by_size
+    return growth
@@ -0,0 +1,105 @@
+"""
+Compare the throughput of the gunicorn serving modes on the notes API.
+
+Starts gunicorn with compose/gunicorn.conf.py in each mode, loads the note
+endpoints with api.benchmarks.loadtest and stops it again. Run it from the
+backend directory with the environment of the server to test, e.g.::
+
+    python -m api.benchmarks.servers --token KEY --concurrency 100 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from api.benchmarks.loadtest import run_path
+
+logger = logging.getLogger(__name__)
+
+CONFIG = Path(__file__).resolve().parents[2] / "compose" / "gunicorn.conf.py"
+
+# Paths loaded in each mode; the async endpoints only run on an event loop
+# under uvicorn.
+MODES = {
+    "gthread": ["/api/v1/notes/"],
+    "uvicorn": ["/api/v1/notes/", "/api/v1/async/notes/"],
+}
+
+
+def wait_for_port(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited before accepting connections")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not listen on port {port} within {timeout}s")
+
+
+def benchmark_mode(mode, port, args):
+    env = {
+        **os.environ,
+        "GUNICORN_MODE": mode,
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "GUNICORN_LOG_LEVEL": "warning",
+    }
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", str(CONFIG), "--access-logfile", ""],
+        env=env,
+    )
+    try:
+        wait_for_port(port, process)
+        results = []
+        for path in MODES[mode]:
+            result = asyncio.run(run_path(
+                f"http://127.0.0.1:{port}", path, token=args.token,
+                concurrency=args.concurrency, duration=args.duration,
+            ))
+            results.append({"mode": mode, **result})
+        return results
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--token", required=True, help="API token of the user to authenticate as.")
+    parser.add_argument("--mode", action="append", choices=list(MODES), help="Mode to run (repeatable).")
+    parser.add_argument("--workers", type=int, help="Override the number of workers.")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per path.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    results = []
+    for mode in args.mode or list(MODES):
+        results.extend(benchmark_mode(mode, args.port, args))
+
+    for result in results:
+        logger.info(
+            "%-8s %-24s %8s req/s  p50=%sms p99=%sms errors=%s",
+            result["mode"], result["path"], result["rps"],
+            result["p50_ms"], result["p99_ms"], result["errors"],
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
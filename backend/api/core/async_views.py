@@ -0,0 +1,163 @@
+"""
+Base class for async-native JSON API views.
+
+DRF views are synchronous, so under ASGI every request to them runs in a
+worker thread. These views run on the event loop and use Django's async
+ORM methods. Only a thread hop is left for the work that has no async API
+(session lookups and model saves with signals).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.authentication import CSRFCheck, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.users.authentication import cache_token, get_cached_token
+
+
+class AsyncAPIView(View):
+    """
+    Async view that authenticates like the DRF API (token, then session),
+    parses JSON bodies and renders DRF exceptions as JSON error responses.
+    Subclasses implement async handlers such as ``get`` and ``patch``.
+    """
+    keyword = "Token"
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # CSRF is only enforced for session authenticated requests, as in
+        # DRF, and ATOMIC_REQUESTS cannot wrap async views; writes that need
+        # a transaction open their own.
+        view = csrf_exempt(super().as_view(**initkwargs))
+        return transaction.non_atomic_requests(view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in self.http_method_names:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+        handler = getattr(self, request.method.lower(), None)
+        if handler is None:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+        try:
+            request.user = await self.authenticate(request)
+            return await handler(request, *args, **kwargs)
+        except Http404:
+            return self.error_response(
+                {"detail": "Not found."}, status.HTTP_404_NOT_FOUND
+            )
+        except exceptions.APIException as exc:
+            detail = exc.detail
+            if not isinstance(detail, (dict, list)):
+                detail = {"detail": detail}
+            response = self.error_response(detail, exc.status_code)
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                self.set_authenticate_header(request, response)
+            return response
+
+    def set_authenticate_header(self, request, response):
+        # Like DRF, answer 401 only if the first authentication class has a
+        # WWW-Authenticate challenge, and 403 otherwise
+        authenticator = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+        header = authenticator.authenticate_header(request)
+        if header:
+            response["WWW-Authenticate"] = header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+
+    async def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if auth and auth[0].lower() == self.keyword.lower().encode():
+            if len(auth) != 2:
+                raise exceptions.AuthenticationFailed("Invalid token header.")
+            try:
+                key = auth[1].decode()
+            except UnicodeError:
+                raise exceptions.AuthenticationFailed("Invalid token.")
+            # The token cache is a blocking client, so it is read and written
+            # from a thread like the session lookup below
+            token = await sync_to_async(get_cached_token)(key)
+            if token is None:
+                try:
+                    token = await Token.objects.select_related("user").aget(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed("Invalid token.")
+                if not token.user.is_active:
+                    raise exceptions.AuthenticationFailed("User inactive or deleted.")
+                await sync_to_async(cache_token)(token)
+            return token.user
+
+        user = await sync_to_async(get_user)(request)
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        self.enforce_csrf(request)
+        return user
+
+    def enforce_csrf(self, request):
+        check = CSRFCheck(lambda request: None)
+        check.process_request(request)
+        reason = check.process_view(request, None, (), {})
+        if reason:
+            raise exceptions.PermissionDenied(f"CSRF Failed: {reason}")
+
+    def parse_json(self, request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except (ValueError, UnicodeError) as exc:
+            raise exceptions.ParseError(f"JSON parse error - {exc}")
+        if not isinstance(data, dict):
+            raise exceptions.ParseError("Expected a JSON object.")
+        return data
+
+    async def paginate(self, request, queryset):
+        """
+        Return a page of the queryset in the format of DRF's page number
+        pagination, counting with acount() and loading with async iteration.
+        """
+        page_size = api_settings.PAGE_SIZE
+        try:
+            page = int(request.GET.get("page", 1))
+            if page < 1:
+                raise ValueError
+        except ValueError:
+            raise Http404
+        count = await queryset.acount()
+        if page > 1 and (page - 1) * page_size >= count:
+            raise exceptions.NotFound("Invalid page.")
+        offset = (page - 1) * page_size
+        results = [obj async for obj in queryset[offset:offset + page_size]]
+        return {
+            "count": count,
+            "next": self.page_link(request, page + 1) if offset + page_size < count else None,
+            "previous": self.page_link(request, page - 1) if page > 1 else None,
+        }, results
+
+    def page_link(self, request, page):
+        params = request.GET.copy()
+        if page == 1:
+            params.pop("page", None)
+        else:
+            params["page"] = page
+        query = params.urlencode()
+        return request.build_absolute_uri(request.path + (f"?{query}" if query else ""))
+
+    def json_response(self, data, status=status.HTTP_200_OK, headers=None):
+        response = JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+        for name, value in (headers or {}).items():
+            response[name] = value
+        return response
+
+    def error_response(self, data, status):
+        return self.json_response(data, status=status)
+
+    def not_modified(self, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,143 @@
+"""
+Per-user response cache for API list and detail views.
+
+Cached responses are keyed by the user, the request path and two
+generation numbers: one for the user and one for data shared by every
+user (global categories). Writes invalidate by bumping a generation, so
+every cached response of the affected users is dropped at once without
+having to know their keys.
+"""
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from api.core import metrics
+
+GLOBAL_SCOPE = "global"
+
+# Hits and misses served by this process, per namespace
+stats = Counter()
+
+# Part of every response key, bumped when what is cached for a response
+# changes so that entries in the old format are never read
+RESPONSE_FORMAT = 2
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _generation_key(scope):
+    return f"api-cache:gen:{scope}"
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def _bump(scope):
+    cache = get_cache()
+    key = _generation_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Seed missing generations with the clock so that an evicted
+        # generation never comes back at a value that was used before.
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(scope):
+    """
+    Drop every cached response of a scope.
+
+    The generation is bumped right away and again once the surrounding
+    transaction commits, so a response cached from the old data by a
+    concurrent request is not served after the commit.
+    """
+    _bump(scope)
+    transaction.on_commit(lambda: _bump(scope))
+
+
+def invalidate_user(user_id):
+    invalidate(user_scope(user_id))
+
+
+def invalidate_global():
+    invalidate(GLOBAL_SCOPE)
+
+
+def _generations(cache, scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for the list and retrieve actions of a viewset.
+
+    Only successful responses are cached, as serialized data, and they are
+    rendered again on every hit, with the headers returned by
+    ``get_cached_headers``. Set ``cache_namespace`` to the key of the
+    view's timeout in the API_CACHE_TIMEOUTS setting.
+    """
+    cache_namespace = None
+
+    def get_cached_headers(self, response):
+        """
+        Return the headers to store with a response and send again on hits.
+        """
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, cache):
+        user_id = self.request.user.pk
+        generations = _generations(cache, [user_scope(user_id), GLOBAL_SCOPE])
+        path = hashlib.md5(
+            self.request.get_full_path().encode(), usedforsecurity=False
+        ).hexdigest()
+        return "api-cache:{}:{}:{}:{}:{}:{}".format(
+            RESPONSE_FORMAT, self.cache_namespace, user_id, *generations, path
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not settings.API_CACHE_ENABLED:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = self.get_cache_key(cache)
+        cached = cache.get(key)
+        if cached is not None:
+            stats[f"{self.cache_namespace}.hit"] += 1
+            metrics.incr("cache_hits")
+            status_code, data, headers = cached
+            response = Response(data, status=status_code, headers=headers)
+            response["X-Cache"] = "HIT"
+            return response
+
+        stats[f"{self.cache_namespace}.miss"] += 1
+        metrics.incr("cache_misses")
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = settings.API_CACHE_TIMEOUTS.get(self.cache_namespace)
+            cache.set(
+                key,
+                (response.status_code, response.data, self.get_cached_headers(response)),
+                timeout,
+            )
+        response["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,7 @@
+"""
+PostgreSQL backend that checks connections out of a psycopg_pool pool.
+
+Enable it by setting ENGINE to ``api.core.db.backends.postgresql_pool`` and
+passing the pool's options under OPTIONS["pool"]. CONN_MAX_AGE should be 0
+so that connections are returned to the pool at the end of each request.
+"""
@@ -0,0 +1,131 @@
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+
+from api.core import metrics
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError as e:
+    raise ImproperlyConfigured("Error loading psycopg_pool module: %s" % e)
+
+if not is_psycopg3:
+    raise ImproperlyConfigured("The pooled PostgreSQL backend requires psycopg 3.")
+
+# (pid, pool) by alias. A pool is only used by the process that opened
+# it; forked children open their own.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias):
+    pid, pool = _pools.get(alias, (None, None))
+    return pool if pid == os.getpid() else None
+
+
+def pool_stats():
+    """
+    Return the statistics of every pool of this process by alias, with the
+    number of connections in use added.
+    """
+    stats = {}
+    for alias in list(_pools):
+        pool = get_pool(alias)
+        if pool is not None:
+            pool_stats = pool.get_stats()
+            pool_stats["pool_in_use"] = pool_stats["pool_size"] - pool_stats["pool_available"]
+            stats[alias] = pool_stats
+    return stats
+
+
+def close_pools():
+    """
+    Close the pools of this process, e.g. on shutdown.
+    """
+    with _pools_lock:
+        for alias in list(_pools):
+            pool = get_pool(alias)
+            del _pools[alias]
+            if pool is not None:
+                pool.close()
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """
+    PostgreSQL database wrapper whose connections come from a pool shared
+    by the threads of a process. Closing the Django connection returns it
+    to the pool, which checks it is still alive before handing it out again.
+    """
+    pool_defaults = {
+        "min_size": 2,
+        "max_size": 10,
+        "timeout": 10.0,
+        "max_idle": 300.0,
+        "max_lifetime": 3600.0,
+        "check": True,
+    }
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    @property
+    def pool(self):
+        pool = get_pool(self.alias)
+        if pool is not None:
+            return pool
+        with _pools_lock:
+            pool = get_pool(self.alias)
+            if pool is None:
+                options = {
+                    **self.pool_defaults,
+                    **self.settings_dict["OPTIONS"].get("pool", {}),
+                }
+                check = ConnectionPool.check_connection if options.pop("check") else None
+                pool = ConnectionPool(
+                    kwargs=self.get_connection_params(),
+                    check=check,
+                    name=self.alias,
+                    open=True,
+                    **options,
+                )
+                _pools[self.alias] = (os.getpid(), pool)
+        return pool
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = IsolationLevel(
+                options.get("isolation_level", IsolationLevel.READ_COMMITTED)
+            )
+        except ValueError:
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {options['isolation_level']} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+
+        pool = self.pool
+        with metrics.timer("db_pool_wait"):
+            connection = pool.getconn()
+        connection.isolation_level = self.isolation_level
+
+        if metrics.current() is not None:
+            stats = pool.get_stats()
+            metrics.gauge("db_pool_in_use", stats["pool_size"] - stats["pool_available"])
+            metrics.gauge("db_pool_waiting", stats["requests_waiting"])
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # psycopg_pool marks the connections it hands out with their pool
+        pool = getattr(self.connection, "_pool", None)
+        if pool is None or pool is not get_pool(self.alias):
+            # Inherited from a parent process, or its pool was closed
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.putconn(self.connection)
@@ -0,0 +1,92 @@
+"""
+Database router sending reads of selected views to read replicas.
+
+Views opt in with ``read_routing()`` or ``read_from_replica()``; AtomicMutationsMixin
+does this for the actions listed in a viewset's ``replica_actions``.
+Everything else, and every write, uses the default database.
+
+Replicas lag behind the primary, so a user who just wrote is pinned to the
+primary for REPLICA_PIN_SECONDS and reads their own writes.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+class ReadRouting:
+    """
+    Where the reads of the current request go; see read_routing().
+    """
+    def __init__(self, replica=False):
+        self.replica = replica
+
+
+_routing = ContextVar("db_read_routing", default=None)
+
+
+@contextmanager
+def read_routing(replica=False):
+    """
+    Scope a ReadRouting to the enclosed block. Its ``replica`` flag can be
+    switched on once it is known that the reads may go to a replica.
+    """
+    routing = ReadRouting(replica)
+    token = _routing.set(routing)
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+def read_from_replica():
+    return read_routing(replica=True)
+
+
+def _pin_key(user_id):
+    return f"db-pin:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """
+    Send the user's reads to the primary for the next REPLICA_PIN_SECONDS.
+    """
+    if settings.REPLICA_DATABASES:
+        caches[settings.API_CACHE_ALIAS].set(
+            _pin_key(user_id), True, settings.REPLICA_PIN_SECONDS
+        )
+
+
+def is_pinned_to_primary(user_id):
+    if not settings.REPLICA_DATABASES:
+        return False
+    return caches[settings.API_CACHE_ALIAS].get(_pin_key(user_id), False)
+
+
+class ReplicaRouter:
+    """
+    Route reads to one of the REPLICA_DATABASES while read_from_replica()
+    is active.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        routing = _routing.get()
+        if replicas and routing is not None and routing.replica:
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the default database
+        aliases = {"default", *settings.REPLICA_DATABASES}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
@@ -0,0 +1,235 @@
+"""
+Live events pushed to the open event streams of a user, see
+api/notes/async_views.py.
+
+Writes publish a small event naming what changed once their transaction
+commits, and clients fetch the changed data themselves. Events are carried
+by the backend set in LIVE_EVENTS_BACKEND:
+
+- ``LocalEventBackend`` delivers them to the streams of the same process,
+  for development and single worker deployments.
+- ``RedisEventBackend`` sends them through Redis pub/sub to every worker.
+
+Each process keeps one registry of subscriptions, and with Redis a single
+subscription for all of them, so an idle stream only costs a small
+bounded queue: no task, socket or database connection of its own. Events
+are encoded once per publish and the same bytes are queued for every
+stream of the user.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import cache
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Tells the client to pull the change feed at /api/v1/sync/, sent when a
+# stream opens, when events may have been missed and after bulk changes
+SYNC_EVENT = "sync"
+
+
+def encode_event(event, data):
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"event: {event}\ndata: {payload}\n\n".encode()
+
+
+SYNC_FRAME = encode_event(SYNC_EVENT, {})
+
+STREAM_TOKEN_SALT = "api.core.events.stream"
+
+
+class Subscription:
+    """
+    The queue of encoded events of one stream, read on its event loop.
+    """
+    __slots__ = ("user_id", "loop", "queue")
+
+    def __init__(self, user_id, loop, size):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+
+    def put(self, frame):
+        # A client that falls behind misses events, so drop what is queued
+        # and have it resync instead of buffering without bound
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            frame = SYNC_FRAME
+        self.queue.put_nowait(frame)
+
+
+class EventBackend:
+    """
+    Registry of the subscriptions of this process, by user id as a string.
+    Subclasses implement ``publish`` and eventually call ``deliver`` in
+    every process.
+    """
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, user_id, event, data):
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """
+        Subscribe to the events of a user. Must be called on the event loop
+        the subscription is read from.
+        """
+        subscription = Subscription(
+            str(user_id), asyncio.get_running_loop(), settings.LIVE_EVENTS_QUEUE_SIZE
+        )
+        with self.lock:
+            self.subscriptions[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscriptions[subscription.user_id]
+
+    def deliver(self, user_id, frame):
+        """
+        Queue an encoded event for the subscriptions of a user, or of every
+        user when user_id is None. Safe to call from any thread.
+        """
+        with self.lock:
+            if user_id is None:
+                targets = [s for subscriptions in self.subscriptions.values() for s in subscriptions]
+            else:
+                targets = list(self.subscriptions.get(str(user_id), ()))
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, frame)
+            except RuntimeError:
+                # The subscription's event loop is closed
+                self.unsubscribe(subscription)
+
+
+class LocalEventBackend(EventBackend):
+    """
+    Deliver events to the streams of the publishing process only.
+    """
+    def publish(self, user_id, event, data):
+        self.deliver(user_id, encode_event(event, data))
+
+
+class RedisEventBackend(EventBackend):
+    """
+    Deliver events to the streams of every process through Redis pub/sub.
+
+    Events are published on a channel per user, and global ones on a
+    shared channel. Each process reads all of them with one pattern
+    subscription, started when its first stream subscribes and closed
+    within ``poll_interval`` seconds of its last stream unsubscribing. When
+    that connection drops, every stream is told to resync.
+    """
+    channel_prefix = "live-events"
+    global_channel = "all"
+    poll_interval = 1.0
+
+    def __init__(self):
+        super().__init__()
+        import redis
+
+        self.url = settings.LIVE_EVENTS_REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+        self.listener = None
+
+    def channel(self, user_id):
+        return f"{self.channel_prefix}:{self.global_channel if user_id is None else user_id}"
+
+    def publish(self, user_id, event, data):
+        self.client.publish(self.channel(user_id), encode_event(event, data))
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        if self.listener is None or self.listener.done():
+            self.listener = subscription.loop.create_task(self.listen())
+        return subscription
+
+    async def listen(self):
+        from redis import asyncio as aioredis
+        from redis.exceptions import RedisError
+
+        delay = 1
+        while self.subscriptions:
+            client = aioredis.Redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{self.channel_prefix}:*")
+                    delay = 1
+                    while self.subscriptions:
+                        message = await pubsub.get_message(timeout=self.poll_interval)
+                        if message is not None and message["type"] == "pmessage":
+                            self.receive(message["channel"], message["data"])
+                    # Let a stream that subscribes while this connection
+                    # closes start a new listener
+                    self.listener = None
+                    return
+            except (RedisError, OSError):
+                logger.warning("Live events subscription lost, reconnecting", exc_info=True)
+                self.deliver(None, SYNC_FRAME)
+            finally:
+                await client.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def receive(self, channel, frame):
+        scope = channel.decode().rpartition(":")[2]
+        self.deliver(None if scope == self.global_channel else scope, frame)
+
+
+@cache
+def get_backend():
+    return import_string(settings.LIVE_EVENTS_BACKEND)()
+
+
+def send(user_id, event, data):
+    try:
+        get_backend().publish(user_id, event, data)
+    except Exception:
+        # Live events are best effort and never fail the write
+        logger.exception("Could not publish live event %s", event)
+
+
+def publish(user_id, event, data):
+    """
+    Send an event to the streams of a user, or of every user when user_id
+    is None, once the current transaction commits.
+    """
+    if settings.LIVE_EVENTS_ENABLED:
+        transaction.on_commit(lambda: send(user_id, event, data))
+
+
+def make_stream_token(user_id):
+    """
+    Return a signed token that opens the event stream of a user for
+    LIVE_EVENTS_TOKEN_MAX_AGE seconds. Browsers cannot send an Authorization
+    header with EventSource, so they pass it in the query string instead.
+    """
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(str(user_id))
+
+
+def read_stream_token(token):
+    """
+    Return the user id of a stream token, or None if it is invalid or has
+    expired.
+    """
+    try:
+        return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(
+            token, max_age=settings.LIVE_EVENTS_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
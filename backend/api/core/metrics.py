@@ -0,0 +1,141 @@
+"""
+Per-request performance metrics.
+
+The metrics of the request being handled live in a context variable that
+is set by api.core.middleware.PerformanceMiddleware. Code that wants to
+report timings or counters calls timer() or incr(), which do nothing when
+no request is being measured.
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from rest_framework import serializers
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """
+    Timings and counters collected while handling a single request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper counting queries and the time spent on them.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def as_dict(self, total):
+        data = {
+            "total_ms": round(total * 1000, 3),
+            "db_queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 3),
+        }
+        for name, seconds in self.timings.items():
+            data[f"{name}_ms"] = round(seconds * 1000, 3)
+        data.update(self.counters)
+        return data
+
+    def server_timing(self, total):
+        """
+        Format the metrics as the value of a Server-Timing header.
+        """
+        entries = [f'db;dur={self.db_time * 1000:.3f};desc="{self.queries} queries"']
+        for name, seconds in self.timings.items():
+            entries.append(f"{name};dur={seconds * 1000:.3f}")
+        if self.counters:
+            counters = " ".join(f"{name}={value}" for name, value in sorted(self.counters.items()))
+            entries.append(f'counters;desc="{counters}"')
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+def current():
+    """
+    Return the metrics of the request being measured, if any.
+    """
+    return _current.get()
+
+
+@contextmanager
+def measure():
+    """
+    Collect metrics for the enclosed block, yielding the RequestMetrics.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def _timer(metrics, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - start
+
+
+def timer(name):
+    """
+    Add the time spent in the enclosed block to the named timing.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return nullcontext()
+    return _timer(metrics, name)
+
+
+def incr(name, value=1):
+    """
+    Increment a named counter of the current request.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[name] += value
+
+
+def gauge(name, value):
+    """
+    Record the latest value of a named measurement of the current request.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[name] = value
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """
+    List serializer recording the time spent serializing as a request timing.
+    """
+    @property
+    def data(self):
+        with timer("serialize"):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Record the time spent serializing as a request timing. Set
+    ``list_serializer_class = TimedListSerializer`` on the serializer's Meta
+    to time lists as well.
+    """
+    @property
+    def data(self):
+        with timer("serialize"):
+            return super().data
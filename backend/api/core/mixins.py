@@ -0,0 +1,78 @@
+from django.db import router, transaction
+from rest_framework.permissions import SAFE_METHODS
+
+from api.core.db.routers import is_pinned_to_primary, pin_to_primary, read_routing
+
+
+class AtomicMutationsMixin:
+    """
+    Run unsafe requests in a transaction and safe ones in autocommit.
+
+    This replaces ATOMIC_REQUESTS for DRF views: reads pay no BEGIN/COMMIT
+    round trips, while a write that fails with an error response is rolled
+    back. Successful writes pin the user to the primary database for a
+    short while.
+
+    Safe requests to the actions in ``replica_actions`` read from a replica
+    when one is configured, unless the user is pinned to the primary.
+    Authentication always reads from the primary.
+
+    The actions in ``non_atomic_actions`` run in autocommit and manage
+    their own transactions.
+    """
+    replica_actions = ()
+    non_atomic_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            with read_routing() as self.read_routing:
+                return super().dispatch(request, *args, **kwargs)
+
+        action = getattr(self, "action_map", {}).get(request.method.lower())
+        if action in self.non_atomic_actions:
+            response = super().dispatch(request, *args, **kwargs)
+        else:
+            with transaction.atomic(using=router.db_for_write(None)):
+                response = super().dispatch(request, *args, **kwargs)
+                if getattr(response, "exception", False):
+                    transaction.set_rollback(True)
+        if not getattr(response, "exception", False) and request.user.is_authenticated:
+            pin_to_primary(request.user.pk)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and getattr(self, "action", None) in self.replica_actions
+            and not is_pinned_to_primary(request.user.pk)
+        ):
+            self.read_routing.replica = True
+
+
+class SparseFieldsMixin:
+    """
+    Let clients choose the fields of a response with comma-separated
+    ``fields`` and ``exclude`` query parameters.
+
+    The names are passed to the serializer context, where serializers using
+    SparseFieldsSerializerMixin apply them. Only safe requests are affected.
+    """
+
+    def get_sparse_fields(self):
+        """
+        Return a mapping of ``fields`` and ``exclude`` to the field names
+        given in the query string.
+        """
+        if self.request.method not in SAFE_METHODS:
+            return {}
+        return {
+            param: [name for name in value.split(",") if name]
+            for param in ("fields", "exclude")
+            if (value := self.request.query_params.get(param, "").replace(" ", ""))
+        }
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(self.get_sparse_fields())
+        return context
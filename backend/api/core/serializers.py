@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Render only the fields named in the ``fields`` serializer context
+    entry, and none of those named in ``exclude``.
+
+    Both are sequences of field names, usually filled from the query string
+    by SparseFieldsMixin. Naming a field the serializer does not have is a
+    validation error.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only = self.context.get('fields')
+        exclude = self.context.get('exclude')
+        for param, names in (('fields', only), ('exclude', exclude)):
+            unknown = [name for name in names or () if name not in fields]
+            if unknown:
+                raise serializers.ValidationError({
+                    param: [f"Unknown field: {name}" for name in unknown]
+                })
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only}
+        for name in exclude or ():
+            fields.pop(name, None)
+        return fields
@@ -0,0 +1,278 @@
+import asyncio
+import json
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase, APITransactionTestCase
+from api.core import events, metrics
+from api.core.db.routers import ReplicaRouter, read_from_replica
+from api.core.events import SYNC_FRAME, LocalEventBackend
+from api.core.middleware import PerformanceMiddleware
+from api.notes.models import Note
+from api.notes.views import NoteViewSet
+from api.users.test.factories import UserFactory, CategoryFactory
+
+
+class PerformanceMiddlewareTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        Note.objects.create(user=self.user, category=self.category, title='Measured')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-list')
+
+    def test_server_timing_header(self):
+        """Test measured responses carry a Server-Timing header"""
+        response = self.client.get(self.url)
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_logs_metrics_as_json(self):
+        """Test measured requests are logged as a JSON line"""
+        with self.assertLogs('api.performance', level='INFO') as logs:
+            self.client.get(self.url)
+            self.client.get(self.url)
+        first, second = (json.loads(record.getMessage()) for record in logs.records)
+        self.assertEqual(first['path'], self.url)
+        self.assertEqual(first['status'], 200)
+        self.assertGreater(first['db_queries'], 0)
+        self.assertEqual(first['cache_misses'], 1)
+        self.assertEqual(second['cache_hits'], 1)
+        self.assertLess(second['db_queries'], first['db_queries'])
+
+    @override_settings(API_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        """Test requests outside the sample get no header"""
+        response = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(API_METRICS_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """Test metrics are logged but not sent when Server-Timing is off"""
+        with self.assertLogs('api.performance', level='INFO'):
+            response = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(API_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Test the middleware removes itself when disabled"""
+        with self.assertRaises(MiddlewareNotUsed):
+            PerformanceMiddleware(lambda request: None)
+
+
+class MetricsTests(TestCase):
+    def test_noop_outside_request(self):
+        """Test timers and counters do nothing without a measured request"""
+        self.assertIsNone(metrics.current())
+        with metrics.timer('serialize'):
+            pass
+        metrics.incr('cache_hits')
+
+    def test_collects_timings_and_counters(self):
+        """Test timings and counters are collected while measuring"""
+        with metrics.measure() as collected:
+            with metrics.timer('serialize'):
+                pass
+            metrics.incr('cache_hits', 2)
+        self.assertIn('serialize', collected.timings)
+        self.assertEqual(collected.counters['cache_hits'], 2)
+        self.assertIsNone(metrics.current())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'requires PostgreSQL and psycopg_pool')
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        from api.core.db.backends.postgresql_pool import base
+
+        self.base = base
+        settings_dict = {
+            **connection.settings_dict,
+            'OPTIONS': {
+                **connection.settings_dict['OPTIONS'],
+                'pool': {'min_size': 1, 'max_size': 2},
+            },
+        }
+        self.wrapper = base.DatabaseWrapper(settings_dict, alias='pool-test')
+        self.addCleanup(base.close_pools)
+        self.addCleanup(self.wrapper.close)
+
+    def test_connections_are_reused(self):
+        """Test closing a connection returns it to the pool"""
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        self.assertIs(self.wrapper.connection, raw)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_pool_stats(self):
+        """Test checked out connections are reported in the pool stats"""
+        with metrics.measure() as collected:
+            self.wrapper.ensure_connection()
+        self.assertEqual(self.base.pool_stats()['pool-test']['pool_in_use'], 1)
+        self.assertEqual(collected.counters['db_pool_in_use'], 1)
+        self.assertIn('db_pool_wait', collected.timings)
+
+
+class AtomicMutationsTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.note = Note.objects.create(user=self.user, category=CategoryFactory(), title='Before')
+        self.client.force_authenticate(user=self.user)
+
+    def transaction_statements(self, captured):
+        return [
+            query['sql'] for query in captured.captured_queries
+            if 'SAVEPOINT' in query['sql'].upper()
+        ]
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_reads_run_in_autocommit(self):
+        """Test GET requests open no transaction"""
+        for url in (reverse('note-list'), reverse('category-list'), reverse('user-me')):
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(url)
+            self.assertEqual(self.transaction_statements(captured), [], url)
+
+    def test_writes_run_in_a_transaction(self):
+        """Test unsafe requests are wrapped in a transaction"""
+        url = reverse('note-detail', args=[self.note.id])
+        with CaptureQueriesContext(connection) as captured:
+            self.client.patch(url, {'title': 'After'})
+        self.assertTrue(self.transaction_statements(captured))
+
+    def test_error_response_rolls_back(self):
+        """Test writes of a request answered with an error are rolled back"""
+        url = reverse('note-detail', args=[self.note.id])
+
+        def save_then_fail(view, serializer):
+            serializer.save()
+            raise ValidationError('Failed after saving')
+
+        with patch.object(NoteViewSet, 'perform_update', save_then_fail):
+            response = self.client.patch(url, {'title': 'After'})
+        self.assertEqual(response.status_code, 400)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, 'Before')
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(APITransactionTestCase):
+    # The replica mirrors the default database through its own connection,
+    # which only sees committed rows.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.note = Note.objects.create(user=self.user, category=CategoryFactory(), title='Replica')
+        self.client.force_authenticate(user=self.user)
+
+    def test_routes_reads_to_replica(self):
+        """Test reads go to a replica only inside read_from_replica"""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Note))
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Note), 'replica')
+            self.assertEqual(router.db_for_write(Note), 'default')
+        with override_settings(REPLICA_DATABASES=[]), read_from_replica():
+            self.assertIsNone(router.db_for_read(Note))
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(replica.captured_queries)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_note_and_category_reads_use_replica(self):
+        """Test note and category list/retrieve read from the replica"""
+        for url in (
+            reverse('note-list'),
+            reverse('note-detail', args=[self.note.id]),
+            reverse('category-list'),
+        ):
+            response, replica_queries = self.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertGreater(replica_queries, 0, url)
+        self.assertEqual(self.get(reverse('user-me'))[1], 0)
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_reads_own_writes(self):
+        """Test a user who just wrote reads from the primary"""
+        self.client.patch(reverse('note-detail', args=[self.note.id]), {'title': 'Edited'})
+        response, replica_queries = self.get(reverse('note-detail', args=[self.note.id]))
+        self.assertEqual(replica_queries, 0)
+        self.assertEqual(response.data['title'], 'Edited')
+
+        cache.delete(f'db-pin:{self.user.pk}')
+        self.assertGreater(self.get(reverse('note-list'))[1], 0)
+
+
+class LiveEventBackendTests(TestCase):
+    def setUp(self):
+        self.backend = LocalEventBackend()
+
+    async def test_delivers_to_user(self):
+        """Test events reach the streams of their user only"""
+        mine = self.backend.subscribe(1)
+        other = self.backend.subscribe(2)
+        self.backend.publish(1, 'note', {'id': 5})
+        frame = await asyncio.wait_for(mine.queue.get(), 1)
+        self.assertEqual(frame, b'event: note\ndata: {"id":5}\n\n')
+        self.assertTrue(other.queue.empty())
+
+    async def test_global_events(self):
+        """Test events without a user reach every stream"""
+        subscriptions = [self.backend.subscribe(1), self.backend.subscribe(2)]
+        self.backend.publish(None, 'category', {'id': 1})
+        for subscription in subscriptions:
+            await asyncio.wait_for(subscription.queue.get(), 1)
+
+    async def test_unsubscribe(self):
+        """Test unsubscribed streams are forgotten"""
+        subscription = self.backend.subscribe(1)
+        self.backend.unsubscribe(subscription)
+        self.assertEqual(self.backend.subscriptions, {})
+
+    @override_settings(LIVE_EVENTS_QUEUE_SIZE=2)
+    async def test_slow_client_resyncs(self):
+        """Test a full queue is replaced by a sync event"""
+        subscription = self.backend.subscribe(1)
+        for i in range(3):
+            self.backend.publish(1, 'note', {'id': i})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertEqual(subscription.queue.get_nowait(), SYNC_FRAME)
+
+    def test_publish_on_commit(self):
+        """Test events are only sent once the transaction commits"""
+        with patch('api.core.events.send') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                events.publish(1, 'note', {'id': 5})
+                send.assert_not_called()
+        send.assert_called_once_with(1, 'note', {'id': 5})
+
+    def test_send_never_fails(self):
+        """Test a failing backend does not fail the write"""
+        with patch.object(events.get_backend(), 'publish', side_effect=OSError):
+            with self.assertLogs('api.core.events', level='ERROR'):
+                events.send(1, 'note', {})
+
+    @override_settings(LIVE_EVENTS_ENABLED=False)
+    def test_disabled(self):
+        """Test nothing is published when live events are off"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            events.publish(1, 'note', {})
+        self.assertEqual(callbacks, [])
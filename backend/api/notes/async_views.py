@@ -0,0 +1,263 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import exceptions, status
+from api.core.async_views import AsyncAPIView
+from api.core.cache import invalidate_user
+from api.core.db.routers import pin_to_primary
+from api.core.events import SYNC_FRAME, get_backend, read_stream_token
+from api.notes.exceptions import NotePreconditionFailed, NoteVersionConflict
+from api.notes.models import Note, NoteRevision, publish_note_event
+from api.notes.search import search_notes
+from api.notes.serializers import NoteSerializer
+from api.notes.views import etag_matches, note_etag
+from api.users.models import Category
+from api.users.resolvers import CategoryResolver
+
+
+def note_updated(note, revision=None):
+    invalidate_user(note.user_id)
+    publish_note_event(note, "updated")
+    if revision is not None:
+        NoteRevision.objects.record([revision])
+
+
+class AsyncNoteMixin:
+    async def get_context(self, request):
+        return {
+            "note_counts": await Category.objects.anote_counts(request.user),
+            "category_resolver": CategoryResolver(request.user),
+        }
+
+    async def get_note(self, request, pk):
+        try:
+            return await Note.objects.select_related("category").aget(
+                id=pk, user=request.user
+            )
+        except (Note.DoesNotExist, ValueError):
+            raise Http404
+
+
+class AsyncNoteListView(AsyncNoteMixin, AsyncAPIView):
+    """
+    Async version of the note list: a page of the user's notes, optionally
+    filtered by category_id or matching search.
+    """
+    http_method_names = ["get", "options"]
+
+    async def get(self, request):
+        queryset = Note.objects.filter(user=request.user).select_related("category")
+
+        category_id = request.GET.get("category_id")
+        if category_id is not None:
+            try:
+                category = await Category.objects.visible_to(request.user).aget(
+                    id=category_id
+                )
+            except (Category.DoesNotExist, ValueError):
+                raise Http404
+            queryset = queryset.filter(category=category)
+
+        search = request.GET.get("search")
+        if search:
+            queryset = search_notes(queryset, search)
+        else:
+            queryset = queryset.order_by("-updated_at")
+
+        page, notes = await self.paginate(request, queryset)
+        serializer = NoteSerializer(notes, many=True, context=await self.get_context(request))
+        return self.json_response({**page, "results": serializer.data})
+
+
+class AsyncNoteDetailView(AsyncNoteMixin, AsyncAPIView):
+    """
+    Async version of note retrieve and update, with the same ETag handling.
+
+    Title and content edits, the bulk of autosave traffic, are written with
+    a single version-guarded UPDATE on the event loop. Changing the
+    category goes through the serializer in a thread, as it has to keep
+    the note counters in sync in a transaction.
+    """
+    http_method_names = ["get", "put", "patch", "options"]
+
+    async def get(self, request, pk):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            version = await (
+                Note.objects.filter(id=pk, user=request.user)
+                .values_list("version", flat=True)
+                .afirst()
+            )
+            if version is not None and etag_matches(note_etag(pk, version), if_none_match):
+                return self.not_modified(note_etag(pk, version))
+
+        note = await self.get_note(request, pk)
+        data = NoteSerializer(note, context=await self.get_context(request)).data
+        return self.json_response(data, headers={"ETag": note_etag(note.id, note.version)})
+
+    async def put(self, request, pk):
+        return await self.update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self.update(request, pk, partial=True)
+
+    async def update(self, request, pk, partial):
+        note = await self.get_note(request, pk)
+        if_match = request.headers.get("If-Match")
+        if if_match and not etag_matches(note_etag(note.id, note.version), if_match):
+            raise NotePreconditionFailed()
+
+        context = await self.get_context(request)
+        serializer = NoteSerializer(
+            note, data=self.parse_json(request), partial=partial, context=context
+        )
+        if "category_id" in serializer.initial_data:
+            await sync_to_async(self.save)(serializer)
+        else:
+            serializer.is_valid(raise_exception=True)
+            await self.save_text(note, serializer.validated_data)
+        await sync_to_async(pin_to_primary)(request.user.pk)
+
+        data = NoteSerializer(note, context=context).data
+        return self.json_response(data, headers={"ETag": note_etag(note.id, note.version)})
+
+    def save(self, serializer):
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    async def save_text(self, note, validated_data):
+        """
+        Write changed title and content with one UPDATE guarded on the
+        note's version.
+        """
+        changes = {
+            field: validated_data[field]
+            for field in ("title", "content")
+            if field in validated_data and validated_data[field] != getattr(note, field)
+        }
+        if not changes:
+            return
+
+        revision = None
+        if settings.NOTE_REVISIONS_ENABLED:
+            revision = (
+                note.id, note.version, note.title, note.updated_at, note.content,
+                changes.get("content", note.content),
+            )
+
+        # Assigning the text decides how it is stored and what its stats are
+        values = dict(changes)
+        for field, value in changes.items():
+            setattr(note, field, value)
+        if "content" in changes:
+            note.update_text_stats()
+            values.update(
+                content=note.content_raw,
+                content_compressed=note.content_compressed,
+                preview=note.preview,
+                word_count=note.word_count,
+                search_words=note.search_words,
+            )
+
+        now = timezone.now()
+        updated = await Note.objects.filter(id=note.id, version=note.version).aupdate(
+            **values, version=F("version") + 1, updated_at=now
+        )
+        if not updated:
+            current = await (
+                Note.objects.filter(id=note.id).values_list("version", flat=True).afirst()
+            )
+            if current is None:
+                raise Http404
+            raise NoteVersionConflict(current)
+
+        note.version += 1
+        note.updated_at = now
+        # The UPDATE bypasses post_save, which drops the cached responses
+        # and publishes the live event, and save(), which records the revision
+        await sync_to_async(note_updated)(note, revision)
+
+
+def release_connections():
+    # Outside of tests, where the test case holds a transaction open
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+class LiveEventsView(AsyncAPIView):
+    """
+    Server-sent events stream of changes to the user's notes and
+    categories, for clients to follow edits made in other tabs and devices.
+
+    Events name the changed object (``note`` and ``category`` events with
+    an action, id and for notes the new version), and clients fetch the
+    data themselves. A ``sync`` event tells the client to pull the change
+    feed at /api/v1/sync/; one is sent when the stream opens, so that
+    changes made while the client was disconnected are not missed.
+
+    Browsers cannot set an Authorization header on an EventSource, so
+    besides the usual authentication a stream can be opened with
+    ``?token=`` and a stream token from /api/v1/events/token/. Tokens are
+    short-lived, so clients fetch a new one for every connection.
+
+    Streams are closed after LIVE_EVENTS_MAX_SECONDS, and the client
+    reconnects. They are only served under ASGI, as each would hold a
+    worker thread under WSGI.
+    """
+    http_method_names = ["get", "options"]
+    # Milliseconds clients wait before reconnecting
+    retry = 2000
+
+    async def authenticate(self, request):
+        if "token" not in request.GET:
+            return await super().authenticate(request)
+        user_id = read_stream_token(request.GET["token"])
+        if user_id is None:
+            raise exceptions.AuthenticationFailed("Invalid or expired stream token.")
+        try:
+            return await get_user_model().objects.aget(pk=user_id, is_active=True)
+        except get_user_model().DoesNotExist:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return self.error_response(
+                {"detail": "Live events are only served by the ASGI application."},
+                status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        # The stream stays open for minutes, do not hold a database
+        # connection for it
+        await sync_to_async(release_connections)()
+        response = StreamingHttpResponse(
+            self.stream(request.user.pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Stop proxies from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self, user_id):
+        backend = get_backend()
+        subscription = backend.subscribe(user_id)
+        loop = asyncio.get_running_loop()
+        closes_at = loop.time() + settings.LIVE_EVENTS_MAX_SECONDS
+        try:
+            yield f"retry: {self.retry}\n\n".encode() + SYNC_FRAME
+            while True:
+                timeout = min(settings.LIVE_EVENTS_HEARTBEAT_SECONDS, closes_at - loop.time())
+                if timeout <= 0:
+                    return
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            backend.unsubscribe(subscription)
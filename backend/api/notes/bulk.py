@@ -0,0 +1,176 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api.core.cache import invalidate_user
+from api.notes.fields import stored_text
+from api.notes.models import (
+    TEXT_STATS_FIELDS, Note, NoteCounter, NoteRevision, Tombstone, bulk_delete,
+    publish_note_event,
+)
+from api.notes.serializers import NoteBulkOperationSerializer
+from api.users.models import Category
+
+# Columns written for each changed field of a bulk update
+BULK_UPDATE_FIELDS = {
+    'title': ['title'],
+    'content': ['content', 'content_compressed', *TEXT_STATS_FIELDS],
+    'category': ['category'],
+}
+
+
+@transaction.atomic
+def apply_bulk_operations(user, operations):
+    """
+    Validate and apply a batch of note operations for a user.
+
+    Ownership of every referenced note and visibility of every referenced
+    category are checked with one query each. The referenced notes are
+    locked until the transaction ends, so their versions cannot change
+    between the read and the write. Valid operations are then applied with
+    one bulk INSERT, one bulk UPDATE per changed column and one queryset
+    delete. Operations that change nothing leave the note untouched.
+    Returns a result per operation, in request order.
+    """
+    results = [None] * len(operations)
+    valid = []
+    for index, data in enumerate(operations):
+        serializer = NoteBulkOperationSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = _error(data.get('op'), data.get('id'), serializer.errors)
+
+    note_ids = {attrs['id'] for _, attrs in valid if 'id' in attrs}
+    category_ids = {attrs['category_id'] for _, attrs in valid if 'category_id' in attrs}
+    notes = {
+        note.id: note
+        for note in Note.objects.select_for_update().filter(user=user, id__in=note_ids)
+        .only('id', 'user_id', 'category_id', 'version')
+    }
+    categories = set(
+        Category.objects.visible_to(user).filter(id__in=category_ids)
+        .values_list('id', flat=True)
+    )
+    # The text of notes whose title or content is set, to skip unchanged
+    # values and to record revisions
+    saved_texts = {}
+    text_ids = {
+        attrs['id'] for _, attrs in valid
+        if attrs['op'] == 'update' and {'title', 'content'} & attrs.keys()
+    }
+    if text_ids:
+        saved_texts = {
+            row['id']: row for row in Note.objects.filter(user=user, id__in=text_ids)
+            .values('id', 'title', 'content', 'content_compressed', 'updated_at')
+        }
+    revisions = []
+
+    to_create = []
+    to_update = {'title': [], 'content': [], 'category': []}
+    to_delete = []
+    touched = set()
+    updated = []
+    counter_deltas = Counter()
+    now = timezone.now()
+
+    for index, attrs in valid:
+        op = attrs['op']
+        note_id = attrs.get('id')
+        if note_id is not None:
+            if note_id not in notes:
+                results[index] = _error(op, note_id, {'id': ['Note not found.']})
+                continue
+            if note_id in touched:
+                results[index] = _error(op, note_id, {'id': ['Note is already changed by another operation.']})
+                continue
+        if 'category_id' in attrs and attrs['category_id'] not in categories:
+            results[index] = _error(op, note_id, {'category_id': ['Invalid category ID']})
+            continue
+
+        if op == 'create':
+            note = Note(
+                user=user,
+                category_id=attrs['category_id'],
+                title=attrs.get('title', Note._meta.get_field('title').default),
+                content=attrs.get('content', ''),
+            )
+            note.update_text_stats()
+            to_create.append((index, note))
+            counter_deltas[note.category_id] += 1
+            continue
+
+        note = notes[note_id]
+        touched.add(note_id)
+        if op == 'delete':
+            to_delete.append(note_id)
+            counter_deltas[note.category_id] -= 1
+        else:
+            changed = []
+            saved = saved_texts.get(note_id)
+            if saved is not None:
+                previous = {
+                    'title': saved['title'],
+                    'content': stored_text(saved['content'], saved['content_compressed']),
+                }
+                changed = [
+                    field for field in ('title', 'content')
+                    if field in attrs and attrs[field] != previous[field]
+                ]
+                if changed and settings.NOTE_REVISIONS_ENABLED:
+                    revisions.append((
+                        note_id, note.version, previous['title'], saved['updated_at'],
+                        previous['content'], attrs.get('content', previous['content']),
+                    ))
+            for field in changed:
+                setattr(note, field, attrs[field])
+                to_update[field].append(note)
+            if 'content' in changed:
+                note.update_text_stats()
+            if 'category_id' in attrs and attrs['category_id'] != note.category_id:
+                counter_deltas[note.category_id] -= 1
+                counter_deltas[attrs['category_id']] += 1
+                note.category_id = attrs['category_id']
+                to_update['category'].append(note)
+                changed.append('category')
+            # Operations that leave the note as it is write nothing, so the
+            # version stays and no event is sent
+            if changed:
+                note.version += 1
+                note.updated_at = now
+                updated.append(note)
+        results[index] = {'op': op, 'id': note_id, 'status': 'ok'}
+
+    created = Note.objects.bulk_create([note for _, note in to_create])
+    for field, changed in to_update.items():
+        if changed:
+            Note.objects.bulk_update(
+                changed, [*BULK_UPDATE_FIELDS[field], 'version', 'updated_at']
+            )
+    if to_delete:
+        # The cache is invalidated and deleted events are sent once for the
+        # batch below rather than from post_delete for every note
+        with bulk_delete():
+            Note.objects.filter(user=user, id__in=to_delete).delete()
+        Tombstone.objects.record(Tombstone.NOTE, user.pk, to_delete)
+    NoteCounter.objects.adjust(user.pk, counter_deltas)
+    NoteRevision.objects.record(revisions)
+    if created or updated or to_delete:
+        invalidate_user(user.pk)
+    # Bulk writes send no signals, so publish their events here
+    for note in created:
+        publish_note_event(note, 'created')
+    for note in updated:
+        publish_note_event(note, 'updated')
+    for note_id in to_delete:
+        publish_note_event(notes[note_id], 'deleted')
+
+    for (index, _), note in zip(to_create, created):
+        results[index] = {'op': 'create', 'id': note.id, 'status': 'ok'}
+    return results
+
+
+def _error(op, note_id, errors):
+    return {'op': op, 'id': note_id, 'status': 'error', 'errors': errors}
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Concat, Length, Substr
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import serializers
+
+from api.notes.exceptions import NoteVersionConflict, StaleVersionError
+from api.notes.models import Note, NoteRevision
+from api.notes.revisions import reverse_operations
+from api.notes.text import apply_operations
+
+
+def build_content_expression(operations):
+    """
+    Build a SQL expression that applies text operations to ``content``.
+
+    Operations are non-overlapping and positioned against the base content,
+    so the result is the concatenation of the untouched base slices and the
+    inserted text. Every slice reads the column directly, which keeps the
+    expression linear in the number of operations.
+    """
+    parts = []
+    cursor = 0
+    for operation in operations:
+        position = operation['position']
+        if position > cursor:
+            parts.append(Substr('content', cursor + 1, position - cursor))
+        if operation['insert']:
+            parts.append(Value(operation['insert']))
+        cursor = position + operation['delete']
+    parts.append(Substr('content', cursor + 1))
+    if len(parts) == 1:
+        return parts[0]
+    return Concat(*parts)
+
+
+def apply_delta(notes, base_version, operations):
+    """
+    Apply text operations to the content of the single note in ``notes``.
+
+    The note is changed in one UPDATE guarded by its version and content
+    length, without loading the content into Python. Its preview and word
+    count are then recomputed from the new content. With revisions enabled
+    only the deleted text is read beforehand, from which the revision is
+    built. Notes whose content is stored compressed are loaded and saved
+    instead. Returns the new version and update time.
+    """
+    end = max(operation['position'] + operation['delete'] for operation in operations)
+    now = timezone.now()
+    base = notes.alias(content_length=Length('content')).filter(
+        version=base_version,
+        content_length__gte=end,
+        content_compressed__isnull=True,
+    )
+    previous = None
+    if settings.NOTE_REVISIONS_ENABLED:
+        previous = base.values('id', 'title', 'updated_at', **{
+            f'deleted_{index}': Substr('content', operation['position'] + 1, operation['delete'])
+            for index, operation in enumerate(operations)
+            if operation['delete']
+        }).first()
+    updated = base.update(
+        content=build_content_expression(operations),
+        version=F('version') + 1,
+        updated_at=now,
+    )
+    if updated:
+        Note.objects.refresh_text_stats(notes)
+        if previous is not None:
+            deleted = [
+                previous.get(f'deleted_{index}', '') for index in range(len(operations))
+            ]
+            NoteRevision.objects.record_operations(
+                previous['id'], base_version, previous['title'], previous['updated_at'],
+                reverse_operations(operations, deleted),
+            )
+        return base_version + 1, now
+
+    current = notes.values(
+        'version',
+        content_length=Length('content'),
+        compressed=ExpressionWrapper(
+            Q(content_compressed__isnull=False), output_field=BooleanField()
+        ),
+    ).first()
+    if current is None:
+        raise Http404
+    if current['version'] != base_version:
+        raise NoteVersionConflict(current['version'])
+    if current['compressed']:
+        return _apply_delta_to_compressed(notes, base_version, operations, end)
+    _content_too_short(current['content_length'])
+
+
+def _apply_delta_to_compressed(notes, base_version, operations, end):
+    note = notes.get()
+    if note.version != base_version:
+        raise NoteVersionConflict(note.version)
+    content = note.content
+    if len(content) < end:
+        _content_too_short(len(content))
+    note.content = apply_operations(content, operations)
+    try:
+        note.save(update_fields=['content', 'updated_at'])
+    except StaleVersionError as exc:
+        raise NoteVersionConflict(exc.current_version)
+    return note.version, note.updated_at
+
+
+def _content_too_short(length):
+    raise serializers.ValidationError({
+        'operations': [f"Operations extend past the end of the content ({length} characters)."]
+    })
@@ -0,0 +1,38 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class StaleVersionError(Exception):
+    """
+    Raised when saving a note whose stored version has moved on since the
+    instance was loaded.
+    """
+    def __init__(self, current_version):
+        super().__init__(f'Note is at version {current_version}')
+        self.current_version = current_version
+
+
+class NoteVersionConflict(APIException):
+    """
+    The note was changed since the version the client based its edit on.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = _('The note has been modified since this version.')
+    default_code = 'version_conflict'
+
+    def __init__(self, current_version, detail=None, code=None):
+        super().__init__(detail, code)
+        self.detail = {
+            'detail': self.detail,
+            'version': current_version,
+        }
+
+
+class NotePreconditionFailed(APIException):
+    """
+    The If-Match precondition of a request did not match the note.
+    """
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('The note does not match the If-Match precondition.')
+    default_code = 'precondition_failed'
@@ -0,0 +1,145 @@
+import json
+import zipfile
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.text import slugify
+
+from api.notes.models import Note
+
+# Rows fetched per round trip of the server-side cursor
+EXPORT_CHUNK_SIZE = 2000
+# Chunks of an export produced per hop to a thread when served under ASGI
+EXPORT_ASYNC_BATCH_SIZE = 100
+
+
+def export_queryset(user):
+    """
+    Return every note of a user with its category, in a stable order.
+    """
+    return (
+        Note.objects.filter(user=user)
+        .select_related('category')
+        .order_by('id')
+    )
+
+
+def note_to_dict(note):
+    category = note.category
+    return {
+        'id': note.id,
+        'title': note.title,
+        'content': note.content,
+        'category': category and {
+            'id': category.id,
+            'name': category.name,
+            'color': category.color,
+        },
+        'created_at': note.created_at,
+        'updated_at': note.updated_at,
+        'version': note.version,
+    }
+
+
+def iter_ndjson(notes):
+    """
+    Yield one JSON document per note, streaming rows from the database.
+    """
+    for note in notes.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield json.dumps(note_to_dict(note), cls=DjangoJSONEncoder) + '\n'
+
+
+def note_to_markdown(note):
+    """
+    Render a note as Markdown with a small front matter header.
+    """
+    category = note.category
+    header = {
+        'id': note.id,
+        'title': note.title,
+        'category': category.name if category else '',
+        'color': category.color if category else '',
+        'created_at': note.created_at.isoformat(),
+        'updated_at': note.updated_at.isoformat(),
+    }
+    lines = ['---']
+    lines += [f"{key}: {' '.join(str(value).splitlines())}" for key, value in header.items()]
+    lines += ['---', '', note.content]
+    return '\n'.join(lines)
+
+
+def markdown_path(note):
+    folder = slugify(note.category.name) if note.category else ''
+    return f"{folder or 'uncategorized'}/{note.id}-{slugify(note.title) or 'note'}.md"
+
+
+class _StreamBuffer:
+    """
+    Write-only file object that hands what ZipFile wrote back to the caller.
+
+    It cannot seek, so ZipFile writes data descriptors instead of going
+    back to patch local headers, which is what allows streaming.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_markdown_zip(notes):
+    """
+    Yield a zip archive of one Markdown file per note, note by note.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for note in notes.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            info = zipfile.ZipInfo(
+                markdown_path(note),
+                date_time=note.updated_at.timetuple()[:6],
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, note_to_markdown(note))
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+async def aiter_batches(chunks, batch_size=EXPORT_ASYNC_BATCH_SIZE):
+    """
+    Iterate a sync iterator from the event loop, advancing it in a thread
+    ``batch_size`` chunks at a time.
+    """
+    chunks = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(chunks, batch_size)))
+    while batch := await next_batch():
+        for chunk in batch:
+            yield chunk
+
+
+def streaming_content(request, chunks):
+    """
+    Return the content of a StreamingHttpResponse for the given request.
+
+    Under ASGI, Django reads a sync iterator to the end in a thread before
+    sending any of it, which would hold a whole export in memory, so the
+    chunks are handed over as an async iterator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        return aiter_batches(chunks)
+    return chunks
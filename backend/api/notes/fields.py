@@ -0,0 +1,111 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+
+def compress_text(value):
+    """
+    Return ``value`` zlib-compressed when compression is enabled and the
+    text is at least NOTE_COMPRESSION_THRESHOLD bytes, otherwise None.
+    Values that do not get smaller are not compressed either.
+    """
+    if not settings.NOTE_COMPRESSION_ENABLED or value is None:
+        return None
+    threshold = settings.NOTE_COMPRESSION_THRESHOLD
+    # Every character takes at least one byte, so short text skips encoding
+    if len(value) < threshold:
+        return None
+    encoded = value.encode('utf-8')
+    if len(encoded) < threshold:
+        return None
+    compressed = zlib.compress(encoded, settings.NOTE_COMPRESSION_LEVEL)
+    if len(compressed) >= len(encoded):
+        return None
+    return compressed
+
+
+def decompress_text(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def stored_text(raw, compressed):
+    """
+    Return the text held by the two columns of a CompressedTextField.
+    """
+    if raw or compressed is None:
+        return raw
+    return decompress_text(compressed)
+
+
+class CompressedTextDescriptor:
+    """
+    Read and write the text of a CompressedTextField.
+
+    Reading returns the text column, or the decompressed binary column
+    when the text is stored compressed; it is decompressed on first access
+    only. Writing decides how the text is stored.
+    """
+    def __init__(self, field):
+        self.field = field
+        self.cache_name = f'_{field.name}_text'
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        raw = getattr(instance, self.field.attname)
+        if raw:
+            return raw
+        compressed = getattr(instance, self.field.compressed_field)
+        if compressed is None:
+            return raw
+        cached = instance.__dict__.get(self.cache_name)
+        if cached is not None and cached[0] is compressed:
+            return cached[1]
+        value = decompress_text(compressed)
+        instance.__dict__[self.cache_name] = (compressed, value)
+        return value
+
+    def __set__(self, instance, value):
+        compressed = compress_text(value)
+        setattr(instance, self.field.compressed_field, compressed)
+        if compressed is None:
+            setattr(instance, self.field.attname, value)
+        else:
+            setattr(instance, self.field.attname, '')
+            instance.__dict__[self.cache_name] = (compressed, value)
+
+
+class CompressedTextField(models.TextField):
+    """
+    Text field that stores large values zlib-compressed in a separate
+    binary field named by ``compressed_field``, leaving the text column
+    empty.
+
+    The model attribute always holds the full text. The stored column
+    value is available as ``<name>_raw`` and is what queries, updates and
+    bulk writes see, so queryset filters and SQL expressions only match
+    uncompressed text. Whether a value is compressed is decided when it is
+    assigned, see compress_text.
+    """
+    def __init__(self, *args, compressed_field, **kwargs):
+        self.compressed_field = compressed_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['compressed_field'] = self.compressed_field
+        return name, path, args, kwargs
+
+    def get_attname(self):
+        return f'{self.name}_raw'
+
+    def get_attname_column(self):
+        return self.get_attname(), self.db_column or self.name
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super().contribute_to_class(cls, name, *args, **kwargs)
+        setattr(cls, name, CompressedTextDescriptor(self))
+
+    def value_from_object(self, obj):
+        return getattr(obj, self.name)
@@ -0,0 +1,314 @@
+import json
+import posixpath
+import zipfile
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from api.core.cache import invalidate_user
+from api.core.events import SYNC_EVENT, publish
+from api.notes.models import Note, NoteCounter
+from api.users.models import Category
+from api.users.resolvers import CategoryResolver
+
+# Notes inserted per bulk INSERT
+IMPORT_BATCH_SIZE = 1000
+# Category for imported notes that do not name one
+DEFAULT_IMPORT_CATEGORY = 'Imported'
+DEFAULT_IMPORT_COLOR = '#CCCCCC'
+# Error messages kept in the import summary
+MAX_REPORTED_ERRORS = 100
+# Largest Markdown file read from an import archive, uncompressed
+MAX_IMPORT_FILE_SIZE = 10 * 1024 * 1024
+# Longest NDJSON line read from an import file
+MAX_IMPORT_LINE_SIZE = MAX_IMPORT_FILE_SIZE
+# Bytes read from an import file or archive member at a time
+IMPORT_READ_CHUNK_SIZE = 64 * 1024
+
+TITLE_MAX_LENGTH = Note._meta.get_field('title').max_length
+DEFAULT_TITLE = Note._meta.get_field('title').default
+
+
+class ImportErrorRecord(Exception):
+    """
+    A record of an import file that cannot be turned into a note.
+    """
+
+
+def read_lines(file):
+    """
+    Yield the lines of a binary file, read in chunks. Lines longer than
+    MAX_IMPORT_LINE_SIZE are yielded as None, and no more than that of a
+    line is held in memory.
+    """
+    line = bytearray()
+    too_long = False
+    while chunk := file.read(IMPORT_READ_CHUNK_SIZE):
+        *ends, rest = chunk.split(b'\n')
+        for end in ends:
+            if too_long or len(line) + len(end) > MAX_IMPORT_LINE_SIZE:
+                yield None
+            else:
+                yield bytes(line + end)
+            line.clear()
+            too_long = False
+        if too_long or len(line) + len(rest) > MAX_IMPORT_LINE_SIZE:
+            line.clear()
+            too_long = True
+        else:
+            line += rest
+    if too_long:
+        yield None
+    elif line:
+        yield bytes(line)
+
+
+def parse_ndjson(file):
+    """
+    Yield a note record per line of an NDJSON file, as written by the
+    export endpoint. Blank lines are skipped and lines longer than
+    MAX_IMPORT_LINE_SIZE are reported as errors.
+    """
+    for number, line in enumerate(read_lines(file), start=1):
+        if line is None:
+            yield ImportErrorRecord(
+                f'Line {number}: longer than {MAX_IMPORT_LINE_SIZE} bytes.'
+            )
+            continue
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield ImportErrorRecord(f'Line {number}: invalid JSON.')
+            continue
+        if not isinstance(data, dict):
+            yield ImportErrorRecord(f'Line {number}: expected a JSON object.')
+            continue
+        category = data.get('category')
+        if not isinstance(category, dict):
+            category = {'name': category} if isinstance(category, str) else {}
+        yield {
+            'title': data.get('title'),
+            'content': data.get('content'),
+            'category_id': category.get('id', data.get('category_id')),
+            'category_name': category.get('name'),
+            'category_color': category.get('color'),
+        }
+
+
+def parse_markdown(text, path):
+    """
+    Turn a Markdown document with optional front matter into a note record.
+    """
+    meta = {}
+    body = text
+    if text.startswith('---\n'):
+        end = text.find('\n---\n', 3)
+        if end != -1:
+            for line in text[4:end].splitlines():
+                key, separator, value = line.partition(':')
+                if separator:
+                    meta[key.strip()] = value.strip()
+            body = text[end + 5:]
+            if body.startswith('\n'):
+                body = body[1:]
+
+    title = meta.get('title')
+    if not title:
+        first_line = body.lstrip().split('\n', 1)[0]
+        if first_line.startswith('# '):
+            title = first_line[2:].strip()
+        else:
+            title = posixpath.splitext(posixpath.basename(path))[0]
+
+    folder = posixpath.dirname(path)
+    category_name = meta.get('category')
+    if category_name is None and folder and folder != 'uncategorized':
+        category_name = posixpath.basename(folder)
+    return {
+        'title': title,
+        'content': body,
+        'category_id': None,
+        'category_name': category_name,
+        'category_color': meta.get('color'),
+    }
+
+
+def read_zip_member(archive, info):
+    """
+    Return the content of an archive member, or raise ImportErrorRecord when
+    it is larger than MAX_IMPORT_FILE_SIZE. The member is read in chunks, so
+    a size understated in the archive cannot make it read more than that.
+    """
+    too_large = ImportErrorRecord(
+        f'{info.filename}: larger than {MAX_IMPORT_FILE_SIZE} bytes.'
+    )
+    if info.file_size > MAX_IMPORT_FILE_SIZE:
+        raise too_large
+    chunks = []
+    size = 0
+    with archive.open(info) as member:
+        while chunk := member.read(IMPORT_READ_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_IMPORT_FILE_SIZE:
+                raise too_large
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def parse_markdown_zip(file):
+    """
+    Yield a note record per Markdown file of a zip archive, reading one
+    file at a time. Files larger than MAX_IMPORT_FILE_SIZE are reported as
+    errors.
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        yield ImportErrorRecord('The file is not a valid zip archive.')
+        return
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.md'):
+                continue
+            try:
+                text = read_zip_member(archive, info).decode('utf-8')
+            except ImportErrorRecord as error:
+                yield error
+                continue
+            except UnicodeDecodeError:
+                yield ImportErrorRecord(f'{info.filename}: not UTF-8 text.')
+                continue
+            yield parse_markdown(text.replace('\r\n', '\n'), info.filename)
+
+
+class ImportCategoryResolver(CategoryResolver):
+    """
+    Resolve imported category references to categories visible to a user,
+    creating missing ones by name.
+    """
+    def __init__(self, user):
+        super().__init__(user)
+        self.created = 0
+
+    def resolve(self, record):
+        category = self.get(record['category_id'])
+        if category is not None:
+            return category
+        name = record['category_name']
+        if not isinstance(name, str) or not name.strip():
+            name = DEFAULT_IMPORT_CATEGORY
+        name = name.strip()[:Category._meta.get_field('name').max_length]
+        category = self.get_by_name(name)
+        if category is None:
+            category = self.create(name, record['category_color'])
+        return category
+
+    def create(self, name, color):
+        try:
+            category = Category.objects.create(user=self.user, name=name, color=color)
+        except (ValidationError, TypeError):
+            category = Category.objects.create(
+                user=self.user, name=name, color=DEFAULT_IMPORT_COLOR
+            )
+        self.add(category)
+        self.created += 1
+        return category
+
+    def savepoint(self):
+        """
+        Return the resolver state to restore with rollback() if the
+        categories created from now on are rolled back.
+        """
+        return dict(self.by_id), dict(self.by_name), self.created
+
+    def rollback(self, state):
+        """
+        Forget the categories created since savepoint() returned the state.
+        """
+        self.by_id, self.by_name, self.created = state
+
+
+def _build_note(user, record, resolver):
+    title = record['title']
+    content = record['content']
+    if title is not None and not isinstance(title, str):
+        raise ImportErrorRecord('title must be a string.')
+    if content is not None and not isinstance(content, str):
+        raise ImportErrorRecord('content must be a string.')
+    note = Note(
+        user=user,
+        title=(title or DEFAULT_TITLE)[:TITLE_MAX_LENGTH],
+        content=content or '',
+        category=resolver.resolve(record),
+    )
+    note.update_text_stats()
+    return note
+
+
+def import_notes(user, records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Create notes for a user from parsed records.
+
+    Records are consumed lazily and inserted with one bulk INSERT per batch,
+    so memory stays bounded by the batch size. Each batch is committed in
+    its own transaction, so a large import holds no long transaction and
+    the batches before a failure are kept. Categories are resolved in
+    memory, and counters and caches are updated once per batch.
+    """
+    summary = {'created': 0, 'failed': 0, 'categories_created': 0, 'errors': []}
+    resolver = None
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        if resolver is None:
+            resolver = ImportCategoryResolver(user)
+        state = resolver.savepoint()
+        categories_created = resolver.created
+        try:
+            with transaction.atomic():
+                notes = []
+                for record in batch:
+                    try:
+                        if isinstance(record, ImportErrorRecord):
+                            raise record
+                        notes.append(_build_note(user, record, resolver))
+                    except ImportErrorRecord as error:
+                        summary['failed'] += 1
+                        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                            summary['errors'].append(str(error))
+                Note.objects.bulk_create(notes)
+                counts = {}
+                for note in notes:
+                    counts[note.category_id] = counts.get(note.category_id, 0) + 1
+                NoteCounter.objects.adjust(user.pk, counts)
+                if notes or resolver.created > categories_created:
+                    invalidate_user(user.pk)
+        except Exception:
+            # The categories created for the batch were rolled back with it
+            resolver.rollback(state)
+            raise
+        summary['created'] += len(notes)
+    if resolver is not None:
+        summary['categories_created'] = resolver.created
+    if summary['created'] or summary['categories_created']:
+        # Have open clients pull the imported notes from the change feed
+        publish(user.pk, SYNC_EVENT, {})
+    return summary
+
+
+def parse_import_file(file, file_type=None):
+    """
+    Return the record parser for an uploaded or opened import file. The
+    type is taken from the file name unless given: ``ndjson`` or
+    ``markdown`` (a zip of Markdown files).
+    """
+    if file_type is None:
+        name = getattr(file, 'name', '') or ''
+        file_type = 'markdown' if name.lower().endswith('.zip') else 'ndjson'
+    if file_type == 'markdown':
+        return parse_markdown_zip(file)
+    if file_type == 'ndjson':
+        return parse_ndjson(file)
+    raise ValueError(f'Unknown import type: {file_type}')
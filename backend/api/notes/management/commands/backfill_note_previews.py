@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.notes.models import Note
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored preview and word count of notes from their content."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="emails",
+            help="Only backfill the notes of the user with this email (repeatable).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of notes read and written per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        notes = Note.objects.all()
+        if options["emails"]:
+            User = get_user_model()
+            user_ids = list(
+                User.objects.filter(email__in=options["emails"]).values_list("id", flat=True)
+            )
+            if len(user_ids) != len(set(options["emails"])):
+                raise CommandError("One or more users do not exist.")
+            notes = notes.filter(user_id__in=user_ids)
+
+        updated = Note.objects.refresh_text_stats(notes, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Note previews backfilled: {updated} updated."))
@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the query count, latency and response size of every API route "
+        "at several dataset sizes. Seeded data is rolled back after the run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default=",".join(str(size) for size in runner.DEFAULT_SIZES),
+            help="Comma separated numbers of notes to seed per run.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=runner.DEFAULT_ITERATIONS,
+            help="Number of requests per route and size.",
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            dest="routes",
+            help="Only benchmark the route with this name (repeatable).",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark.json",
+            help="File the JSON report is written to.",
+        )
+        parser.add_argument(
+            "--with-cache",
+            action="store_true",
+            help="Keep the API response cache enabled.",
+        )
+        parser.add_argument(
+            "--no-gate",
+            action="store_true",
+            help="Do not fail when query counts grow with the dataset size.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a comma separated list of integers.")
+        if any(size < 1 for size in sizes):
+            raise CommandError("Sizes must be at least 1.")
+
+        routes = runner.ROUTES
+        if options["routes"]:
+            routes = [route for route in routes if route.name in options["routes"]]
+            unknown = set(options["routes"]) - {route.name for route in routes}
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+        report = runner.run(
+            sizes=sizes,
+            iterations=options["iterations"],
+            routes=routes,
+            use_cache=options["with_cache"],
+            log=self.stdout.write,
+        )
+        with open(options["output"], "w") as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(f"Report written to {options['output']}.")
+
+        growth = runner.query_growth(report, routes)
+        if growth and not options["no_gate"]:
+            details = "; ".join(
+                f"{name}: {counts}" for name, counts in sorted(growth.items())
+            )
+            raise CommandError(f"Query count grows with the dataset size: {details}")
+        self.stdout.write(self.style.SUCCESS("Query counts are constant across sizes."))
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.notes.models import Note
+
+
+class Command(BaseCommand):
+    help = (
+        "Compresses or decompresses stored note content to match the "
+        "NOTE_COMPRESSION_* settings, and reports the storage saved and CPU cost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="emails",
+            help="Only rewrite the notes of the user with this email (repeatable).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of notes read and written per transaction.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Measure compression on the stored notes without writing any changes.",
+        )
+
+    def handle(self, *args, **options):
+        notes = Note.objects.all()
+        if options["emails"]:
+            User = get_user_model()
+            user_ids = list(
+                User.objects.filter(email__in=options["emails"]).values_list("id", flat=True)
+            )
+            if len(user_ids) != len(set(options["emails"])):
+                raise CommandError("One or more users do not exist.")
+            notes = notes.filter(user_id__in=user_ids)
+
+        result = Note.objects.rewrite_content_storage(
+            notes, batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        if settings.NOTE_COMPRESSION_ENABLED:
+            self.stdout.write(
+                f"Compression: zlib level {settings.NOTE_COMPRESSION_LEVEL}, "
+                f"threshold {settings.NOTE_COMPRESSION_THRESHOLD} bytes"
+            )
+        else:
+            self.stdout.write("Compression: disabled")
+        saved = result["content_bytes"] - result["stored_bytes"]
+        ratio = saved / result["content_bytes"] if result["content_bytes"] else 0
+        self.stdout.write(
+            f"{result['notes']} notes, {result['compressed']} compressed: "
+            f"{result['content_bytes']} content bytes stored in {result['stored_bytes']} "
+            f"({saved} saved, {ratio:.1%})"
+        )
+        self.stdout.write(
+            f"CPU: {result['compress_ms']} ms compressing, "
+            f"{result['decompress_ms']} ms decompressing"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(
+                f"Dry run, no changes written: {result['rewritten']} notes would be rewritten."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Note content storage updated: {result['rewritten']} rewritten."
+            ))
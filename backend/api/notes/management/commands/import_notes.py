@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.notes.importers import IMPORT_BATCH_SIZE, import_notes, parse_import_file
+
+
+class Command(BaseCommand):
+    help = "Imports notes for a user from an NDJSON file or a zip of Markdown files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="Email of the user who will own the notes.")
+        parser.add_argument("path", help="Path of the .ndjson or .zip file to import.")
+        parser.add_argument(
+            "--type",
+            choices=["ndjson", "markdown"],
+            help="File type, detected from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Number of notes inserted per query.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options["email"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['email']}' does not exist.")
+
+        try:
+            with open(options["path"], "rb") as file:
+                records = parse_import_file(file, options["type"])
+                summary = import_notes(user, records, batch_size=options["batch_size"])
+        except OSError as e:
+            raise CommandError(f"Failed to read {options['path']}: {e}")
+
+        for error in summary["errors"]:
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {summary['created']} notes ({summary['failed']} failed, "
+            f"{summary['categories_created']} categories created)."
+        ))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.notes.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Deletes tombstones of deletions older than the sync retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.SYNC_TOMBSTONE_RETENTION_DAYS,
+            help="Keep the tombstones of this many days (defaults to SYNC_TOMBSTONE_RETENTION_DAYS).",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        deleted = Tombstone.objects.prune(before)
+        self.stdout.write(self.style.SUCCESS(f"Tombstones pruned: {deleted} deleted."))
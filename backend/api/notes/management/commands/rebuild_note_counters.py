@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.notes.models import NoteCounter
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-user category note counters from the notes table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="emails",
+            help="Only reconcile the counters of the user with this email (repeatable).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of counters written per query.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without writing any changes.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["emails"]:
+            User = get_user_model()
+            user_ids = list(
+                User.objects.filter(email__in=options["emails"]).values_list("id", flat=True)
+            )
+            if len(user_ids) != len(set(options["emails"])):
+                raise CommandError("One or more users do not exist.")
+
+        result = NoteCounter.objects.reconcile(
+            user_ids=user_ids,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        )
+        summary = ", ".join(f"{value} {key}" for key, value in result.items())
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Dry run, no changes written: {summary}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Note counters reconciled: {summary}."))
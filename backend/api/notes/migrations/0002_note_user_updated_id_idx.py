@@ -0,0 +1,17 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='note_user_updated_id_idx'),
+        ),
+    ]
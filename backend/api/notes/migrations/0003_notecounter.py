@@ -0,0 +1,55 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_note_counters(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    NoteCounter = apps.get_model('notes', 'NoteCounter')
+    db_alias = schema_editor.connection.alias
+    totals = (
+        Note.objects.using(db_alias)
+        .filter(category__isnull=False)
+        .order_by()
+        .values('user_id', 'category_id')
+        .annotate(total=models.Count('id'))
+    )
+    NoteCounter.objects.using(db_alias).bulk_create(
+        (
+            NoteCounter(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                count=row['total'],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_category_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notes', '0002_note_user_updated_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_counters', to='users.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notecounter',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='unique_note_counter'),
+        ),
+        migrations.RunPython(populate_note_counters, migrations.RunPython.noop),
+    ]
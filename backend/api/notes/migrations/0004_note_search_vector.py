@@ -0,0 +1,42 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:31
+
+from django.db import migrations
+
+
+# Only the first 250k characters of a note are indexed, which keeps the
+# generated tsvector well below PostgreSQL's 1MB limit for very large notes.
+ADD_SEARCH_VECTOR = """
+ALTER TABLE notes_note ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', left(coalesce(content, ''), 250000)), 'B')
+) STORED;
+CREATE INDEX note_search_vector_idx ON notes_note USING GIN (search_vector);
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS note_search_vector_idx;
+ALTER TABLE notes_note DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    # The generated column is PostgreSQL specific; other databases use the
+    # substring fallback in api.notes.search.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_notecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
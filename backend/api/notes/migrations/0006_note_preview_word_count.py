@@ -0,0 +1,45 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+from api.notes.text import text_stats
+
+BATCH_SIZE = 1000
+
+
+def fill_text_stats(apps, schema_editor):
+    # Same stats as NoteManager.refresh_text_stats, read in batches of ids
+    Note = apps.get_model('notes', 'Note')
+    manager = Note.objects.using(schema_editor.connection.alias)
+    notes = manager.order_by('id').values_list('id', 'content')
+    last_id = 0
+    while True:
+        batch = list(notes.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        manager.bulk_update([
+            Note(id=note_id, **text_stats(content))
+            for note_id, content in batch
+        ], ['preview', 'word_count'])
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_note_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_text_stats, migrations.RunPython.noop),
+    ]
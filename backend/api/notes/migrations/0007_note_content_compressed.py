@@ -0,0 +1,24 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:55
+
+import api.notes.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_note_preview_word_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='content_compressed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='note',
+            name='content',
+            field=api.notes.fields.CompressedTextField(blank=True, compressed_field='content_compressed', default=''),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.13 on 2026-10-17 03:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('operations', models.JSONField(null=True)),
+                ('content', models.BinaryField(null=True)),
+                ('chain', models.PositiveSmallIntegerField(default=0)),
+                ('saved_at', models.DateTimeField()),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notes.note')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='noterevision',
+            constraint=models.UniqueConstraint(fields=('note', 'version'), name='note_revision_version_unique'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.13 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+from api.notes.fields import decompress_text
+from api.notes.text import search_words
+
+# Compressed notes have an empty content column, so their words are
+# indexed from search_words instead. Only one of the two is ever set.
+SEARCH_VECTOR = """
+ALTER TABLE notes_note DROP COLUMN IF EXISTS search_vector;
+ALTER TABLE notes_note ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', left({content}, 250000)), 'B')
+) STORED;
+CREATE INDEX note_search_vector_idx ON notes_note USING GIN (search_vector);
+"""
+
+BATCH_SIZE = 1000
+
+
+def fill_search_words(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    manager = Note.objects.using(schema_editor.connection.alias)
+    notes = (
+        manager.filter(content_compressed__isnull=False)
+        .order_by('id')
+        .values_list('id', 'content_compressed')
+    )
+    last_id = 0
+    while True:
+        batch = list(notes.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        manager.bulk_update([
+            Note(id=note_id, search_words=search_words(decompress_text(compressed)))
+            for note_id, compressed in batch
+        ], ['search_words'])
+        last_id = batch[-1][0]
+
+
+def index_search_words(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR.format(
+            content="coalesce(content, '') || ' ' || coalesce(search_words, '')",
+        ))
+
+
+def unindex_search_words(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR.format(content="coalesce(content, '')"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0009_noterevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='search_words',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_words, migrations.RunPython.noop),
+        # The generated column has to be dropped before the field it reads
+        # when migrating backwards, and added after it going forwards
+        migrations.RunPython(index_search_words, unindex_search_words),
+    ]
@@ -1,7 +1,139 @@
-from django.db import models
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
 from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from api.core.cache import invalidate_user
+from api.core.events import publish
+from api.notes.exceptions import StaleVersionError
+from api.notes.fields import CompressedTextField, decompress_text, stored_text
+from api.notes.revisions import (
+    compress_content, decode_operations, diff_operations, encode_operations,
+)
+from api.notes.text import NOTE_PREVIEW_LENGTH, apply_operations, search_words, text_stats
 from api.users.models import Category
 
+# Stored text of a note remembered on load, by field name and attribute,
+# which becomes a revision when it changes
+REVISION_FIELDS = {
+    'title': 'title',
+    'content': 'content_raw',
+    'content_compressed': 'content_compressed',
+    'updated_at': 'updated_at',
+}
+
+# Stored fields derived from the content whenever it changes
+TEXT_STATS_FIELDS = ('preview', 'word_count', 'search_words')
+
+# Set while a bulk operation deletes notes whose cache invalidation and
+# events it sends itself, once for the whole batch
+_bulk_delete = ContextVar('note_bulk_delete', default=False)
+
+
+class NoteManager(models.Manager):
+    """
+    Manager for notes with maintenance of the stored content and text
+    stats.
+    """
+    def _batches(self, notes, batch_size, fields):
+        """
+        Yield lists of up to ``batch_size`` notes in id order, loading only
+        ``fields``.
+        """
+        if notes is None:
+            notes = self.all()
+        notes = notes.order_by('id').only('id', *fields)
+        last_id = None
+        while True:
+            batch = notes if last_id is None else notes.filter(id__gt=last_id)
+            batch = list(batch[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def _write_batch(self, notes, fields):
+        if notes:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self.bulk_update(notes, fields)
+
+    def refresh_text_stats(self, notes=None, batch_size=1000):
+        """
+        Recompute the stored preview, word count and search words of notes
+        from their content, reading it in batches of ``batch_size`` notes.
+
+        Each batch is written in its own transaction without touching the
+        notes' version or update time. Returns the number of notes whose
+        stats changed.
+        """
+        fields = ('content', 'content_compressed', *TEXT_STATS_FIELDS)
+        updated = 0
+        for batch in self._batches(notes, batch_size, fields):
+            changed = []
+            for note in batch:
+                stats = note.get_text_stats()
+                if any(getattr(note, field) != value for field, value in stats.items()):
+                    for field, value in stats.items():
+                        setattr(note, field, value)
+                    changed.append(note)
+            self._write_batch(changed, TEXT_STATS_FIELDS)
+            updated += len(changed)
+        return updated
+
+    def rewrite_content_storage(self, notes=None, batch_size=1000, dry_run=False):
+        """
+        Store the content of notes the way the current compression settings
+        ask for: compressed when it is large enough, as text otherwise.
+
+        Returns a dict with the number of notes read, stored compressed and
+        rewritten, the size of their content and of what is stored for it
+        in bytes, and the milliseconds spent compressing all of them and
+        decompressing the compressed ones. With dry_run the sizes and
+        timings are computed but nothing is written.
+        """
+        result = dict.fromkeys((
+            'notes', 'compressed', 'rewritten',
+            'content_bytes', 'stored_bytes', 'compress_ms', 'decompress_ms',
+        ), 0)
+        fields = ('content', 'content_compressed', 'search_words')
+        for batch in self._batches(notes, batch_size, fields):
+            changed = []
+            for note in batch:
+                stored = note.content_raw, note.content_compressed
+                content = note.content
+                started = time.perf_counter()
+                note.content = content
+                result['compress_ms'] += (time.perf_counter() - started) * 1000
+                note.search_words = note.get_text_stats()['search_words']
+
+                compressed = note.content_compressed
+                if compressed is not None:
+                    started = time.perf_counter()
+                    decompress_text(compressed)
+                    result['decompress_ms'] += (time.perf_counter() - started) * 1000
+                    result['compressed'] += 1
+                result['notes'] += 1
+                result['content_bytes'] += len(content.encode('utf-8'))
+                result['stored_bytes'] += (
+                    len(note.content_raw.encode('utf-8')) + len(compressed or b'')
+                )
+                if stored[0] != note.content_raw or (
+                    None if stored[1] is None else bytes(stored[1])
+                ) != compressed:
+                    changed.append(note)
+            if not dry_run:
+                self._write_batch(changed, fields)
+            result['rewritten'] += len(changed)
+        result['compress_ms'] = round(result['compress_ms'], 3)
+        result['decompress_ms'] = round(result['decompress_ms'], 3)
+        return result
+
+
 class Note(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -9,7 +141,18 @@ class Note(models.Model):
         related_name='notes'
     )
     title = models.CharField(max_length=200, default="Untitled Note")
-    content = models.TextField(blank=True, default="")
+    content = CompressedTextField(
+        blank=True, default="", compressed_field='content_compressed'
+    )
+    # Large content when compression is enabled; content is empty then
+    content_compressed = models.BinaryField(null=True, editable=False)
+    # Derived from content on save, so lists never have to read the content
+    preview = models.CharField(
+        max_length=NOTE_PREVIEW_LENGTH, blank=True, default="", editable=False
+    )
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    # The distinct words of content stored compressed, for search
+    search_words = models.TextField(blank=True, default="", editable=False)
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
@@ -18,10 +161,490 @@ class Note(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Incremented on every write so clients can send edits against a base
+    version = models.PositiveIntegerField(default=1)
+
+    objects = NoteManager()
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Backs keyset pagination of a user's notes by recency
+            models.Index(
+                fields=['user', '-updated_at', '-id'],
+                name='note_user_updated_id_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so that save() can tell whether the
+        # note was recategorized and adjust the note counters.
+        instance._saved_category_id = (
+            instance.__dict__.get('category_id', models.DEFERRED)
+        )
+        instance._remember_text()
+        return instance
+
+    def _remember_text(self):
+        # The stored text, kept so that save() can record it as a revision
+        # without reading it again. Only references are kept, no copies.
+        self._saved_text = {
+            name: self.__dict__[attname]
+            for name, attname in REVISION_FIELDS.items()
+            if attname in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        """
+        Save the note, bump its version and keep the user's note counters
+        and the stored preview and word count in sync. A changed title or
+        content is recorded as a revision of the previous version.
+
+        Updates are conditional on the stored version still being the one
+        this instance holds; StaleVersionError is raised otherwise.
+        """
+        adding = self._state.adding
+        previous = getattr(self, '_saved_category_id', None)
+        update_fields = kwargs.get('update_fields')
+        saved_text = None
+        if not adding and settings.NOTE_REVISIONS_ENABLED and (
+            update_fields is None or {'title', 'content'} & set(update_fields)
+        ):
+            saved_text = getattr(self, '_saved_text', {})
+        if 'content_raw' in self.__dict__ and (
+            update_fields is None or 'content' in update_fields
+        ):
+            self.update_text_stats()
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {
+                    *update_fields, 'content_compressed', *TEXT_STATS_FIELDS
+                }
+        if not adding:
+            self._expected_version = self.version
+            self.version += 1
+            if update_fields is not None:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'version'}
+        using = kwargs.get('using') or router.db_for_write(Note, instance=self)
+        try:
+            with transaction.atomic(using=using):
+                if previous is models.DEFERRED and 'category_id' in self.__dict__:
+                    previous = (
+                        Note.objects.filter(pk=self.pk)
+                        .values_list('category_id', flat=True)
+                        .first()
+                    )
+                if saved_text is not None and len(saved_text) < len(REVISION_FIELDS):
+                    saved_text = (
+                        Note.objects.filter(pk=self.pk).values(*REVISION_FIELDS).first()
+                    )
+                super().save(*args, **kwargs)
+                self._save_counters(adding, previous, update_fields)
+                if saved_text:
+                    self._save_revision(saved_text)
+        except StaleVersionError:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+        self._saved_category_id = self.__dict__.get(
+            'category_id', models.DEFERRED
+        )
+        self._remember_text()
+
+    def _save_revision(self, saved_text):
+        """
+        Record the text the note had before this save, if it changed.
+        """
+        previous = stored_text(saved_text['content'], saved_text['content_compressed'])
+        content = self.content
+        if previous == content and saved_text['title'] == self.title:
+            return
+        NoteRevision.objects.record([(
+            self.pk, self._expected_version, saved_text['title'],
+            saved_text['updated_at'], previous, content,
+        )])
+
+    def get_text_stats(self):
+        """
+        Return the values of TEXT_STATS_FIELDS for the current content.
+        """
+        stats = text_stats(self.content)
+        stats['search_words'] = (
+            '' if self.content_compressed is None else search_words(self.content)
+        )
+        return stats
+
+    def update_text_stats(self):
+        """
+        Set the preview, word count and search words from the content,
+        without saving.
+        """
+        for field, value in self.get_text_stats().items():
+            setattr(self, field, value)
+
+    def _save_counters(self, adding, previous, update_fields):
+        """
+        Count a new note, or move its count when it changed category.
+        """
+        if adding:
+            NoteCounter.objects.adjust(self.user_id, {self.category_id: 1})
+        elif (
+            previous is not models.DEFERRED
+            and previous != self.category_id
+            and (
+                update_fields is None
+                or {'category', 'category_id'} & set(update_fields)
+            )
+        ):
+            NoteCounter.objects.adjust(self.user_id, {
+                previous: -1,
+                self.category_id: 1,
+            })
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(
+                base_qs, using, pk_val, values, update_fields, forced_update
+            )
+        if super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values,
+            update_fields, forced_update
+        ):
+            return True
+        current = base_qs.filter(pk=pk_val).values_list('version', flat=True).first()
+        if current is None:
+            return False
+        raise StaleVersionError(current)
+
+    def delete(self, *args, **kwargs):
+        """
+        Delete the note, decrement the user's note counter and leave a
+        tombstone for syncing clients.
+        """
+        using = kwargs.get('using') or router.db_for_write(Note, instance=self)
+        with transaction.atomic(using=using):
+            NoteCounter.objects.adjust(self.user_id, {self.category_id: -1})
+            Tombstone.objects.record(Tombstone.NOTE, self.user_id, [self.pk])
+            return super().delete(*args, **kwargs)
+
+
+class NoteRevisionManager(models.Manager):
+    """
+    Manager for recording note revisions, see api/notes/revisions.py.
+    """
+    def newest_chains(self, note_ids):
+        """
+        Return the chain length of the newest revision of each of the notes
+        that have revisions.
+        """
+        newest = (
+            self.filter(note_id=OuterRef('note_id')).order_by('-version').values('version')[:1]
+        )
+        return dict(
+            self.filter(note_id__in=note_ids, version=Subquery(newest))
+            .values_list('note_id', 'chain')
+        )
+
+    def _new_revision(self, chains, note_id, version, title, saved_at):
+        # A keyframe once a note's chain of diffs reaches the interval
+        chain = chains.get(note_id, 0) + 1
+        if chain >= settings.NOTE_REVISION_KEYFRAME_INTERVAL:
+            chain = 0
+        chains[note_id] = chain
+        return self.model(
+            note_id=note_id, version=version, title=title, saved_at=saved_at, chain=chain
+        )
+
+    def record(self, changes):
+        """
+        Store the previous text of changed notes, given ``(note_id, version,
+        title, saved_at, previous_content, content)`` tuples: the version,
+        title, save time and content a note had, and its new content.
+        """
+        changes = list(changes)
+        if not changes:
+            return
+        chains = self.newest_chains({change[0] for change in changes})
+        revisions = []
+        for note_id, version, title, saved_at, previous, content in changes:
+            revision = self._new_revision(chains, note_id, version, title, saved_at)
+            if revision.is_keyframe:
+                revision.set_content(previous)
+            else:
+                revision.set_operations(diff_operations(content, previous))
+            revisions.append(revision)
+        self.bulk_create(revisions)
+
+    def record_operations(self, note_id, version, title, saved_at, operations):
+        """
+        Store the previous text of a note from the operations that undo its
+        last change, as built for text deltas. The note's content is only
+        read when the revision is a keyframe.
+        """
+        revision = self._new_revision(
+            self.newest_chains([note_id]), note_id, version, title, saved_at
+        )
+        if revision.is_keyframe:
+            note = Note.objects.only('content', 'content_compressed').get(pk=note_id)
+            revision.set_content(apply_operations(note.content, operations))
+        else:
+            revision.set_operations(operations)
+        revision.save()
+
+
+class NoteRevision(models.Model):
+    """
+    The title and content of a note at a previous version, stored as the
+    operations that turn the next newer text back into it, or in full as
+    a keyframe.
+    """
+    note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    # [position, delete, insert] operations applied to the next newer content
+    operations = models.JSONField(null=True)
+    # zlib-compressed content of keyframes
+    content = models.BinaryField(null=True)
+    # Diffs since the last keyframe, 0 for keyframes
+    chain = models.PositiveSmallIntegerField(default=0)
+    # When the note was saved at this version
+    saved_at = models.DateTimeField()
+
+    objects = NoteRevisionManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['note', 'version'], name='note_revision_version_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.note_id} at version {self.version}"
+
+    @property
+    def is_keyframe(self):
+        return self.chain == 0
+
+    def get_operations(self):
+        return decode_operations(self.operations)
+
+    def set_operations(self, operations):
+        self.operations = encode_operations(operations)
+
+    def get_content(self):
+        return decompress_text(self.content)
+
+    def set_content(self, content):
+        self.content = compress_content(content)
+
+
+class NoteCounterManager(models.Manager):
+    """
+    Manager for maintaining denormalized note counters.
+    """
+    def adjust(self, user_id, deltas):
+        """
+        Apply a mapping of category id to count delta for a user.
+
+        Deltas for the same category are expected to be summed by the
+        caller; notes without a category are not counted.
+        """
+        for category_id, delta in deltas.items():
+            if category_id is None or not delta:
+                continue
+            counters = self.filter(user_id=user_id, category_id=category_id)
+            if counters.update(count=F('count') + delta):
+                continue
+            counter, created = self.get_or_create(
+                user_id=user_id,
+                category_id=category_id,
+                defaults={'count': max(delta, 0)},
+            )
+            if not created:
+                counters.update(count=F('count') + delta)
+
+    def reconcile(self, user_ids=None, batch_size=1000, dry_run=False):
+        """
+        Rebuild counters from the notes table, fixing any drift.
+
+        Returns a dict with the number of counters created, updated and
+        deleted. With dry_run the differences are computed but not written.
+        """
+        notes = Note.objects.filter(category__isnull=False)
+        counters = self.all()
+        if user_ids is not None:
+            notes = notes.filter(user_id__in=user_ids)
+            counters = counters.filter(user_id__in=user_ids)
+
+        expected = {
+            (row['user_id'], row['category_id']): row['total']
+            for row in notes.order_by()
+            .values('user_id', 'category_id')
+            .annotate(total=Count('id'))
+            .iterator()
+        }
+
+        to_update = []
+        to_delete = []
+        for counter in counters.only('id', 'user_id', 'category_id', 'count'):
+            total = expected.pop((counter.user_id, counter.category_id), 0)
+            if not total:
+                to_delete.append(counter.id)
+            elif counter.count != total:
+                counter.count = total
+                to_update.append(counter)
+        to_create = [
+            self.model(user_id=user_id, category_id=category_id, count=total)
+            for (user_id, category_id), total in expected.items()
+        ]
+
+        if not dry_run:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self.bulk_create(to_create, batch_size=batch_size)
+                self.bulk_update(to_update, ['count'], batch_size=batch_size)
+                for start in range(0, len(to_delete), batch_size):
+                    self.filter(
+                        id__in=to_delete[start:start + batch_size]
+                    ).delete()
+
+        return {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'deleted': len(to_delete),
+        }
+
+
+class NoteCounter(models.Model):
+    """
+    Number of notes a user has in a category, maintained on write so that
+    category note counts can be read without scanning the user's notes.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='note_counters'
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='note_counters'
+    )
+    count = models.IntegerField(default=0)
+
+    objects = NoteCounterManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category'],
+                name='unique_note_counter',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id}: {self.count}"
+
+
+class TombstoneManager(models.Manager):
+    """
+    Manager for recording and pruning deletions.
+    """
+    def record(self, kind, user_id, object_ids):
+        """
+        Record that the objects of a kind with the given ids were deleted.
+        """
+        now = timezone.now()
+        self.bulk_create([
+            self.model(kind=kind, user_id=user_id, object_id=object_id, deleted_at=now)
+            for object_id in object_ids
+        ])
+
+    def prune(self, before):
+        """
+        Delete the tombstones of deletions made before a time. Returns the
+        number of tombstones deleted.
+        """
+        return self.filter(deleted_at__lt=before).delete()[0]
+
+
+class Tombstone(models.Model):
+    """
+    A deleted note or category, kept so that clients syncing changes since
+    a cursor learn about deletions. Global categories have no user.
+    """
+    NOTE = 'note'
+    CATEGORY = 'category'
+    KIND_CHOICES = [
+        (NOTE, 'Note'),
+        (CATEGORY, 'Category'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tombstones',
+        null=True,
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = TombstoneManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at {self.deleted_at}"
+
+
+@contextmanager
+def bulk_delete():
+    """
+    Delete notes without the per-note cache invalidation and deleted events
+    of post_delete, for callers that send them once for the whole batch.
+    """
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_cache(sender, instance, **kwargs):
+    """
+    Drop the owner's cached note and category responses.
+    """
+    if not _bulk_delete.get():
+        invalidate_user(instance.user_id)
+
+
+def publish_note_event(note, action):
+    """
+    Tell the owner's open event streams that a note was created, updated or
+    deleted.
+    """
+    publish(note.user_id, 'note', {'action': action, 'id': note.pk, 'version': note.version})
+
+
+@receiver(post_save, sender=Note)
+def publish_note_saved(sender, instance, created=False, **kwargs):
+    publish_note_event(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Note)
+def publish_note_deleted(sender, instance, **kwargs):
+    if not _bulk_delete.get():
+        publish_note_event(instance, 'deleted')
@@ -0,0 +1,94 @@
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class NoteKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for notes ordered by most recently updated.
+
+    Each page seeks on ``(updated_at, id)`` instead of using an OFFSET, and
+    no COUNT query is issued, so every page costs the same regardless of how
+    deep it is. Notes that are not saved while a client is paging are
+    returned exactly once, and inserts or saves never shift a later page.
+    A note that is saved while paging moves to the front of the list: if it
+    was already returned it is not repeated, and if it was not reached yet
+    it is skipped. Clients catch those up from the first page or the sync
+    feed.
+
+    The ordering is fixed, so relevance ordered search results cannot be
+    paged this way; NoteViewSet rejects ``search`` in cursor mode.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = _('Invalid cursor')
+    ordering = ('-updated_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            updated_at, pk = position
+            # The redundant ``updated_at__lte`` bound lets the database use
+            # the (user, updated_at, id) index as a range scan.
+            queryset = queryset.filter(updated_at__lte=updated_at).filter(
+                Q(updated_at__lt=updated_at) | Q(id__lt=pk)
+            )
+
+        # Fetch one extra row to know whether there is a next page.
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = self.encode_cursor(last.updated_at, last.id)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, updated_at, pk):
+        value = f'{updated_at.isoformat()}|{pk}'
+        return b64encode(value.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value = b64decode(encoded.encode('ascii')).decode('ascii')
+            updated_at, pk = value.split('|')
+            return datetime.fromisoformat(updated_at), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
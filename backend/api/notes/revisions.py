@@ -0,0 +1,157 @@
+"""
+Revision history of note text, stored as reverse diffs.
+
+When the title or content of a note changes, the text it had is stored as
+a NoteRevision of its previous version. The note keeps the current text,
+and a revision holds the text operations that turn the content of the next
+newer revision, or of the note for the newest one, back into its own.
+Every NOTE_REVISION_KEYFRAME_INTERVAL revisions, one stores its full
+content compressed instead, so rebuilding a version applies at most that
+many diffs. Autosaves change a few words at a time, so most revisions take
+a few dozen bytes next to their title.
+"""
+import zlib
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db.models import Subquery, Value
+from django.db.models.functions import Coalesce
+
+from api.notes.text import apply_operations
+
+# Changed regions of more lines than this are replaced as a whole instead
+# of being matched line by line
+DIFF_MAX_LINES = 2000
+
+
+def _operation(position, delete, insert):
+    return {'position': position, 'delete': delete, 'insert': insert}
+
+
+def _common_prefix(a, b):
+    # Binary search with slice comparisons, which run in C
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b):
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _narrow(position, old, new):
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old[prefix:], new[prefix:])
+    return _operation(position + prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix])
+
+
+def diff_operations(source, target):
+    """
+    Return text operations that turn ``source`` into ``target``.
+
+    Edits are usually in one place, so the common prefix and suffix are
+    skipped first. What is left is matched line by line, and every changed
+    run of lines is narrowed down to the characters that differ.
+    """
+    if source == target:
+        return []
+    prefix = _common_prefix(source, target)
+    suffix = _common_suffix(source[prefix:], target[prefix:])
+    old = source[prefix:len(source) - suffix]
+    new = target[prefix:len(target) - suffix]
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    line_counts = len(old_lines), len(new_lines)
+    if min(line_counts) <= 1 or max(line_counts) > DIFF_MAX_LINES:
+        return [_operation(prefix, len(old), new)]
+
+    offsets = [prefix]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+    operations = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != 'equal':
+            operations.append(
+                _narrow(offsets[i1], ''.join(old_lines[i1:i2]), ''.join(new_lines[j1:j2]))
+            )
+    return operations
+
+
+def reverse_operations(operations, deleted):
+    """
+    Return the operations that undo ``operations``, positioned against the
+    text they produced, given the text each of them deleted.
+    """
+    reverse = []
+    shift = 0
+    for operation, text in zip(operations, deleted):
+        if operation['insert'] or text:
+            reverse.append(_operation(operation['position'] + shift, len(operation['insert']), text))
+        shift += len(operation['insert']) - operation['delete']
+    return reverse
+
+
+def encode_operations(operations):
+    return [[op['position'], op['delete'], op['insert']] for op in operations]
+
+
+def decode_operations(encoded):
+    return [_operation(*op) for op in encoded]
+
+
+def compress_content(content):
+    return zlib.compress(content.encode('utf-8'), settings.NOTE_COMPRESSION_LEVEL)
+
+
+def reconstruct(note, version):
+    """
+    Return the version, title, content and save time a note had at a
+    version, or None when no revision of that version is stored.
+
+    Only the revisions from the version up to the nearest keyframe above
+    it are loaded. The diffs are applied from that keyframe, or from the
+    note's own content when there is none, down to the version.
+    """
+    if version == note.version:
+        return {
+            'version': version,
+            'title': note.title,
+            'content': note.content,
+            'saved_at': note.updated_at,
+        }
+    revisions = note.revisions.filter(version__gte=version)
+    keyframe = revisions.filter(chain=0).order_by('version').values('version')[:1]
+    revisions = list(
+        revisions.filter(version__lte=Coalesce(Subquery(keyframe), Value(note.version)))
+        .order_by('-version')
+    )
+    if not revisions or revisions[-1].version != version:
+        return None
+
+    target = revisions[-1]
+    if revisions[0].is_keyframe:
+        content = revisions[0].get_content()
+        revisions = revisions[1:]
+    else:
+        content = note.content
+    for revision in revisions:
+        content = apply_operations(content, revision.get_operations())
+    return {
+        'version': version,
+        'title': target.title,
+        'content': content,
+        'saved_at': target.saved_at,
+    }
@@ -0,0 +1,52 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from api.notes.text import SEARCH_TOKEN_RE
+
+# Text search configuration used by the generated search_vector column.
+SEARCH_CONFIG = 'english'
+
+
+def search_notes(queryset, terms):
+    """
+    Filter a Note queryset to the notes matching every word in ``terms``.
+
+    On PostgreSQL this matches the GIN-indexed ``search_vector`` column with
+    prefix matching on each word and orders the results by rank. Other
+    databases fall back to case-insensitive substring matching on title and
+    content, ordered by last updated. Content stored compressed is not in
+    the content column, so its words are matched in ``search_words``.
+    """
+    tokens = SEARCH_TOKEN_RE.findall(terms)
+    if not tokens:
+        return queryset
+
+    if connections[queryset.db].vendor != 'postgresql':
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(title__icontains=token)
+                | Q(content__icontains=token)
+                | Q(search_words__icontains=token)
+            )
+        return queryset.order_by('-updated_at', '-id')
+
+    query = SearchQuery(
+        ' & '.join(f'{token}:*' for token in tokens),
+        config=SEARCH_CONFIG,
+        search_type='raw',
+    )
+    # search_vector is a generated column maintained by PostgreSQL, so it
+    # is not declared on the model and has to be referenced directly.
+    vector = RawSQL(
+        f'"{queryset.model._meta.db_table}"."search_vector"',
+        [],
+        output_field=SearchVectorField(),
+    )
+    return (
+        queryset.alias(search_vector=vector)
+        .filter(search_vector=query)
+        .annotate(rank=SearchRank(vector, query))
+        .order_by('-rank', '-updated_at', '-id')
+    )
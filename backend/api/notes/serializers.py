@@ -1,49 +1,196 @@
 from rest_framework import serializers
-from api.notes.models import Note
-from api.users.models import Category
+from api.core.metrics import TimedListSerializer, TimedSerializerMixin
+from api.core.serializers import SparseFieldsSerializerMixin
+from api.notes.exceptions import NoteVersionConflict, StaleVersionError
+from api.notes.models import Note, NoteRevision
+from api.users.resolvers import CategoryResolver
 from api.users.serializers import CategorySerializer
 
-class NoteSerializer(serializers.ModelSerializer):
+class NoteSerializer(SparseFieldsSerializerMixin, TimedSerializerMixin,
+                     serializers.ModelSerializer):
+    """
+    Serializer for Note model.
+
+    Categories are looked up with the ``category_resolver`` from the
+    serializer context when the view provides one, so a request validates
+    and assigns the category without further queries. Only the user's own
+    and the global categories are accepted.
+    """
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True, required=True)
 
     class Meta:
         model = Note
         fields = (
-            'id', 'title', 'content', 'category', 'category_id',
-            'created_at', 'updated_at', 'user_id'
+            'id', 'title', 'content', 'word_count', 'category', 'category_id',
+            'created_at', 'updated_at', 'user_id', 'version'
+        )
+        read_only_fields = (
+            'id', 'word_count', 'created_at', 'updated_at', 'user_id', 'version'
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'user_id')
+        list_serializer_class = TimedListSerializer
+
+    @property
+    def category_resolver(self):
+        resolver = self.context.get('category_resolver')
+        if resolver is None:
+            resolver = CategoryResolver(self.context['request'].user)
+            self.context['category_resolver'] = resolver
+        return resolver
 
     def validate_category_id(self, value):
-        try:
-            category = Category.objects.get(id=value)
-            return value
-        except Category.DoesNotExist:
+        if self.category_resolver.get(value) is None:
             raise serializers.ValidationError("Invalid category ID")
+        return value
 
     def create(self, validated_data):
         category_id = validated_data.pop('category_id')
-        category = Category.objects.get(id=category_id)
         return Note.objects.create(
-            category=category,
+            category=self.category_resolver.get(category_id),
             **validated_data
         )
 
     def update(self, instance, validated_data):
-        # Validate category_id if provided
+        update_fields = []
+
         if 'category_id' in validated_data:
-            category_id = validated_data.pop('category_id')
-            try:
-                category = Category.objects.get(id=category_id)
+            category = self.category_resolver.get(validated_data.pop('category_id'))
+            if category.id != instance.category_id:
                 instance.category = category
-            except Category.DoesNotExist:
-                raise serializers.ValidationError({
-                    "category_id": "Invalid category ID"
-                })
-        
+                update_fields.append('category')
+
         # Update other fields
-        instance.title = validated_data.get('title', instance.title)
-        instance.content = validated_data.get('content', instance.content)
-        instance.save()
+        for field in ('title', 'content'):
+            if field in validated_data and validated_data[field] != getattr(instance, field):
+                setattr(instance, field, validated_data[field])
+                update_fields.append(field)
+
+        # Only write the changed columns, and nothing at all for a no-op
+        if update_fields:
+            try:
+                instance.save(update_fields=[*update_fields, 'updated_at'])
+            except StaleVersionError as exc:
+                raise NoteVersionConflict(exc.current_version)
         return instance
+
+
+class NoteListSerializer(SparseFieldsSerializerMixin, TimedSerializerMixin,
+                         serializers.ModelSerializer):
+    """
+    Compact representation of a note for lists: the stored plain text
+    preview instead of the full content, and the category id instead of
+    the nested category.
+    """
+    category_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Note
+        fields = (
+            'id', 'title', 'preview', 'word_count', 'category_id',
+            'created_at', 'updated_at', 'version'
+        )
+        read_only_fields = fields
+        list_serializer_class = TimedListSerializer
+
+
+class NoteDeltaOperationSerializer(serializers.Serializer):
+    """
+    A single text edit: delete ``delete`` characters at ``position`` of the
+    base content and insert ``insert`` in their place. Positions count
+    Unicode code points.
+    """
+    position = serializers.IntegerField(min_value=0)
+    delete = serializers.IntegerField(min_value=0, default=0)
+    insert = serializers.CharField(allow_blank=True, trim_whitespace=False, default='')
+
+
+class NoteDeltaSerializer(serializers.Serializer):
+    """
+    A set of text edits to apply to a note's content at ``base_version``.
+    """
+    MAX_OPERATIONS = 100
+
+    base_version = serializers.IntegerField(min_value=1)
+    operations = NoteDeltaOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"No more than {self.MAX_OPERATIONS} operations are allowed."
+            )
+        value = sorted(value, key=lambda operation: operation['position'])
+        for previous, operation in zip(value, value[1:]):
+            if previous['position'] + previous['delete'] > operation['position']:
+                raise serializers.ValidationError("Operations must not overlap.")
+        return value
+
+
+class NoteVersionSerializer(serializers.ModelSerializer):
+    """
+    Version information returned after applying a delta.
+    """
+    class Meta:
+        model = Note
+        fields = ('id', 'version', 'updated_at')
+        read_only_fields = fields
+
+
+class NoteRevisionSerializer(serializers.ModelSerializer):
+    """
+    A stored revision of a note, without its content.
+    """
+    class Meta:
+        model = NoteRevision
+        fields = ('version', 'title', 'saved_at')
+        read_only_fields = fields
+
+
+class NoteRevisionContentSerializer(serializers.Serializer):
+    """
+    The title and content of a note rebuilt at a version.
+    """
+    version = serializers.IntegerField(read_only=True)
+    title = serializers.CharField(read_only=True)
+    content = serializers.CharField(read_only=True)
+    saved_at = serializers.DateTimeField(read_only=True)
+
+
+class NoteBulkOperationSerializer(serializers.Serializer):
+    """
+    A single operation of a bulk request.
+
+    create needs category_id, update needs at least one of title, content
+    and category_id, move needs category_id, and every operation but create
+    needs the id of the note.
+    """
+    OPERATIONS = ('create', 'update', 'move', 'delete')
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=200, required=False)
+    content = serializers.CharField(allow_blank=True, trim_whitespace=False, required=False)
+    category_id = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        op = attrs['op']
+        if op != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required.'})
+        if op in ('create', 'move') and 'category_id' not in attrs:
+            raise serializers.ValidationError({'category_id': 'This field is required.'})
+        if op == 'update' and not {'title', 'content', 'category_id'} & attrs.keys():
+            raise serializers.ValidationError('Nothing to update.')
+        return attrs
+
+
+class NoteBulkSerializer(serializers.Serializer):
+    """
+    A batch of note operations. Operations are validated one by one so
+    that a single invalid operation does not reject the whole batch.
+    """
+    MAX_OPERATIONS = 1000
+
+    operations = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_OPERATIONS,
+    )
@@ -1,9 +1,39 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
+from api.benchmarks import runner
+from api.core.events import SYNC_FRAME, encode_event, make_stream_token, send
 from api.users.test.factories import UserFactory, CategoryFactory
-from api.notes.models import Note
+from api.notes.exceptions import NoteVersionConflict
+from api.notes.fields import decompress_text
+from api.notes.importers import ImportCategoryResolver, import_notes
+from api.notes.models import NOTE_PREVIEW_LENGTH, Note, NoteCounter, Tombstone
+from api.notes.revisions import diff_operations
+from api.notes.sync import SyncCursor
+from api.notes.serializers import NoteSerializer
+from api.notes.text import apply_operations
+from api.notes.views import SyncView, note_etag
+from api.users.models import Category
 
 class NoteAPITests(APITestCase):
     def setUp(self):
@@ -159,3 +189,1782 @@ class NoteCategoryFilterTests(APITestCase):
         self.assertEqual(len(response.data['results']), 8)  # Remaining items
         self.assertIsNone(response.data['next'])
         self.assertIsNotNone(response.data['previous'])
+
+
+class NoteKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        for i in range(25):
+            Note.objects.create(
+                user=self.user,
+                category=self.category,
+                title=f"Keyset note {i}"
+            )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-list')
+
+    def test_cursor_pages_cover_all_notes_once(self):
+        """Test walking the cursor pages returns every note exactly once"""
+        response = self.client.get(f"{self.url}?pagination=cursor")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 20)
+        seen = [note['id'] for note in response.data['results']]
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+        seen += [note['id'] for note in response.data['results']]
+
+        expected = list(
+            Note.objects.filter(user=self.user)
+            .order_by('-updated_at', '-id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_is_stable_when_notes_are_saved(self):
+        """Test saving a note between pages does not shift the next page"""
+        response = self.client.get(f"{self.url}?pagination=cursor")
+        first_page = [note['id'] for note in response.data['results']]
+
+        # Simulate an autosave of a note that has already been paged past
+        note = Note.objects.get(id=first_page[-1])
+        note.title = "Autosaved"
+        note.save()
+
+        response = self.client.get(response.data['next'])
+        second_page = [note['id'] for note in response.data['results']]
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(set(first_page) & set(second_page))
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns 404"""
+        response = self.client.get(f"{self.url}?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_is_rejected(self):
+        """Test ranked search results cannot be paged with a cursor"""
+        response = self.client.get(self.url, {'pagination': 'cursor', 'search': 'keyset'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('search', response.data)
+
+
+class NoteListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-list')
+
+    def create_notes(self, categories, notes_per_category):
+        for _ in range(categories):
+            category = CategoryFactory(user=self.user)
+            for i in range(notes_per_category):
+                Note.objects.create(
+                    user=self.user,
+                    category=category,
+                    title=f"Note {i}"
+                )
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        """Test listing notes does not issue a query per note or category"""
+        self.create_notes(categories=1, notes_per_category=1)
+        baseline = self.count_list_queries()
+
+        self.create_notes(categories=5, notes_per_category=4)
+        self.assertEqual(self.count_list_queries(), baseline)
+
+    def test_nested_category_note_count(self):
+        """Test nested categories report the user's note count"""
+        self.create_notes(categories=1, notes_per_category=3)
+        other_user = UserFactory()
+        Note.objects.create(
+            user=other_user,
+            category=Note.objects.first().category,
+            title="Other user's note"
+        )
+        response = self.client.get(self.url)
+        for note in response.data['results']:
+            self.assertEqual(note['category']['note_count'], 3)
+
+
+class NoteCategoryResolverTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory(user=self.user)
+        self.global_category = CategoryFactory()
+        self.private_category = CategoryFactory(user=UserFactory())
+        self.url = reverse('note-list')
+
+    def category_lookups(self, context):
+        return [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "users_category"' in query['sql']
+            and 'notecounter' not in query['sql']
+        ]
+
+    def test_create_looks_up_categories_once(self):
+        """Test creating a note loads the visible categories once"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, {'category_id': self.category.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.category_lookups(context)), 1)
+
+    def test_update_looks_up_categories_once(self):
+        """Test moving a note loads the visible categories once"""
+        note = Note.objects.create(user=self.user, category=self.category)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                reverse('note-detail', args=[note.id]),
+                {'category_id': self.global_category.id},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['category']['id'], self.global_category.id)
+        self.assertEqual(len(self.category_lookups(context)), 1)
+
+    def test_create_with_private_category(self):
+        """Test another user's category is rejected"""
+        response = self.client.post(self.url, {'category_id': self.private_category.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category_id', response.data)
+
+    def test_update_with_private_category(self):
+        """Test a note cannot be moved to another user's category"""
+        note = Note.objects.create(user=self.user, category=self.category)
+        response = self.client.patch(
+            reverse('note-detail', args=[note.id]),
+            {'category_id': self.private_category.id},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        note.refresh_from_db()
+        self.assertEqual(note.category, self.category)
+
+    def test_filter_by_private_category(self):
+        """Test filtering by another user's category returns 404"""
+        response = self.client.get(f"{self.url}?category_id={self.private_category.id}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NoteSparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title='Long note',
+            content='x' * 5000,
+        )
+        self.url = reverse('note-list')
+
+    def test_fields(self):
+        """Test fields limits the fields of each note"""
+        response = self.client.get(f"{self.url}?fields=id,title")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.note.id, 'title': 'Long note'}])
+
+    def test_exclude(self):
+        """Test exclude drops fields of each note"""
+        response = self.client.get(f"{self.url}?exclude=content,category")
+        note = response.data['results'][0]
+        self.assertNotIn('content', note)
+        self.assertNotIn('category', note)
+        self.assertEqual(note['title'], 'Long note')
+
+    def test_retrieve_fields(self):
+        """Test fields applies to a single note"""
+        response = self.client.get(
+            reverse('note-detail', args=[self.note.id]) + '?fields=id,version'
+        )
+        self.assertEqual(response.data, {'id': self.note.id, 'version': 1})
+
+    def test_unknown_field(self):
+        """Test unknown field names are rejected"""
+        response = self.client.get(f"{self.url}?fields=id,secret")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+    def test_unrendered_columns_are_not_loaded(self):
+        """Test only the columns of rendered fields are selected"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f"{self.url}?fields=id,title")
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'FROM "notes_note"' in query['sql'] and 'COUNT' not in query['sql']
+        )
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('JOIN "users_category"', sql)
+
+    def test_compact_list(self):
+        """Test compact lists return a preview and the category id"""
+        full = self.client.get(self.url)
+        response = self.client.get(f"{self.url}?compact=1")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        note = response.data['results'][0]
+        self.assertEqual(set(note), {
+            'id', 'title', 'preview', 'word_count', 'category_id',
+            'created_at', 'updated_at', 'version'
+        })
+        self.assertEqual(note['preview'], 'x' * NOTE_PREVIEW_LENGTH)
+        self.assertEqual(note['category_id'], self.category.id)
+        self.assertLess(len(response.content) * 10, len(full.content))
+
+    def test_compact_list_does_not_load_content(self):
+        """Test compact lists read the stored preview instead of the content"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f"{self.url}?compact=1")
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if 'FROM "notes_note"' in query['sql'] and 'COUNT' not in query['sql']
+        )
+        self.assertNotIn('"content"', sql)
+        self.assertIn('"preview"', sql)
+
+    def test_compact_list_with_fields(self):
+        """Test fields can be combined with compact lists"""
+        response = self.client.get(f"{self.url}?compact=1&fields=id,preview")
+        self.assertEqual(
+            response.data['results'],
+            [{'id': self.note.id, 'preview': 'x' * NOTE_PREVIEW_LENGTH}],
+        )
+
+    def test_fields_ignored_on_write(self):
+        """Test fields does not limit the response of a write"""
+        response = self.client.post(
+            f"{self.url}?fields=id", {'category_id': self.category.id}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('category', response.data)
+
+
+class NoteTextStatsTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user, category=self.category, content='# Plan\n\nShip **it** now'
+        )
+
+    def test_save_stores_preview_and_word_count(self):
+        """Test saving a note stores its plain text preview and word count"""
+        self.assertEqual(self.note.preview, 'Plan Ship it now')
+        self.assertEqual(self.note.word_count, 4)
+
+    def test_preview_is_truncated(self):
+        """Test the preview holds at most NOTE_PREVIEW_LENGTH characters"""
+        note = Note.objects.create(user=self.user, category=self.category, content='word ' * 500)
+        self.assertEqual(len(note.preview), NOTE_PREVIEW_LENGTH - 1)
+        self.assertEqual(note.word_count, 500)
+
+    def test_update(self):
+        """Test updating the content through the API refreshes the stats"""
+        response = self.client.patch(
+            reverse('note-detail', args=[self.note.id]), {'content': 'One two'}
+        )
+        self.assertEqual(response.data['word_count'], 2)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.preview, 'One two')
+
+    def test_title_update_keeps_stats(self):
+        """Test saving other fields does not rewrite the stats"""
+        with CaptureQueriesContext(connection) as context:
+            self.note.title = 'Renamed'
+            self.note.save(update_fields=['title'])
+        update = next(q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE'))
+        self.assertNotIn('"preview"', update)
+
+    def test_delta(self):
+        """Test applying a delta refreshes the stats"""
+        response = self.client.post(
+            reverse('note-delta', args=[self.note.id]),
+            {'base_version': 1, 'operations': [{'position': 0, 'delete': 6, 'insert': 'Just'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.preview, 'Just Ship it now')
+        self.assertEqual(self.note.word_count, 4)
+
+    def test_bulk(self):
+        """Test bulk creates and updates store the stats"""
+        response = self.client.post(reverse('note-bulk'), {'operations': [
+            {'op': 'create', 'category_id': self.category.id, 'content': '- a\n- b'},
+            {'op': 'update', 'id': self.note.id, 'content': '_Done_'},
+        ]}, format='json')
+        created = Note.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual((created.preview, created.word_count), ('a b', 2))
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.preview, self.note.word_count), ('Done', 1))
+
+    def test_backfill_command(self):
+        """Test the backfill command fixes stale stats in batches"""
+        Note.objects.update(preview='', word_count=0)
+        Note.objects.create(user=self.user, category=self.category, content='Fresh')
+        out = StringIO()
+        call_command('backfill_note_previews', '--batch-size', '1', stdout=out)
+        self.assertIn('1 updated', out.getvalue())
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.word_count, 4)
+        self.assertEqual(self.note.version, 1)
+
+    def test_migration_backfills_stats(self):
+        """Test the migration adding the stats fills them for existing notes"""
+        migration = import_module('api.notes.migrations.0006_note_preview_word_count')
+        Note.objects.update(preview='', word_count=0)
+        with patch.object(migration, 'BATCH_SIZE', 1):
+            migration.fill_text_stats(apps, connection.schema_editor())
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.preview, 'Plan Ship it now')
+        self.assertEqual(self.note.word_count, 4)
+
+
+@override_settings(NOTE_COMPRESSION_ENABLED=True, NOTE_COMPRESSION_THRESHOLD=100)
+class NoteCompressionTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory()
+        self.large = 'All work and no play. ' * 50
+        self.note = Note.objects.create(
+            user=self.user, category=self.category, content=self.large
+        )
+
+    def test_large_content_is_compressed(self):
+        """Test content above the threshold is stored compressed"""
+        stored = Note.objects.values('content', 'content_compressed').get(id=self.note.id)
+        self.assertEqual(stored['content'], '')
+        self.assertLess(len(stored['content_compressed']), len(self.large) // 5)
+        self.assertEqual(Note.objects.get(id=self.note.id).content, self.large)
+
+    def test_small_content_is_not_compressed(self):
+        """Test content below the threshold is stored as text"""
+        note = Note.objects.create(user=self.user, category=self.category, content='Short')
+        stored = Note.objects.values('content', 'content_compressed').get(id=note.id)
+        self.assertEqual(stored, {'content': 'Short', 'content_compressed': None})
+
+    def test_content_is_decompressed_lazily(self):
+        """Test content is only decompressed when it is read"""
+        note = Note.objects.get(id=self.note.id)
+        with patch('api.notes.fields.decompress_text', wraps=decompress_text) as decompress:
+            self.assertEqual(note.title, 'Untitled Note')
+            decompress.assert_not_called()
+            self.assertEqual(note.content, self.large)
+            self.assertEqual(note.content, self.large)
+        decompress.assert_called_once()
+
+    @override_settings(NOTE_COMPRESSION_ENABLED=False)
+    def test_disabled(self):
+        """Test nothing is compressed while compression is disabled"""
+        note = Note.objects.create(user=self.user, category=self.category, content=self.large)
+        self.assertIsNone(Note.objects.values_list('content_compressed', flat=True).get(id=note.id))
+        # Notes compressed before are still read
+        self.assertEqual(Note.objects.get(id=self.note.id).content, self.large)
+
+    def test_search(self):
+        """Test compressed notes are found by the words of their content"""
+        self.assertEqual(Note.objects.get(id=self.note.id).search_words, 'all work and no play')
+        response = self.client.get(reverse('note-list'), {'search': 'PLAY wor'})
+        self.assertEqual([note['id'] for note in response.data['results']], [self.note.id])
+
+        self.client.patch(reverse('note-detail', args=[self.note.id]), {'content': 'Short'})
+        self.assertEqual(Note.objects.get(id=self.note.id).search_words, '')
+        response = self.client.get(reverse('note-list'), {'search': 'play'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_api(self):
+        """Test the API reads and writes compressed content transparently"""
+        url = reverse('note-detail', args=[self.note.id])
+        self.assertEqual(self.client.get(url).data['content'], self.large)
+        response = self.client.get(reverse('note-list'))
+        self.assertEqual(response.data['results'][0]['content'], self.large)
+        response = self.client.get(reverse('note-list') + '?compact=1')
+        self.assertEqual(response.data['results'][0]['preview'], self.note.preview)
+
+        self.client.patch(url, {'content': 'Short again'})
+        stored = Note.objects.values('content', 'content_compressed').get(id=self.note.id)
+        self.assertEqual(stored, {'content': 'Short again', 'content_compressed': None})
+
+    def test_delta(self):
+        """Test deltas apply to compressed content"""
+        response = self.client.post(
+            reverse('note-delta', args=[self.note.id]),
+            {'base_version': 1, 'operations': [{'position': 0, 'delete': 3, 'insert': 'No'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 2)
+        note = Note.objects.get(id=self.note.id)
+        self.assertEqual(note.content, 'No' + self.large[3:])
+        self.assertIsNotNone(note.content_compressed)
+        self.assertTrue(note.preview.startswith('No work'))
+
+    def test_delta_past_end(self):
+        """Test deltas past the end of compressed content are rejected"""
+        response = self.client.post(
+            reverse('note-delta', args=[self.note.id]),
+            {'base_version': 1, 'operations': [{'position': len(self.large) + 1, 'insert': '!'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk(self):
+        """Test bulk creates and updates store large content compressed"""
+        response = self.client.post(reverse('note-bulk'), {'operations': [
+            {'op': 'create', 'category_id': self.category.id, 'content': self.large},
+            {'op': 'update', 'id': self.note.id, 'content': 'Tiny'},
+        ]}, format='json')
+        created = Note.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual(created.content_raw, '')
+        self.assertEqual(created.content, self.large)
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.content_raw, self.note.content_compressed), ('Tiny', None))
+
+    def test_export(self):
+        """Test exports contain the decompressed content"""
+        response = self.client.get(reverse('note-export'))
+        record = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(record['content'], self.large)
+
+    def test_compress_command(self):
+        """Test the command migrates stored content to the current settings"""
+        with override_settings(NOTE_COMPRESSION_ENABLED=False):
+            plain = Note.objects.create(user=self.user, category=self.category, content=self.large)
+
+        out = StringIO()
+        call_command('compress_note_content', '--dry-run', stdout=out)
+        self.assertIn('1 notes would be rewritten', out.getvalue())
+        self.assertEqual(Note.objects.get(id=plain.id).content_raw, self.large)
+
+        call_command('compress_note_content', stdout=StringIO())
+        plain = Note.objects.get(id=plain.id)
+        self.assertEqual(plain.content_raw, '')
+        self.assertEqual(plain.content, self.large)
+        self.assertEqual(plain.search_words, 'all work and no play')
+        self.assertEqual(plain.version, 1)
+
+        with override_settings(NOTE_COMPRESSION_ENABLED=False):
+            call_command('compress_note_content', stdout=StringIO())
+        self.assertFalse(Note.objects.filter(content_compressed__isnull=False).exists())
+        self.assertFalse(Note.objects.exclude(search_words='').exists())
+        self.assertEqual(Note.objects.get(id=self.note.id).content_raw, self.large)
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory(user=self.user)
+        self.global_category = CategoryFactory()
+        self.notes = [
+            Note.objects.create(user=self.user, category=self.category, title=f'Note {i}')
+            for i in range(3)
+        ]
+        Note.objects.create(user=UserFactory(), category=self.global_category)
+        self.url = reverse('sync')
+
+    def age_everything(self):
+        """Move every existing row out of the cursor overlap window"""
+        past = timezone.now() - timedelta(hours=1)
+        Note.objects.update(updated_at=past)
+        Category.objects.update(updated_at=past)
+
+    def sync(self, cursor=None, **params):
+        if cursor is not None:
+            params['since'] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_full_sync(self):
+        """Test syncing without a cursor returns everything"""
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertFalse(data['has_more'])
+        self.assertEqual({n['id'] for n in data['notes']}, {n.id for n in self.notes})
+        self.assertEqual(
+            {c['id'] for c in data['categories']},
+            {self.category.id, self.global_category.id},
+        )
+        self.assertEqual(data['deleted'], {'notes': [], 'categories': []})
+
+    def test_incremental_sync(self):
+        """Test a cursor returns only what changed since"""
+        self.age_everything()
+        cursor = self.sync()['cursor']
+
+        updated, deleted = self.notes[0], self.notes[1]
+        self.client.patch(reverse('note-detail', args=[updated.id]), {'title': 'Changed'})
+        self.client.delete(reverse('note-detail', args=[deleted.id]))
+        created = self.client.post(reverse('note-list'), {'category_id': self.category.id})
+        kept = CategoryFactory(user=self.user)
+        other = CategoryFactory(user=self.user)
+        self.client.delete(reverse('category-detail', args=[other.id]))
+
+        data = self.sync(cursor)
+        self.assertFalse(data['reset'])
+        self.assertEqual(
+            {n['id'] for n in data['notes']}, {updated.id, created.data['id']}
+        )
+        self.assertEqual(data['deleted'], {'notes': [deleted.id], 'categories': [other.id]})
+        # Their note counts changed, so every category is sent
+        self.assertEqual(
+            {c['id'] for c in data['categories']},
+            {self.category.id, self.global_category.id, kept.id},
+        )
+
+    def test_category_changes_without_note_changes(self):
+        """Test only changed categories are sent when no note changed"""
+        self.age_everything()
+        cursor = self.sync()['cursor']
+        kept = CategoryFactory(user=self.user)
+        data = self.sync(cursor)
+        self.assertEqual([c['id'] for c in data['categories']], [kept.id])
+
+    def test_category_delete_uncategorizes_notes(self):
+        """Test notes of a deleted category are synced as uncategorized"""
+        self.age_everything()
+        cursor = self.sync()['cursor']
+        response = self.client.delete(reverse('category-detail', args=[self.category.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['categories'], [self.category.id])
+        self.assertEqual(
+            {(n['id'], n['category'], n['version']) for n in data['notes']},
+            {(n.id, None, n.version + 1) for n in self.notes},
+        )
+
+    def test_nothing_changed(self):
+        """Test syncing again without changes returns nothing"""
+        self.age_everything()
+        data = self.sync(self.sync()['cursor'])
+        self.assertEqual(data['notes'], [])
+        self.assertEqual(data['categories'], [])
+
+    def test_other_users_deletions(self):
+        """Test only the user's and global deletions are returned"""
+        self.age_everything()
+        cursor = self.sync()['cursor']
+        other_note = Note.objects.exclude(user=self.user).get()
+        other_note.delete()
+        category_id = self.global_category.id
+        Tombstone.objects.record(Tombstone.CATEGORY, None, [category_id])
+        self.global_category.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted'], {'notes': [], 'categories': [category_id]})
+
+    def test_bulk_delete_leaves_tombstones(self):
+        """Test notes deleted in bulk are reported as deleted"""
+        self.age_everything()
+        cursor = self.sync()['cursor']
+        self.client.post(reverse('note-bulk'), {'operations': [
+            {'op': 'delete', 'id': note.id} for note in self.notes
+        ]}, format='json')
+        data = self.sync(cursor)
+        self.assertEqual(sorted(data['deleted']['notes']), sorted(n.id for n in self.notes))
+
+    def test_paging(self):
+        """Test notes are paged and every note is sent once"""
+        self.notes[0].save()
+        self.notes[1].save()
+        with patch.object(SyncView, 'page_size', 2):
+            first = self.sync()
+            self.assertTrue(first['has_more'])
+            self.assertIn('categories', first)
+            second = self.sync(first['cursor'])
+        self.assertFalse(second['has_more'])
+        self.assertNotIn('categories', second)
+        ids = [n['id'] for n in first['notes'] + second['notes']]
+        self.assertEqual(sorted(ids), sorted(n.id for n in self.notes))
+
+    def test_expired_cursor(self):
+        """Test a cursor older than the kept tombstones resets the client"""
+        old = SyncCursor(timezone.now() - timedelta(days=365)).encode()
+        data = self.sync(old)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['notes']), 3)
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get(self.url, {'since': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compact(self):
+        """Test notes can be synced in the compact representation"""
+        data = self.sync(compact=1)
+        self.assertIn('preview', data['notes'][0])
+        self.assertNotIn('content', data['notes'][0])
+
+    def test_prune_command(self):
+        """Test old tombstones are pruned"""
+        Tombstone.objects.record(Tombstone.NOTE, self.user.pk, [1, 2])
+        Tombstone.objects.filter(object_id=1).update(
+            deleted_at=timezone.now() - timedelta(days=60)
+        )
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('1 deleted', out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [2])
+
+
+class NoteRevisionTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+        self.category = CategoryFactory(user=self.user)
+        self.note = Note.objects.create(
+            user=self.user, category=self.category, title='Draft', content='Line one\nLine two\n'
+        )
+        self.url = reverse('note-detail', args=[self.note.id])
+
+    def edit(self, **data):
+        response = self.client.patch(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def get_version(self, version):
+        return self.client.get(reverse('note-revision', args=[self.note.id, version]))
+
+    def test_diff_round_trip(self):
+        """Test diffs turn one text into another"""
+        pairs = [
+            ('', 'new'),
+            ('old', ''),
+            ('same', 'same'),
+            ('héllo wörld', 'héllo brave wörld'),
+            ('a\nb\nc\nd\n', 'a\nB\nc\nd\ne\n'),
+            ('one\ntwo\nthree\nfour\n', 'zero\none\nthree\nfour!\n'),
+            ('x' * 50 + '\n' + 'y' * 50, 'y' * 50 + '\n' + 'x' * 50),
+        ]
+        for source, target in pairs:
+            with self.subTest(source=source, target=target):
+                operations = diff_operations(source, target)
+                self.assertEqual(apply_operations(source, operations), target)
+
+    def test_small_edit_small_diff(self):
+        """Test a one word edit of a long text is stored as one small operation"""
+        source = '\n'.join(f'Paragraph {i} of the note.' for i in range(500))
+        target = source.replace('Paragraph 250 ', 'Section 250 ')
+        operations = diff_operations(source, target)
+        self.assertEqual(len(operations), 1)
+        self.assertLess(len(operations[0]['insert']), 10)
+
+    def test_edits_record_revisions(self):
+        """Test every text change is listed and can be rebuilt"""
+        texts = {1: ('Draft', 'Line one\nLine two\n')}
+        for i in range(2, 8):
+            data = self.edit(title=f'Title {i}', content=f'Line one\nLine {i}\nLine two\n')
+            texts[data['version']] = (data['title'], data['content'])
+
+        response = self.client.get(reverse('note-revisions', args=[self.note.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['version'] for r in response.data['results']], [6, 5, 4, 3, 2, 1])
+        self.assertEqual(response.data['results'][-1]['title'], 'Draft')
+
+        for version, (title, content) in texts.items():
+            response = self.get_version(version)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((response.data['title'], response.data['content']), (title, content))
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_revision_list_query_count(self):
+        """Test listing revisions takes the same queries for any number of them"""
+        url = reverse('note-revisions', args=[self.note.id])
+        self.edit(content='One')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        expected = len(context.captured_queries)
+        for i in range(5):
+            self.edit(content=f'Edit {i}')
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 6)
+
+    @override_settings(NOTE_REVISION_KEYFRAME_INTERVAL=3)
+    def test_keyframes(self):
+        """Test a full copy is stored every interval and bounds rebuilding"""
+        contents = {1: self.note.content}
+        for i in range(2, 10):
+            contents[i] = self.edit(content=f'Content {i}\n' * 20)['content']
+        chains = list(self.note.revisions.order_by('version').values_list('chain', flat=True))
+        self.assertEqual(chains, [1, 2, 0, 1, 2, 0, 1, 2])
+        keyframe = self.note.revisions.get(version=3)
+        self.assertIsNone(keyframe.operations)
+        self.assertEqual(keyframe.get_content(), contents[3])
+
+        for version, content in contents.items():
+            self.assertEqual(self.get_version(version).data['content'], content)
+        # Version 1 is rebuilt from the keyframe at 3 with two diffs
+        with CaptureQueriesContext(connection) as queries:
+            self.get_version(1)
+        revision_queries = [q for q in queries if 'notes_noterevision' in q['sql']]
+        self.assertEqual(len(revision_queries), 1)
+
+    def test_unchanged_text_no_revision(self):
+        """Test moving a note or saving the same text records nothing"""
+        other = CategoryFactory(user=self.user)
+        self.edit(category_id=other.id)
+        self.edit(title='Draft')
+        self.assertFalse(self.note.revisions.exists())
+        self.assertEqual(self.get_version(1).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_version(self):
+        """Test versions without a revision and other users' notes are not found"""
+        self.edit(content='Changed')
+        self.assertEqual(self.get_version(5).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(user=UserFactory())
+        self.assertEqual(self.get_version(1).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('note-revisions', args=[self.note.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delta_records_revision(self):
+        """Test text deltas record the deleted text as a revision"""
+        for interval in (20, 1):
+            with self.subTest(interval=interval), override_settings(
+                NOTE_REVISION_KEYFRAME_INTERVAL=interval
+            ):
+                self.note.refresh_from_db()
+                before = self.note.content
+                response = self.client.post(
+                    reverse('note-delta', args=[self.note.id]),
+                    {'base_version': self.note.version, 'operations': [
+                        {'position': 0, 'delete': 4, 'insert': 'First'},
+                        {'position': 9, 'delete': 0, 'insert': ' more'},
+                    ]},
+                    format='json',
+                )
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                response = self.get_version(response.data['version'] - 1)
+                self.assertEqual(response.data['content'], before)
+
+    def test_bulk_records_revisions(self):
+        """Test bulk updates record the previous text"""
+        self.client.post(reverse('note-bulk'), {'operations': [
+            {'op': 'update', 'id': self.note.id, 'title': 'Bulk', 'content': 'Replaced'},
+        ]}, format='json')
+        response = self.get_version(1)
+        self.assertEqual(response.data['title'], 'Draft')
+        self.assertEqual(response.data['content'], 'Line one\nLine two\n')
+        self.assertEqual(self.get_version(2).data['content'], 'Replaced')
+
+    @override_settings(NOTE_COMPRESSION_ENABLED=True, NOTE_COMPRESSION_THRESHOLD=100)
+    def test_compressed_content(self):
+        """Test revisions of notes stored compressed"""
+        large = '\n'.join(['A long line of text.'] * 50)
+        self.edit(content=large)
+        self.edit(content=large + '\nThe end.')
+        self.assertEqual(self.get_version(2).data['content'], large)
+        self.assertEqual(self.get_version(1).data['content'], 'Line one\nLine two\n')
+
+    def test_storage_overhead(self):
+        """Test autosaves take a small fraction of storing full copies"""
+        words = [f'word{i}' for i in range(2000)]
+        for i in range(30):
+            words[i * 50] = f'edit{i}'
+            self.edit(content=' '.join(words))
+        full_copies = sum(
+            len(' '.join(words).encode()) for _ in self.note.revisions.all()
+        )
+        stored = sum(
+            len(json.dumps(r.operations or [])) + len(r.content or b'') + len(r.title)
+            for r in self.note.revisions.all()
+        )
+        self.assertLess(stored, full_copies * 0.05)
+
+    @override_settings(NOTE_REVISIONS_ENABLED=False)
+    def test_disabled(self):
+        """Test no revisions are recorded when turned off"""
+        self.edit(content='Changed')
+        self.assertFalse(self.note.revisions.exists())
+
+
+class NoteCounterTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.other_category = CategoryFactory()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-list')
+
+    def get_count(self, category):
+        counter = NoteCounter.objects.filter(user=self.user, category=category).first()
+        return counter.count if counter else 0
+
+    def test_counters_follow_create_move_and_delete(self):
+        """Test counters are maintained by the notes endpoints"""
+        response = self.client.post(self.url, {'category_id': self.category.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_count(self.category), 1)
+
+        detail_url = reverse('note-detail', kwargs={'pk': response.data['id']})
+        self.client.patch(detail_url, {'category_id': self.other_category.id})
+        self.assertEqual(self.get_count(self.category), 0)
+        self.assertEqual(self.get_count(self.other_category), 1)
+
+        self.client.patch(detail_url, {'title': 'Same category'})
+        self.assertEqual(self.get_count(self.other_category), 1)
+
+        response = self.client.delete(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.get_count(self.other_category), 0)
+
+    def test_reconcile_fixes_drift(self):
+        """Test the rebuild command repairs counters that drifted"""
+        for _ in range(3):
+            Note.objects.create(user=self.user, category=self.category)
+        NoteCounter.objects.filter(user=self.user).update(count=42)
+        NoteCounter.objects.create(user=self.user, category=self.other_category, count=7)
+
+        out = StringIO()
+        call_command('rebuild_note_counters', stdout=out)
+        self.assertIn('1 updated', out.getvalue())
+        self.assertIn('1 deleted', out.getvalue())
+        self.assertEqual(self.get_count(self.category), 3)
+        self.assertFalse(
+            NoteCounter.objects.filter(user=self.user, category=self.other_category).exists()
+        )
+
+    def test_reconcile_dry_run(self):
+        """Test a dry run reports drift without writing"""
+        Note.objects.create(user=self.user, category=self.category)
+        NoteCounter.objects.all().delete()
+        result = NoteCounter.objects.reconcile(dry_run=True)
+        self.assertEqual(result['created'], 1)
+        self.assertFalse(NoteCounter.objects.exists())
+
+
+class NoteSearchTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.groceries = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title="Groceries",
+            content="Buy apples and oranges"
+        )
+        self.recipe = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title="Apple pie",
+            content="Bake at 180 degrees"
+        )
+        Note.objects.create(
+            user=UserFactory(),
+            category=self.category,
+            title="Someone else's apples"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-list')
+
+    def search(self, terms):
+        response = self.client.get(self.url, {'search': terms})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {note['id'] for note in response.data['results']}
+
+    def test_search_matches_title_and_content_prefix(self):
+        """Test search matches word prefixes in title and content"""
+        self.assertEqual(self.search('appl'), {self.groceries.id, self.recipe.id})
+
+    def test_search_requires_every_word(self):
+        """Test every search word has to match"""
+        self.assertEqual(self.search('apple bake'), {self.recipe.id})
+        self.assertEqual(self.search('apple bananas'), set())
+
+    def test_search_ignores_punctuation(self):
+        """Test punctuation in the search terms is ignored"""
+        self.assertEqual(self.search('oranges & !'), {self.groceries.id})
+
+
+class NoteDeltaTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title="Delta",
+            content="Hello world"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-delta', kwargs={'pk': self.note.id})
+
+    def post_delta(self, operations, base_version=None):
+        data = {
+            'base_version': base_version or self.note.version,
+            'operations': operations,
+        }
+        return self.client.post(self.url, data, format='json')
+
+    def test_apply_delta(self):
+        """Test operations are applied against the base content"""
+        response = self.post_delta([
+            {'position': 0, 'delete': 5, 'insert': 'Goodbye'},
+            {'position': 11, 'insert': '!'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], self.note.version + 1)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, "Goodbye world!")
+        self.assertEqual(self.note.version, response.data['version'])
+
+    def test_apply_delta_with_unicode(self):
+        """Test positions count code points"""
+        self.note.content = "café \U0001F600 ok"
+        self.note.save()
+        response = self.post_delta([{'position': 7, 'delete': 2, 'insert': 'fine'}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, "café \U0001F600 fine")
+
+    def test_stale_base_version_conflicts(self):
+        """Test a delta against an old version is rejected"""
+        base_version = self.note.version
+        self.client.patch(reverse('note-detail', kwargs={'pk': self.note.id}), {'content': 'Changed'})
+        response = self.post_delta([{'position': 0, 'insert': 'x'}], base_version=base_version)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['version'], base_version + 1)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, 'Changed')
+
+    def test_operations_out_of_range(self):
+        """Test operations past the end of the content are rejected"""
+        response = self.post_delta([{'position': 5, 'delete': 100}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('operations', response.data)
+
+    def test_overlapping_operations(self):
+        """Test overlapping operations are rejected"""
+        response = self.post_delta([
+            {'position': 0, 'delete': 3},
+            {'position': 2, 'insert': 'x'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delta_other_user_note(self):
+        """Test applying a delta to another user's note"""
+        other_note = Note.objects.create(user=UserFactory(), category=self.category)
+        url = reverse('note-delta', kwargs={'pk': other_note.id})
+        response = self.client.post(
+            url, {'base_version': 1, 'operations': [{'position': 0, 'insert': 'x'}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NoteConditionalRequestTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title="Conditional",
+            content="Content"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-detail', kwargs={'pk': self.note.id})
+
+    def test_retrieve_returns_etag(self):
+        """Test retrieving a note returns its ETag"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{self.note.id}-{self.note.version}"')
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test an unchanged note returns 304 without loading the note"""
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn('"content"', selects[0])
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.patch(self.url, {'title': 'Changed'})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Changed')
+
+    def test_sparse_fields_have_their_own_etag(self):
+        """Test responses limited to some fields are not validated by the full ETag"""
+        full = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, {'fields': 'id,title'}, HTTP_IF_NONE_MATCH=full)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        sparse = response['ETag']
+        self.assertNotEqual(sparse, full)
+        self.assertEqual(
+            self.client.get(self.url, {'fields': 'title, id'})['ETag'], sparse
+        )
+        response = self.client.get(self.url, {'fields': 'id,title'}, HTTP_IF_NONE_MATCH=sparse)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=sparse)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_without_version_field(self):
+        """Test excluding the version field still returns an ETag"""
+        response = self.client.get(self.url, {'exclude': 'version'})
+        self.assertNotIn('version', response.data)
+        self.assertEqual(
+            response['ETag'], note_etag(self.note.id, self.note.version, {'exclude': ['version']})
+        )
+
+    def test_cors_allows_conditional_requests(self):
+        """Test the frontend may send If-Match and read the ETag cross-origin"""
+        origin = {'HTTP_ORIGIN': settings.FRONTEND_BASE_URL}
+        response = self.client.options(
+            self.url,
+            HTTP_ACCESS_CONTROL_REQUEST_METHOD='PATCH',
+            HTTP_ACCESS_CONTROL_REQUEST_HEADERS='authorization, content-type, if-match',
+            **origin,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('if-match', response['Access-Control-Allow-Headers'])
+        response = self.client.get(self.url, **origin)
+        self.assertEqual(response['Access-Control-Expose-Headers'], 'ETag')
+
+    def test_update_bumps_version(self):
+        """Test every change increments the version"""
+        response = self.client.patch(self.url, {'title': 'Changed'})
+        self.assertEqual(response.data['version'], self.note.version + 1)
+        self.assertEqual(response['ETag'], f'"{self.note.id}-{self.note.version + 1}"')
+
+    def test_noop_update_does_not_write(self):
+        """Test a patch without changes does not bump the version"""
+        response = self.client.patch(self.url, {'title': self.note.title})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], self.note.version)
+
+    def test_if_match_mismatch_is_rejected(self):
+        """Test a stale If-Match is rejected with 412"""
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'content': 'From another tab'})
+        response = self.client.patch(self.url, {'content': 'Stale'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, 'From another tab')
+
+    def test_if_match_current_is_accepted(self):
+        """Test a current If-Match lets the update through"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'content': 'Fresh'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_concurrent_save_conflicts(self):
+        """Test saving a stale instance does not clobber a newer write"""
+        stale = Note.objects.get(id=self.note.id)
+        self.client.patch(self.url, {'content': 'Newer'})
+        serializer = NoteSerializer(stale, data={'content': 'Older'}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        with self.assertRaises(NoteVersionConflict):
+            serializer.save()
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, 'Newer')
+
+
+class NoteResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user,
+            category=self.category,
+            title="Cached"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.list_url = reverse('note-list')
+        self.detail_url = reverse('note-detail', kwargs={'pk': self.note.id})
+
+    def test_list_is_served_from_cache(self):
+        """Test a repeated list is a cache hit without queries"""
+        self.assertEqual(self.client.get(self.list_url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(response.data['results'][0]['title'], 'Cached')
+
+    def test_cached_detail_keeps_etag(self):
+        """Test a detail served from cache still carries the note's ETag"""
+        etag = f'"{self.note.id}-{self.note.version}"'
+        self.assertEqual(self.client.get(self.detail_url)['ETag'], etag)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_cache_is_per_user(self):
+        """Test cached responses are not shared between users"""
+        self.client.get(self.list_url)
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_write_invalidates_cache(self):
+        """Test updating a note drops the cached list and detail"""
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        self.client.patch(self.detail_url, {'title': 'Changed'})
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Changed')
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Changed')
+
+    def test_delta_invalidates_cache(self):
+        """Test applying a delta drops the cached detail"""
+        self.client.get(self.detail_url)
+        self.client.post(
+            reverse('note-delta', kwargs={'pk': self.note.id}),
+            {'base_version': self.note.version, 'operations': [{'position': 0, 'insert': 'Hi'}]},
+            format='json'
+        )
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['content'], 'Hi')
+
+    def test_global_category_change_invalidates_cache(self):
+        """Test renaming a global category drops every user's cache"""
+        self.client.get(self.list_url)
+        self.category.name = 'Renamed'
+        self.category.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['category']['name'], 'Renamed')
+
+    @override_settings(API_CACHE_ENABLED=False)
+    def test_cache_disabled(self):
+        """Test the cache can be switched off"""
+        self.client.get(self.list_url)
+        response = self.client.get(self.list_url)
+        self.assertNotIn('X-Cache', response)
+
+
+class NoteBulkTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.other_category = CategoryFactory()
+        self.notes = [
+            Note.objects.create(user=self.user, category=self.category, title=f"Bulk {i}")
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-bulk')
+
+    def post_bulk(self, operations):
+        return self.client.post(self.url, {'operations': operations}, format='json')
+
+    def get_count(self, category):
+        counter = NoteCounter.objects.filter(user=self.user, category=category).first()
+        return counter.count if counter else 0
+
+    def test_bulk_operations(self):
+        """Test every operation type is applied with per-item results"""
+        first, second, third = self.notes
+        response = self.post_bulk([
+            {'op': 'create', 'title': 'New', 'category_id': self.category.id},
+            {'op': 'update', 'id': first.id, 'content': 'Updated content'},
+            {'op': 'move', 'id': second.id, 'category_id': self.other_category.id},
+            {'op': 'delete', 'id': third.id},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['ok'] * 4)
+
+        created = Note.objects.get(id=results[0]['id'])
+        self.assertEqual(created.title, 'New')
+        first.refresh_from_db()
+        self.assertEqual(first.content, 'Updated content')
+        self.assertEqual(first.title, 'Bulk 0')
+        self.assertEqual(first.version, 2)
+        second.refresh_from_db()
+        self.assertEqual(second.category_id, self.other_category.id)
+        self.assertFalse(Note.objects.filter(id=third.id).exists())
+
+        self.assertEqual(self.get_count(self.category), 2)
+        self.assertEqual(self.get_count(self.other_category), 1)
+
+    def test_invalid_operations_are_reported(self):
+        """Test invalid operations fail individually"""
+        other_note = Note.objects.create(user=UserFactory(), category=self.category)
+        private_category = CategoryFactory(user=UserFactory())
+        response = self.post_bulk([
+            {'op': 'delete', 'id': other_note.id},
+            {'op': 'move', 'id': self.notes[0].id, 'category_id': private_category.id},
+            {'op': 'create'},
+            {'op': 'explode', 'id': self.notes[0].id},
+            {'op': 'delete', 'id': self.notes[1].id},
+            {'op': 'update', 'id': self.notes[1].id, 'title': 'Twice'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, ['error', 'error', 'error', 'error', 'ok', 'error'])
+        self.assertTrue(Note.objects.filter(id=other_note.id).exists())
+        self.assertFalse(Note.objects.filter(id=self.notes[1].id).exists())
+
+    def test_query_count_is_constant(self):
+        """Test the number of queries does not grow with the batch size"""
+        def count_queries(notes):
+            operations = [
+                {'op': 'move', 'id': note.id, 'category_id': self.other_category.id}
+                for note in notes
+            ] + [{'op': 'create', 'category_id': self.category.id} for _ in notes]
+            with CaptureQueriesContext(connection) as context:
+                self.post_bulk(operations)
+            return len(context.captured_queries)
+
+        # Warm up so that both measured batches find existing counters
+        count_queries(self.notes[:1])
+        small = count_queries(self.notes[1:2])
+        more = [Note.objects.create(user=self.user, category=self.category) for _ in range(10)]
+        self.assertEqual(count_queries(more), small)
+
+    def test_delete_invalidates_cache_once(self):
+        """Test a batch of deletes drops the cache once and removes revisions"""
+        first = self.notes[0]
+        first.title = 'Renamed'
+        first.save()
+        with patch('api.notes.bulk.invalidate_user') as bulk_invalidate, \
+                patch('api.notes.models.invalidate_user') as signal_invalidate:
+            response = self.post_bulk([{'op': 'delete', 'id': note.id} for note in self.notes])
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok'] * 3)
+        self.assertEqual(bulk_invalidate.call_count, 1)
+        signal_invalidate.assert_not_called()
+        self.assertFalse(Note.objects.filter(user=self.user).exists())
+        self.assertFalse(first.revisions.exists())
+
+    def test_delete_sends_deleted_events_once(self):
+        """Test each deleted note gets one deleted event"""
+        with patch('api.notes.bulk.publish_note_event') as bulk_publish, \
+                patch('api.notes.models.publish_note_event') as signal_publish:
+            self.post_bulk([{'op': 'delete', 'id': note.id} for note in self.notes])
+        self.assertEqual(
+            [call.args[1] for call in bulk_publish.call_args_list], ['deleted'] * 3
+        )
+        signal_publish.assert_not_called()
+
+    def test_unchanged_update_is_not_written(self):
+        """Test an update to the current values keeps the version and sends no event"""
+        first, second, _ = self.notes
+        with patch('api.notes.bulk.publish_note_event') as publish, \
+                patch('api.notes.bulk.invalidate_user') as invalidate:
+            response = self.post_bulk([
+                {'op': 'update', 'id': first.id, 'title': first.title, 'content': first.content},
+                {'op': 'move', 'id': second.id, 'category_id': self.category.id},
+            ])
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'ok'])
+        publish.assert_not_called()
+        invalidate.assert_not_called()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.version, second.version), (1, 1))
+        self.assertFalse(first.revisions.exists())
+
+    def test_empty_batch(self):
+        """Test an empty batch is rejected"""
+        response = self.post_bulk([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NoteExportTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory(name='Work Stuff')
+        self.notes = [
+            Note.objects.create(
+                user=self.user,
+                category=self.category,
+                title=f"Export {i}",
+                content=f"Line one\nLine {i}"
+            )
+            for i in range(3)
+        ]
+        Note.objects.create(user=self.user, category=None, title="Loose")
+        Note.objects.create(user=UserFactory(), category=self.category, title="Not mine")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-export')
+
+    def test_export_ndjson(self):
+        """Test every note of the user is exported as one JSON line"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        with CaptureQueriesContext(connection) as context:
+            body = b''.join(response.streaming_content).decode()
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([line['title'] for line in lines], ['Export 0', 'Export 1', 'Export 2', 'Loose'])
+        self.assertEqual(lines[0]['category']['name'], 'Work Stuff')
+        self.assertEqual(lines[0]['content'], 'Line one\nLine 0')
+        self.assertIsNone(lines[3]['category'])
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_export_markdown_zip(self):
+        """Test the Markdown export is a zip with a file per note"""
+        response = self.client.get(self.url, {'type': 'markdown'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 4)
+        path = f'work-stuff/{self.notes[0].id}-export-0.md'
+        self.assertIn(path, names)
+        self.assertIn(f'uncategorized/{Note.objects.get(title="Loose").id}-loose.md', names)
+        document = archive.read(path).decode()
+        self.assertIn('title: Export 0', document)
+        self.assertTrue(document.endswith('Line one\nLine 0'))
+
+    async def test_export_streams_under_asgi(self):
+        """Test exports are streamed as they are produced under ASGI"""
+        headers = {'Authorization': f'Token {self.user.auth_token.key}'}
+        with patch('api.notes.export.EXPORT_ASYNC_BATCH_SIZE', 1):
+            response = await self.async_client.get(self.url, headers=headers)
+        self.assertTrue(response.is_async)
+        lines = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual([line['title'] for line in lines], ['Export 0', 'Export 1', 'Export 2', 'Loose'])
+
+    def test_export_invalid_type(self):
+        """Test an unknown export type is rejected"""
+        response = self.client.get(self.url, {'type': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NoteImportTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory(name='Work')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('note-import')
+
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(self.url, {'file': upload, **data}, format='multipart')
+
+    def test_import_ndjson(self):
+        """Test NDJSON lines become notes with resolved categories"""
+        lines = [
+            {'title': 'By id', 'content': 'a', 'category': {'id': self.category.id}},
+            {'title': 'By name', 'content': 'b', 'category': {'name': 'work'}},
+            {'title': 'New category', 'category': {'name': 'Ideas', 'color': '#123456'}},
+            {'title': 'No category'},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n'
+        response = self.upload('notes.ndjson', body.encode())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['categories_created'], 2)
+
+        notes = {note.title: note for note in Note.objects.filter(user=self.user)}
+        self.assertEqual(notes['By id'].category, self.category)
+        self.assertEqual(notes['By name'].category, self.category)
+        self.assertEqual(notes['New category'].category.color, '#123456')
+        self.assertEqual(notes['No category'].category.name, 'Imported')
+        self.assertEqual(
+            NoteCounter.objects.get(user=self.user, category=self.category).count, 2
+        )
+
+    def test_import_rejects_other_users_category_id(self):
+        """Test category ids of other users are not used"""
+        private = CategoryFactory(user=UserFactory(), name='Private')
+        line = json.dumps({'title': 'Sneaky', 'category': {'id': private.id}})
+        self.upload('notes.ndjson', line.encode())
+        note = Note.objects.get(user=self.user)
+        self.assertNotEqual(note.category, private)
+
+    def test_export_import_round_trip(self):
+        """Test a Markdown export can be imported again"""
+        Note.objects.create(user=self.user, category=self.category, title='Round', content='trip\n---\nbody')
+        archive = b''.join(self.client.get(reverse('note-export'), {'type': 'markdown'}).streaming_content)
+        Note.objects.all().delete()
+
+        response = self.upload('notes.zip', archive)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        note = Note.objects.get(user=self.user)
+        self.assertEqual(note.title, 'Round')
+        self.assertEqual(note.content, 'trip\n---\nbody')
+        self.assertEqual(note.category, self.category)
+
+    def test_import_rejects_large_zip_files(self):
+        """Test Markdown files over the size limit are reported and skipped"""
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('small.md', 'Fits')
+            zip_file.writestr('large.md', 'x' * 200)
+        with patch('api.notes.importers.MAX_IMPORT_FILE_SIZE', 100):
+            response = self.upload('notes.zip', archive.getvalue())
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], ['large.md: larger than 100 bytes.'])
+        self.assertEqual(Note.objects.get(user=self.user).title, 'small')
+
+    def test_import_rejects_long_ndjson_lines(self):
+        """Test NDJSON lines over the size limit are reported and skipped"""
+        lines = [
+            json.dumps({'title': 'Short'}),
+            json.dumps({'title': 'Long', 'content': 'x' * 200}),
+            json.dumps({'title': 'After'}),
+        ]
+        with patch('api.notes.importers.MAX_IMPORT_LINE_SIZE', 100), \
+                patch('api.notes.importers.IMPORT_READ_CHUNK_SIZE', 16):
+            response = self.upload('notes.ndjson', '\n'.join(lines).encode())
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], ['Line 2: longer than 100 bytes.'])
+        titles = set(Note.objects.filter(user=self.user).values_list('title', flat=True))
+        self.assertEqual(titles, {'Short', 'After'})
+
+    def test_rolled_back_categories_are_forgotten(self):
+        """Test categories created in a rolled back batch are not resolved again"""
+        record = {'category_id': None, 'category_name': 'Lost', 'category_color': None}
+        resolver = ImportCategoryResolver(self.user)
+        state = resolver.savepoint()
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            resolver.resolve(record)
+            raise DatabaseError('Batch failed')
+        resolver.rollback(state)
+        self.assertEqual(resolver.created, 0)
+        category = resolver.resolve(record)
+        self.assertTrue(Category.objects.filter(id=category.id, name='Lost').exists())
+
+    def test_import_commits_each_batch(self):
+        """Test batches imported before a failure are kept"""
+        def records():
+            yield {'title': 'First', 'content': None, 'category_id': self.category.id,
+                   'category_name': None, 'category_color': None}
+            raise RuntimeError('Upload interrupted')
+
+        with self.assertRaises(RuntimeError):
+            import_notes(self.user, records(), batch_size=1)
+        self.assertEqual(Note.objects.get(user=self.user).title, 'First')
+        self.assertEqual(
+            NoteCounter.objects.get(user=self.user, category=self.category).count, 1
+        )
+
+    def test_import_command(self):
+        """Test the management command imports a file"""
+        line = json.dumps({'title': 'From CLI', 'category': {'name': 'Work'}})
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as file:
+            file.write(line.encode())
+            file.flush()
+            out = StringIO()
+            call_command('import_notes', self.user.email, file.name, stdout=out)
+        self.assertIn('Imported 1 notes', out.getvalue())
+        self.assertEqual(Note.objects.get(user=self.user).category, self.category)
+
+    def test_import_without_file(self):
+        """Test a request without a file is rejected"""
+        response = self.client.post(self.url, {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BenchmarkQueryCountTests(TestCase):
+    def test_query_counts_do_not_grow_with_data(self):
+        """Test no route issues more queries for a user with more notes"""
+        report = runner.run(sizes=(1, 30), iterations=2)
+        failed = [
+            (result['route'], result['status'])
+            for result in report['results'] if result['status'] >= 400
+        ]
+        self.assertEqual(failed, [])
+        self.assertEqual(runner.query_growth(report), {})
+
+    def test_query_growth_is_reported(self):
+        """Test growing query counts are reported per size"""
+        report = {'results': [
+            {'route': 'notes.list', 'size': 1, 'queries': 3},
+            {'route': 'notes.list', 'size': 100, 'queries': 103},
+            {'route': 'notes.export', 'size': 1, 'queries': 1},
+            {'route': 'notes.export', 'size': 100, 'queries': 2},
+        ]}
+        self.assertEqual(runner.query_growth(report), {'notes.list': {1: 3, 100: 103}})
+
+
+class AsyncNoteViewTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory()
+        self.note = Note.objects.create(
+            user=self.user, category=self.category, title='Async', content='Body'
+        )
+        Note.objects.create(user=UserFactory(), category=self.category, title='Other')
+        self.headers = {'Authorization': f'Token {self.user.auth_token.key}'}
+        self.list_url = reverse('async-note-list')
+        self.detail_url = reverse('async-note-detail', args=[self.note.id])
+
+    async def test_patch_content_updates_stats(self):
+        """Test the async text fast path stores the stats"""
+        response = await self.async_client.patch(
+            self.detail_url, {'content': 'Three more words'},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.json()['word_count'], 3)
+        note = await Note.objects.aget(id=self.note.id)
+        self.assertEqual(note.preview, 'Three more words')
+
+    @override_settings(NOTE_COMPRESSION_ENABLED=True, NOTE_COMPRESSION_THRESHOLD=100)
+    async def test_patch_large_content_is_compressed(self):
+        """Test the async text fast path stores large content compressed"""
+        content = ('Compress me please. ' * 20).strip()
+        response = await self.async_client.patch(
+            self.detail_url, {'content': content},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.json()['content'], content)
+        note = await Note.objects.aget(id=self.note.id)
+        self.assertEqual(note.content_raw, '')
+        self.assertEqual(note.content, content)
+
+    async def test_list_matches_sync_view(self):
+        """Test the async list returns the same page as the DRF view"""
+        response = await self.async_client.get(self.list_url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['title'], 'Async')
+        self.assertEqual(data['results'][0]['category']['note_count'], 1)
+
+        sync = await self.async_client.get(reverse('note-list'), headers=self.headers)
+        self.assertEqual(sync.json()['results'], data['results'])
+
+    async def test_requires_authentication(self):
+        """Test anonymous and bad token requests are rejected"""
+        response = await self.async_client.get(self.list_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = await self.async_client.get(
+            self.list_url, headers={'Authorization': 'Token nope'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_token_cache_off_event_loop(self):
+        """Test the token cache is read and written outside the event loop"""
+        from api.users import authentication
+
+        def in_loop():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return False
+            return True
+
+        calls = []
+
+        def get_cached_token(key):
+            calls.append(in_loop())
+            return authentication.get_cached_token(key)
+
+        def cache_token(token):
+            calls.append(in_loop())
+            authentication.cache_token(token)
+
+        with patch('api.core.async_views.get_cached_token', get_cached_token), \
+                patch('api.core.async_views.cache_token', cache_token):
+            response = await self.async_client.get(self.list_url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(calls, [False, False])
+
+    async def test_retrieve_with_etag(self):
+        """Test retrieve sets an ETag and honours If-None-Match"""
+        response = await self.async_client.get(self.detail_url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        response = await self.async_client.get(
+            self.detail_url, headers={**self.headers, 'If-None-Match': etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_retrieve_other_users_note(self):
+        """Test notes of other users are not found"""
+        other = await Note.objects.exclude(user=self.user).afirst()
+        url = reverse('async-note-detail', args=[other.id])
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_patch_content(self):
+        """Test content edits are saved and bump the version"""
+        response = await self.async_client.patch(
+            self.detail_url, {'content': 'Edited'},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['version'], 2)
+        note = await Note.objects.aget(id=self.note.id)
+        self.assertEqual((note.content, note.version), ('Edited', 2))
+
+    async def test_patch_records_revision(self):
+        """Test the async text fast path records the previous text"""
+        await self.async_client.patch(
+            self.detail_url, {'title': 'Renamed'},
+            content_type='application/json', headers=self.headers,
+        )
+        revision = await self.note.revisions.aget()
+        self.assertEqual(revision.version, 1)
+        self.assertEqual(revision.title, 'Async')
+        self.assertEqual(revision.get_operations(), [])
+
+    async def test_patch_stale_if_match(self):
+        """Test an outdated If-Match is rejected"""
+        response = await self.async_client.patch(
+            self.detail_url, {'content': 'Edited'}, content_type='application/json',
+            headers={**self.headers, 'If-Match': note_etag(self.note.id, 7)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    async def test_patch_category_updates_counters(self):
+        """Test moving a note keeps the note counters in sync"""
+        other = await sync_to_async(CategoryFactory)()
+        response = await self.async_client.patch(
+            self.detail_url, {'category_id': other.id},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counter = await NoteCounter.objects.aget(user=self.user, category=other)
+        self.assertEqual(counter.count, 1)
+
+    async def test_patch_invalid(self):
+        """Test invalid data returns the validation errors"""
+        response = await self.async_client.patch(
+            self.detail_url, {'title': 'x' * 201},
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', response.json())
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.category = CategoryFactory(user=self.user)
+        self.note = Note.objects.create(user=self.user, category=self.category)
+        self.headers = {'Authorization': f'Token {self.user.auth_token.key}'}
+        self.url = reverse('live-events')
+
+    async def open_stream(self):
+        response = await self.async_client.get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 2000\n\n' + SYNC_FRAME)
+        return stream
+
+    async def test_stream_receives_events(self):
+        """Test events of the user are pushed to the stream"""
+        stream = await self.open_stream()
+        send(uuid.uuid4(), 'note', {'id': 1})
+        send(self.user.pk, 'note', {'action': 'updated', 'id': self.note.id})
+        frame = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(frame, encode_event('note', {'action': 'updated', 'id': self.note.id}))
+        await stream.aclose()
+
+    @override_settings(LIVE_EVENTS_HEARTBEAT_SECONDS=0.01)
+    async def test_keepalive(self):
+        """Test idle streams are kept alive with comments"""
+        stream = await self.open_stream()
+        self.assertEqual(await asyncio.wait_for(anext(stream), 1), b': keepalive\n\n')
+        await stream.aclose()
+
+    @override_settings(LIVE_EVENTS_MAX_SECONDS=0)
+    async def test_stream_closes(self):
+        """Test streams are closed for the client to reconnect"""
+        stream = await self.open_stream()
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(stream), 1)
+
+    async def test_requires_authentication(self):
+        """Test anonymous clients cannot open a stream"""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_stream_token(self):
+        """Test a browser can open a stream with a token from the token endpoint"""
+        response = await self.async_client.post(
+            reverse('live-events-token'), headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = response.json()['token']
+
+        response = await self.async_client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 2000\n\n' + SYNC_FRAME)
+        send(self.user.pk, 'note', {'action': 'updated', 'id': self.note.id})
+        frame = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(frame, encode_event('note', {'action': 'updated', 'id': self.note.id}))
+        await stream.aclose()
+
+    async def test_invalid_stream_token(self):
+        """Test tampered and expired stream tokens are rejected"""
+        token = make_stream_token(self.user.pk)
+        response = await self.async_client.get(self.url, {'token': token + 'x'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(LIVE_EVENTS_TOKEN_MAX_AGE=-1):
+            response = await self.async_client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stream_token_requires_authentication(self):
+        """Test anonymous clients cannot get a stream token"""
+        response = self.client.post(reverse('live-events-token'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_wsgi_not_supported(self):
+        """Test the stream is not served by the WSGI application"""
+        response = self.client.get(self.url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    def test_writes_publish_events(self):
+        """Test note and category writes publish events on commit"""
+        with patch('api.core.events.send') as send_event:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    reverse('note-detail', args=[self.note.id]),
+                    {'title': 'Changed'},
+                    content_type='application/json',
+                    headers=self.headers,
+                )
+            self.assertEqual(
+                send_event.call_args.args[1:],
+                ('note', {'action': 'updated', 'id': self.note.id, 'version': 2}),
+            )
+            category_id = self.category.id
+            with self.captureOnCommitCallbacks(execute=True):
+                self.category.delete()
+            self.assertEqual(
+                send_event.call_args.args[1:],
+                ('category', {'action': 'deleted', 'id': category_id}),
+            )
+
+    def test_bulk_publishes_events(self):
+        """Test bulk operations publish an event per note"""
+        other = Note.objects.create(user=self.user, category=self.category)
+        with patch('api.core.events.send') as send_event:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('note-bulk'), {'operations': [
+                    {'op': 'create', 'category_id': self.category.id},
+                    {'op': 'update', 'id': self.note.id, 'title': 'Bulk'},
+                    {'op': 'delete', 'id': other.id},
+                ]}, content_type='application/json', headers=self.headers)
+        created_id = response.json()['results'][0]['id']
+        self.assertCountEqual(
+            [c.args[2]['action'] for c in send_event.call_args_list],
+            ['created', 'updated', 'deleted'],
+        )
+        self.assertCountEqual(
+            [c.args[2]['id'] for c in send_event.call_args_list],
+            [created_id, self.note.id, other.id],
+        )
@@ -0,0 +1,69 @@
+import re
+
+# Characters of content shown as a preview in compact note lists
+NOTE_PREVIEW_LENGTH = 200
+
+# Alphanumeric words only, so user input never reaches the tsquery syntax.
+SEARCH_TOKEN_RE = re.compile(r'[^\W_]+')
+
+# Markdown and HTML syntax removed from note text, applied in order
+MARKUP_PATTERNS = (
+    # Code fences and horizontal rules
+    (re.compile(r'^[ \t]*(?:```|~~~).*$', re.MULTILINE), ''),
+    (re.compile(r'^[ \t]*(?:[-*_][ \t]*){3,}$', re.MULTILINE), ''),
+    # Images and links keep their text
+    (re.compile(r'!?\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'<[^>]*>'), ''),
+    # Headings, quotes and list markers
+    (re.compile(r'^[ \t]*(?:#{1,6}[ \t]+|>[ \t]?|[-*+][ \t]+|\d+[.)][ \t]+)', re.MULTILINE), ''),
+    # Emphasis, strikethrough and inline code, but not underscores in words
+    (re.compile(r'(?<!\w)[*_]{1,3}|[*_]{1,3}(?!\w)|~~|`+'), ''),
+)
+
+
+def strip_markup(content):
+    """
+    Return the plain text of Markdown content, with whitespace collapsed.
+    """
+    for pattern, replacement in MARKUP_PATTERNS:
+        content = pattern.sub(replacement, content)
+    return ' '.join(content.split())
+
+
+def text_stats(content):
+    """
+    Return the stored ``preview`` and ``word_count`` of a note's content.
+    """
+    text = strip_markup(content or '')
+    return {
+        'preview': text[:NOTE_PREVIEW_LENGTH].rstrip(),
+        'word_count': len(text.split()),
+    }
+
+
+def search_words(content):
+    """
+    Return the distinct words of content, lowercased and in order of first
+    appearance, as a space separated string that search can match instead
+    of the content.
+    """
+    return ' '.join(dict.fromkeys(
+        word.lower() for word in SEARCH_TOKEN_RE.findall(content or '')
+    ))
+
+
+def apply_operations(content, operations):
+    """
+    Apply text operations to a string. Operations are sorted and
+    non-overlapping, each deleting ``delete`` characters at ``position`` of
+    the original string and inserting ``insert`` there. This is the Python
+    counterpart of build_content_expression in api/notes/deltas.py.
+    """
+    parts = []
+    cursor = 0
+    for operation in operations:
+        parts.append(content[cursor:operation['position']])
+        parts.append(operation['insert'])
+        cursor = operation['position'] + operation['delete']
+    parts.append(content[cursor:])
+    return ''.join(parts)
@@ -1,44 +1,405 @@
+import hashlib
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import viewsets, status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.generics import GenericAPIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
-from api.notes.models import Note
-from api.notes.serializers import NoteSerializer
+from rest_framework.views import APIView
+from api.core.cache import CachedResponseMixin, invalidate_user
+from api.core.events import make_stream_token
+from api.core.mixins import AtomicMutationsMixin, SparseFieldsMixin
+from api.notes.bulk import apply_bulk_operations
+from api.notes.deltas import apply_delta
+from api.notes.exceptions import NotePreconditionFailed
+from api.notes.export import (
+    export_queryset, iter_markdown_zip, iter_ndjson, streaming_content,
+)
+from api.notes.importers import import_notes, parse_import_file
+from api.notes.models import Note, NoteRevision, Tombstone, publish_note_event
+from api.notes.pagination import NoteKeysetPagination
+from api.notes.revisions import reconstruct
+from api.notes.search import search_notes
+from api.notes.serializers import (
+    NoteBulkSerializer,
+    NoteDeltaSerializer,
+    NoteListSerializer,
+    NoteRevisionContentSerializer,
+    NoteRevisionSerializer,
+    NoteSerializer,
+    NoteVersionSerializer,
+)
+from api.notes.sync import SyncCursor, get_changes
+from api.users.mixins import CategoryNoteCountsMixin, CategoryResolverMixin
 from api.users.permissions import IsOwnerOrReadOnly
-from api.users.models import Category
+from api.users.serializers import CategorySerializer
+
+
+def note_etag(note_id, version, sparse_fields=None):
+    """
+    Return the ETag of a note at a given version. Responses limited by
+    ``fields`` or ``exclude`` (see SparseFieldsMixin.get_sparse_fields) get
+    an ETag of their own, as they are a different representation.
+    """
+    tag = f"{note_id}-{version}"
+    if sparse_fields:
+        selection = ";".join(
+            f"{param}={','.join(sorted(names))}"
+            for param, names in sorted(sparse_fields.items())
+        )
+        tag += "-" + hashlib.md5(selection.encode(), usedforsecurity=False).hexdigest()[:12]
+    return quote_etag(tag)
+
+
+def etag_matches(etag, header):
+    """
+    Weakly compare an ETag against an If-Match/If-None-Match header value.
+    """
+    etags = parse_etags(header)
+    return "*" in etags or etag in (tag.removeprefix("W/") for tag in etags)
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(AtomicMutationsMixin, CachedResponseMixin, CategoryNoteCountsMixin,
+                  CategoryResolverMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing notes.
 
     list:
     Return a paginated list of notes that belong to the authenticated user.
     Optionally filter by category_id using query parameter.
+    Pass search to return only notes matching every word, best matches first.
+    Pass pagination=cursor (or a cursor value) to page with keyset
+    pagination instead of page numbers.
+    Pass compact=1 for a content preview and category_id instead of the
+    full content and nested category.
+
+    list and retrieve take comma-separated fields or exclude to return only
+    some fields of each note.
+
+    retrieve:
+    Return a note with its ETag. Returns 304 when If-None-Match matches the
+    current version, without loading or serializing the note.
+
+    update:
+    Update a note. Send If-Match with the note's ETag to reject the update
+    with 412 if the note changed since it was read.
+
+    delta:
+    Apply text edits to the content of a note at a given base version and
+    return the new version. Returns 409 if the note changed in the meantime.
+
+    revisions:
+    List the previous versions of a note whose title or content changed,
+    newest first.
+
+    revision:
+    Return the title and content of a note at a previous version.
+
+    bulk:
+    Create, update, move and delete many notes in one transaction. Returns
+    a result per operation; invalid operations are reported and skipped.
+
+    export:
+    Stream every note of the user as NDJSON, or with type=markdown as a zip
+    archive of Markdown files.
+
+    import:
+    Create notes from an uploaded NDJSON file or zip of Markdown files, as
+    produced by export. Categories are matched by id or name and created
+    when missing.
     """
 
     serializer_class = NoteSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    etag_actions = ("retrieve", "create", "update", "partial_update", "delta")
+    replica_actions = ("list", "retrieve")
+    # Imports commit a transaction per batch of notes
+    non_atomic_actions = ("import_notes",)
+    cache_namespace = "notes"
 
     def get_queryset(self):
         """
         Filter queryset to return only notes that belong to the authenticated user,
         optionally filtered by category_id, ordered by last updated.
+        When searching, results are ordered by relevance instead.
         """
-        queryset = Note.objects.filter(user=self.request.user)
+        queryset = Note.objects.filter(user=self.request.user).select_related("category")
+        if self.action == "list":
+            queryset = self.select_list_columns(queryset)
 
         category_id = self.request.query_params.get("category_id", None)
         if category_id is not None:
-            # Verify category exists and belongs to user
-            category = get_object_or_404(Category, id=category_id)
+            # Only the user's own and the global categories can be filtered on
+            category = self.category_resolver.get(category_id)
+            if category is None:
+                raise Http404
             queryset = queryset.filter(category=category)
 
+        search = self.request.query_params.get("search", None)
+        if search:
+            return search_notes(queryset, search)
+
         return queryset.order_by("-updated_at")
 
+    def is_compact(self):
+        return self.action == "list" and self.request.query_params.get("compact") in (
+            "1", "true"
+        )
+
+    def get_serializer_class(self):
+        if self.is_compact():
+            return NoteListSerializer
+        return super().get_serializer_class()
+
+    def select_list_columns(self, queryset):
+        """
+        Load only the columns of the fields that are rendered, joining the
+        category only when it is rendered nested. Compact lists read the
+        stored preview and never load the content.
+        """
+        fields = [
+            field for field in self.get_serializer().fields.values()
+            if not field.write_only
+        ]
+        names = {}
+        for model_field in Note._meta.concrete_fields:
+            names[model_field.name] = names[model_field.attname] = model_field.name
+        # Pagination orders and seeks on these
+        columns = {"id", "updated_at"}
+        columns.update(names[field.source] for field in fields if field.source in names)
+        if "content" in columns:
+            # Compressed notes have an empty content column
+            columns.add("content_compressed")
+        sources = {field.source for field in fields}
+
+        if "category" not in sources:
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
+
+    @property
+    def paginator(self):
+        """
+        Use keyset pagination when the client opts into cursor mode,
+        otherwise fall back to the default page number pagination. Search
+        results are ordered by relevance, which cursor mode cannot page.
+        """
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                if params.get("search"):
+                    raise ValidationError(
+                        {"search": ["Search results cannot be paged with a cursor."]}
+                    )
+                self._paginator = NoteKeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
     def get_object(self):
-        obj = get_object_or_404(Note, id=self.kwargs["pk"], user=self.request.user)
+        obj = get_object_or_404(
+            Note.objects.select_related("category"),
+            id=self.kwargs["pk"],
+            user=self.request.user,
+        )
         self.check_object_permissions(self.request, obj)
+
+        if_match = self.request.headers.get("If-Match")
+        if if_match and self.request.method not in SAFE_METHODS:
+            if not etag_matches(note_etag(obj.id, obj.version), if_match):
+                raise NotePreconditionFailed()
+        # Saving updates the version in place, which the response ETag reads
+        self.etag_note = obj
         return obj
 
+    def retrieve(self, request, *args, **kwargs):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            version = (
+                Note.objects.filter(id=kwargs["pk"], user=request.user)
+                .values_list("version", flat=True)
+                .first()
+            )
+            if version is not None:
+                etag = note_etag(kwargs["pk"], version, self.get_sparse_fields())
+                if etag_matches(etag, if_none_match):
+                    return Response(
+                        status=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": etag},
+                    )
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_etag(self):
+        """
+        Return the ETag of the note the action loaded or wrote, if any.
+        """
+        note = getattr(self, "etag_note", None)
+        if self.action in self.etag_actions and note is not None:
+            return note_etag(note.id, note.version, self.get_sparse_fields())
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = self.get_etag()
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_201_CREATED):
+            response["ETag"] = etag
+        return response
+
+    def get_cached_headers(self, response):
+        # Cache hits do not load the note, so its ETag is cached with it
+        etag = self.get_etag()
+        return {"ETag": etag} if etag else {}
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        self.etag_note = serializer.save(user=self.request.user)
+
+    @action(detail=True, methods=["post"], serializer_class=NoteDeltaSerializer)
+    def delta(self, request, pk=None):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        version, updated_at = apply_delta(
+            Note.objects.filter(id=pk, user=request.user),
+            serializer.validated_data["base_version"],
+            serializer.validated_data["operations"],
+        )
+        note = Note(id=int(pk), user=request.user, version=version, updated_at=updated_at)
+        self.etag_note = note
+        invalidate_user(request.user.pk)
+        publish_note_event(note, "updated")
+        return Response(NoteVersionSerializer(note).data)
+
+    @action(detail=True, methods=["get"], serializer_class=NoteRevisionSerializer)
+    def revisions(self, request, pk=None):
+        note = get_object_or_404(Note.objects.only("id"), id=pk, user=request.user)
+        # Not note.revisions: it sets the note on every row, which loads the
+        # deferred note_id of each of them
+        revisions = (
+            NoteRevision.objects.filter(note_id=note.pk)
+            .only("version", "title", "saved_at")
+            .order_by("-version")
+        )
+        # Page numbers, keyset pagination only applies to notes
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(revisions, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"revisions/(?P<version>[0-9]+)",
+        serializer_class=NoteRevisionContentSerializer,
+    )
+    def revision(self, request, pk=None, version=None):
+        revision = reconstruct(self.get_object(), int(version))
+        if revision is None:
+            raise Http404
+        return Response(self.get_serializer(revision).data)
+
+    @action(detail=False, methods=["post"], serializer_class=NoteBulkSerializer)
+    def bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_bulk_operations(
+            request.user, serializer.validated_data["operations"]
+        )
+        return Response({"results": results})
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        export_type = request.query_params.get("type", "ndjson")
+        notes = export_queryset(request.user)
+        if export_type == "ndjson":
+            response = StreamingHttpResponse(
+                streaming_content(request._request, iter_ndjson(notes)),
+                content_type="application/x-ndjson",
+            )
+            filename = "notes.ndjson"
+        elif export_type == "markdown":
+            response = StreamingHttpResponse(
+                streaming_content(request._request, iter_markdown_zip(notes)),
+                content_type="application/zip",
+            )
+            filename = "notes.zip"
+        else:
+            raise ValidationError({"type": ["Must be one of: ndjson, markdown."]})
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=["post"], url_path="import", url_name="import")
+    def import_notes(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": ["No file was submitted."]})
+        try:
+            records = parse_import_file(upload, request.data.get("type"))
+        except ValueError:
+            raise ValidationError({"type": ["Must be one of: ndjson, markdown."]})
+        summary = import_notes(request.user, records)
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+
+class SyncView(CategoryNoteCountsMixin, GenericAPIView):
+    """
+    Return the notes and categories created, updated or deleted since a
+    sync cursor.
+
+    Call without since for everything, then pass the returned cursor as
+    since on the next sync. While has_more is true, call again right away
+    with the new cursor for the next page of notes. When reset is true the
+    client should replace its data instead of merging the changes. Pass
+    compact=1 for notes in the compact list representation.
+
+    Reads always go to the primary database: a lagging replica could hide
+    changes that are older than the returned cursor.
+    """
+
+    permission_classes = [IsAuthenticated]
+    page_size = 500
+
+    def get(self, request):
+        encoded = request.query_params.get("since")
+        cursor = SyncCursor.decode(encoded) if encoded else None
+        changes = get_changes(request.user, cursor, self.page_size)
+
+        compact = request.query_params.get("compact") in ("1", "true")
+        note_serializer = NoteListSerializer if compact else NoteSerializer
+        context = self.get_serializer_context()
+        data = {
+            "cursor": changes["cursor"].encode(),
+            "has_more": changes["has_more"],
+            "notes": note_serializer(changes["notes"], many=True, context=context).data,
+        }
+        if "categories" in changes:
+            data.update(
+                reset=changes["reset"],
+                categories=CategorySerializer(
+                    changes["categories"], many=True, context=context
+                ).data,
+                deleted={
+                    "notes": changes["deleted"][Tombstone.NOTE],
+                    "categories": changes["deleted"][Tombstone.CATEGORY],
+                },
+            )
+        return Response(data)
+
+
+class LiveEventsTokenView(APIView):
+    """
+    Issue a stream token for opening the live events stream from a browser,
+    as /api/v1/events/?token=<token>. EventSource cannot send the
+    Authorization header, and the token only opens the stream of the user
+    it was issued to, for LIVE_EVENTS_TOKEN_MAX_AGE seconds.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response({
+            "token": make_stream_token(request.user.pk),
+            "expires_in": settings.LIVE_EVENTS_TOKEN_MAX_AGE,
+        })
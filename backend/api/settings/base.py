@@ -4,6 +4,7 @@
 from pathlib import Path
 
 import environ
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 # api/
@@ -46,7 +47,17 @@ LOCALE_PATHS = [str(BASE_DIR / "locale")]
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#databases
 DATABASES = {"default": env.db("DATABASE_URL")}
-DATABASES["default"]["ATOMIC_REQUESTS"] = True
+# Transactions are opened for unsafe requests only, see api/core/mixins.py
+DATABASES["default"]["ATOMIC_REQUESTS"] = False
+# Optional read replicas serving note and category reads, see
+# api/core/db/routers.py
+REPLICA_DATABASES = []
+for index, url in enumerate(env.list("DATABASE_REPLICA_URLS", default=[]), start=1):
+    DATABASES[f"replica{index}"] = env.db_url_config(url)
+    REPLICA_DATABASES.append(f"replica{index}")
+# Seconds a user reads from the primary after writing, to cover replica lag
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=10)
+DATABASE_ROUTERS = ["api.core.db.routers.ReplicaRouter"]
 # https://docs.djangoproject.com/en/stable/ref/settings/#std:setting-DEFAULT_AUTO_FIELD
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -110,6 +121,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "api.core.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -182,6 +194,15 @@ FIXTURE_DIRS = (str(APPS_DIR / "fixtures"),)
 # https://docs.djangoproject.com/en/dev/ref/settings/#root-urlconf
 ROOT_URLCONF = "api.urls"
 
+# SESSIONS
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#session-engine
+# cached_db reads sessions from the cache and only falls back to the database
+# on a miss; signed_cookies keeps them in the cookie and never queries.
+SESSION_ENGINE = "django.contrib.sessions.backends." + env(
+    "DJANGO_SESSION_BACKEND", default="cached_db"
+)
+
 # SECURITY
 # ------------------------------------------------------------------------------
 # Ensure session cookies are only accessible via HTTP(S) and not by client-side scripts
@@ -244,14 +265,78 @@ LOGGING = {
 # django-rest-framework - https://www.django-rest-framework.org/api-guide/settings/
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "api.users.authentication.TokenlessSessionAuthentication",
+        "api.users.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
 }
+# Seconds a token and its user are cached, see api/users/authentication.py
+AUTH_TOKEN_CACHE_TIMEOUT = env.int("AUTH_TOKEN_CACHE_TIMEOUT", default=300)
+
+# API response cache
+# -------------------------------------------------------------------------------
+# Per-user cache of note and category list/detail responses, see api/core/cache.py
+API_CACHE_ENABLED = env.bool("API_CACHE_ENABLED", default=True)
+API_CACHE_ALIAS = "default"
+# Timeouts in seconds per cached viewset
+API_CACHE_TIMEOUTS = {
+    "notes": env.int("API_CACHE_NOTES_TIMEOUT", default=60),
+    "categories": env.int("API_CACHE_CATEGORIES_TIMEOUT", default=300),
+}
+
+# Performance metrics
+# -------------------------------------------------------------------------------
+# Per-request query, serializer, cache and total timings, see api/core/middleware.py
+API_METRICS_ENABLED = env.bool("API_METRICS_ENABLED", default=True)
+# Fraction of requests that are measured and logged
+API_METRICS_SAMPLE_RATE = env.float("API_METRICS_SAMPLE_RATE", default=0.1)
+# Send the metrics to clients in a Server-Timing header. Off unless debugging,
+# as it tells any client how long internal queries and cache calls take.
+API_METRICS_SERVER_TIMING = env.bool("API_METRICS_SERVER_TIMING", default=DEBUG)
+
+# Note content compression
+# -------------------------------------------------------------------------------
+# Store note content of at least NOTE_COMPRESSION_THRESHOLD bytes zlib-compressed,
+# see api/notes/fields.py. Run compress_note_content after changing these.
+NOTE_COMPRESSION_ENABLED = env.bool("NOTE_COMPRESSION_ENABLED", default=False)
+NOTE_COMPRESSION_THRESHOLD = env.int("NOTE_COMPRESSION_THRESHOLD", default=8192)
+# zlib level from 1 (fastest) to 9 (smallest)
+NOTE_COMPRESSION_LEVEL = env.int("NOTE_COMPRESSION_LEVEL", default=6)
+
+# Note revisions
+# -------------------------------------------------------------------------------
+# Store the previous text of notes on every change, see api/notes/revisions.py
+NOTE_REVISIONS_ENABLED = env.bool("NOTE_REVISIONS_ENABLED", default=True)
+# Revisions between full copies; rebuilding a version applies at most this
+# many diffs
+NOTE_REVISION_KEYFRAME_INTERVAL = env.int("NOTE_REVISION_KEYFRAME_INTERVAL", default=20)
+
+# Sync
+# -------------------------------------------------------------------------------
+# Days deletions are kept for /api/v1/sync/; older cursors get a full resync
+SYNC_TOMBSTONE_RETENTION_DAYS = env.int("SYNC_TOMBSTONE_RETENTION_DAYS", default=30)
+
+# Live events
+# -------------------------------------------------------------------------------
+# Server-sent events of note and category changes at /api/v1/events/, served
+# under ASGI only, see api/core/events.py
+LIVE_EVENTS_ENABLED = env.bool("LIVE_EVENTS_ENABLED", default=True)
+# api.core.events.LocalEventBackend (one process) or RedisEventBackend
+LIVE_EVENTS_BACKEND = env(
+    "LIVE_EVENTS_BACKEND", default="api.core.events.LocalEventBackend"
+)
+LIVE_EVENTS_REDIS_URL = env("LIVE_EVENTS_REDIS_URL", default="")
+# Events queued per stream before a client that falls behind is told to resync
+LIVE_EVENTS_QUEUE_SIZE = env.int("LIVE_EVENTS_QUEUE_SIZE", default=32)
+# Seconds between keepalive comments, and before a stream is closed for the
+# client to reconnect, which bounds streams left open by lost clients
+LIVE_EVENTS_HEARTBEAT_SECONDS = env.int("LIVE_EVENTS_HEARTBEAT_SECONDS", default=20)
+LIVE_EVENTS_MAX_SECONDS = env.int("LIVE_EVENTS_MAX_SECONDS", default=300)
+# Seconds a stream token from /api/v1/events/token/ can be used to open a stream
+LIVE_EVENTS_TOKEN_MAX_AGE = env.int("LIVE_EVENTS_TOKEN_MAX_AGE", default=60)
 
 # Frontend URL
 # -------------------------------------------------------------------------------
@@ -262,6 +347,9 @@ CORS_URLS_REGEX = r"^/api/.*$"
 CORS_ALLOWED_ORIGINS = [
     FRONTEND_BASE_URL,
 ]
+# The editor sends conditional saves and reads note versions from the ETag
+CORS_ALLOW_HEADERS = (*default_headers, "if-match", "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag"]
 
 # By Default swagger ui is available only to admin user(s). You can change permission classes to change that
 # See more configuration options at https://drf-spectacular.readthedocs.io/en/latest/settings.html#settings
@@ -65,3 +65,9 @@ if env("USE_DOCKER") == "yes":
 # ------------------------------------------------------------------------------
 # https://django-extensions.readthedocs.io/en/latest/installation_instructions.html#configuration
 INSTALLED_APPS += ["django_extensions"]
+
+# Performance metrics
+# ------------------------------------------------------------------------------
+# Measure every request and show the timings in the browser's network panel
+API_METRICS_SAMPLE_RATE = env.float("API_METRICS_SAMPLE_RATE", default=1.0)
+API_METRICS_SERVER_TIMING = env.bool("API_METRICS_SERVER_TIMING", default=True)
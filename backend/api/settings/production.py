@@ -23,6 +23,22 @@ ALLOWED_HOSTS = env.list("DJANGO_ALLOWED_HOSTS", default=["turbo.dev"])
 # DATABASES
 # ------------------------------------------------------------------------------
 DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)
+if env.bool("DATABASE_POOL", default=False):
+    # Share a pool of connections between the threads of each worker, see
+    # api/core/db/backends/postgresql_pool. Connections go back to the pool
+    # at the end of every request.
+    DATABASES["default"]["ENGINE"] = "api.core.db.backends.postgresql_pool"
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": env.int("DATABASE_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DATABASE_POOL_MAX_SIZE", default=10),
+        # Seconds to wait for a free connection before failing the request
+        "timeout": env.float("DATABASE_POOL_TIMEOUT", default=10.0),
+        "max_idle": env.float("DATABASE_POOL_MAX_IDLE", default=300.0),
+        "max_lifetime": env.float("DATABASE_POOL_MAX_LIFETIME", default=3600.0),
+        # Check connections are alive when they are checked out
+        "check": env.bool("DATABASE_POOL_CHECK", default=True),
+    }
 
 # CACHES
 # ------------------------------------------------------------------------------
@@ -39,6 +55,14 @@ CACHES = {
     },
 }
 
+# LIVE EVENTS
+# ------------------------------------------------------------------------------
+# Carry live events between workers through Redis
+LIVE_EVENTS_BACKEND = env(
+    "LIVE_EVENTS_BACKEND", default="api.core.events.RedisEventBackend"
+)
+LIVE_EVENTS_REDIS_URL = env("LIVE_EVENTS_REDIS_URL", default=env("REDIS_URL"))
+
 # SECURITY
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#secure-proxy-ssl-header
@@ -172,6 +196,8 @@ LOGGING = {
         "verbose": {
             "format": "%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s",
         },
+        # Request metrics are already logged as JSON
+        "plain": {"format": "%(message)s"},
     },
     "handlers": {
         "console": {
@@ -179,9 +205,19 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "verbose",
         },
+        "performance": {
+            "level": "INFO",
+            "class": "logging.StreamHandler",
+            "formatter": "plain",
+        },
     },
     "root": {"level": "INFO", "handlers": ["console"]},
     "loggers": {
+        "api.performance": {
+            "level": "INFO",
+            "handlers": ["performance"],
+            "propagate": False,
+        },
         "django.db.backends": {
             "level": "ERROR",
             "handlers": ["console"],
@@ -225,3 +261,10 @@ sentry_sdk.init(
 SPECTACULAR_SETTINGS["SERVERS"] = [
     {"url": "https://turbo.dev", "description": "Production server"},
 ]
+
+# Performance metrics
+# -------------------------------------------------------------------------------
+# Only measure a sample of production requests
+API_METRICS_SAMPLE_RATE = env.float("API_METRICS_SAMPLE_RATE", default=0.05)
+# Keep internal timings out of production responses
+API_METRICS_SERVER_TIMING = env.bool("API_METRICS_SERVER_TIMING", default=False)
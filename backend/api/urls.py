@@ -7,7 +7,9 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.routers import DefaultRouter
 from api.users.views import UserViewSet, RegistrationView, CategoryViewSet
-from api.notes.views import NoteViewSet  # Add this import
+from api.users.async_views import AsyncCategoryDetailView, AsyncCategoryListView
+from api.notes.views import LiveEventsTokenView, NoteViewSet, SyncView
+from api.notes.async_views import AsyncNoteDetailView, AsyncNoteListView, LiveEventsView
 
 urlpatterns = [
     # Django Admin
@@ -24,6 +26,26 @@ router.register(r'notes', NoteViewSet, basename='note')
 # API URLS
 urlpatterns += [
     path('api/v1/', include(router.urls)),
+    path('api/v1/sync/', SyncView.as_view(), name='sync'),
+    path('api/v1/events/', LiveEventsView.as_view(), name='live-events'),
+    path('api/v1/events/token/', LiveEventsTokenView.as_view(), name='live-events-token'),
+    # Async-native list/retrieve/update endpoints for ASGI deployments
+    path('api/v1/async/notes/', AsyncNoteListView.as_view(), name='async-note-list'),
+    path(
+        'api/v1/async/notes/<int:pk>/',
+        AsyncNoteDetailView.as_view(),
+        name='async-note-detail',
+    ),
+    path(
+        'api/v1/async/categories/',
+        AsyncCategoryListView.as_view(),
+        name='async-category-list',
+    ),
+    path(
+        'api/v1/async/categories/<int:pk>/',
+        AsyncCategoryDetailView.as_view(),
+        name='async-category-detail',
+    ),
     path('api/auth/register/', RegistrationView.as_view(), name='register'),
     path("api/auth-token/", obtain_auth_token),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
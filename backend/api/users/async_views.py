@@ -0,0 +1,72 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import Http404
+from api.core.async_views import AsyncAPIView
+from api.core.db.routers import pin_to_primary
+from api.users.models import Category
+from api.users.serializers import CategorySerializer
+
+
+class AsyncCategoryMixin:
+    def get_queryset(self, request):
+        # The user's own categories and the global ones
+        return Category.objects.filter(Q(user=request.user) | Q(user=None))
+
+    async def get_context(self, request):
+        return {"note_counts": await Category.objects.anote_counts(request.user)}
+
+
+class AsyncCategoryListView(AsyncCategoryMixin, AsyncAPIView):
+    """
+    Async version of the category list.
+    """
+    http_method_names = ["get", "options"]
+
+    async def get(self, request):
+        categories = [category async for category in self.get_queryset(request)]
+        serializer = CategorySerializer(
+            categories, many=True, context=await self.get_context(request)
+        )
+        return self.json_response(serializer.data)
+
+
+class AsyncCategoryDetailView(AsyncCategoryMixin, AsyncAPIView):
+    """
+    Async version of category retrieve and update. Global categories can be
+    read but only the user's own categories can be updated.
+    """
+    http_method_names = ["get", "put", "patch", "options"]
+
+    async def get_category(self, queryset, pk):
+        try:
+            return await queryset.aget(id=pk)
+        except (Category.DoesNotExist, ValueError):
+            raise Http404
+
+    async def get(self, request, pk):
+        category = await self.get_category(self.get_queryset(request), pk)
+        serializer = CategorySerializer(category, context=await self.get_context(request))
+        return self.json_response(serializer.data)
+
+    async def put(self, request, pk):
+        return await self.update(request, pk, partial=False)
+
+    async def patch(self, request, pk):
+        return await self.update(request, pk, partial=True)
+
+    async def update(self, request, pk, partial):
+        category = await self.get_category(Category.objects.filter(user=request.user), pk)
+        serializer = CategorySerializer(
+            category,
+            data=self.parse_json(request),
+            partial=partial,
+            context=await self.get_context(request),
+        )
+        # Category.save() validates the model and fires the cache signals
+        await sync_to_async(self.save)(serializer)
+        await sync_to_async(pin_to_primary)(request.user.pk)
+        return self.json_response(serializer.data)
+
+    def save(self, serializer):
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
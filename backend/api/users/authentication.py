@@ -0,0 +1,69 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import (
+    SessionAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+
+def get_token_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    # Hash the token so that credentials are not stored in cache keys
+    return "auth-token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_cached_token(key):
+    """
+    Return the cached Token for a key, with its user, or None.
+    """
+    return get_token_cache().get(token_cache_key(key))
+
+
+def cache_token(token):
+    get_token_cache().set(
+        token_cache_key(token.key), token, settings.AUTH_TOKEN_CACHE_TIMEOUT
+    )
+
+
+def invalidate_tokens(*keys):
+    get_token_cache().delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches the token and its user, saving the
+    token and user query on every request.
+
+    Entries expire after AUTH_TOKEN_CACHE_TIMEOUT seconds and are dropped
+    when the token is deleted or its user is saved, e.g. deactivated.
+    Only valid tokens of active users are cached.
+    """
+    def authenticate_credentials(self, key):
+        token = get_cached_token(key)
+        if token is not None:
+            return (token.user, token)
+
+        user, token = super().authenticate_credentials(key)
+        cache_token(token)
+        return (user, token)
+
+
+class TokenlessSessionAuthentication(SessionAuthentication):
+    """
+    Session authentication that steps aside for requests with an
+    Authorization header, so that token requests never load the session
+    or the session's user.
+
+    Listed first, it still makes unauthenticated requests fail with 403
+    like DRF's SessionAuthentication.
+    """
+    def authenticate(self, request):
+        if get_authorization_header(request):
+            return None
+        return super().authenticate(request)
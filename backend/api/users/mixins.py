@@ -0,0 +1,38 @@
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from api.users.models import Category
+from api.users.resolvers import CategoryResolver
+
+
+class CategoryNoteCountsMixin:
+    """
+    Provide per-user category note counts to serializers.
+
+    The counts are loaded lazily with one aggregated query the first time a
+    CategorySerializer needs them, and shared by every category serialized
+    during the request.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        context['note_counts'] = SimpleLazyObject(
+            lambda: Category.objects.note_counts(user)
+        )
+        return context
+
+
+class CategoryResolverMixin:
+    """
+    Share one CategoryResolver per request between the view and its
+    serializers, so the user's visible categories are loaded at most once.
+    """
+
+    @cached_property
+    def category_resolver(self):
+        return CategoryResolver(self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['category_resolver'] = self.category_resolver
+        return context
@@ -1,15 +1,19 @@
 import uuid
 
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
 from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import BaseUserManager
 from django.core.exceptions import ValidationError
 
 from rest_framework.authtoken.models import Token
 
+from api.core.cache import invalidate_global, invalidate_user
+from api.core.events import publish
+from api.users.authentication import invalidate_tokens
 from api.users.validators import validate_hex_color
 
 
@@ -74,6 +78,36 @@ class Profile(models.Model):
     )
 
 
+class CategoryManager(models.Manager):
+    """
+    Manager for categories with per-user note aggregates.
+    """
+    def visible_to(self, user):
+        """
+        Return the categories a user can use: their own and the global ones.
+        """
+        return self.filter(Q(user=user) | Q(user=None))
+
+    def note_counts(self, user):
+        """
+        Return a mapping of category id to the number of notes the user
+        has in that category, read from the maintained note counters.
+        """
+        return dict(
+            self.filter(note_counters__user=user)
+            .order_by()
+            .values_list('id', 'note_counters__count')
+        )
+
+    async def anote_counts(self, user):
+        return {
+            category_id: count
+            async for category_id, count in self.filter(note_counters__user=user)
+            .order_by()
+            .values_list('id', 'note_counters__count')
+        }
+
+
 class Category(models.Model):
     """
     Category model for organizing notes.
@@ -90,6 +124,9 @@ class Category(models.Model):
         max_length=7,
         validators=[validate_hex_color]
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CategoryManager()
 
     class Meta:
         verbose_name_plural = 'Categories'
@@ -128,3 +165,47 @@ def create_auth_token_and_profile(
     if created:
         Token.objects.get_or_create(user=instance)
         Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """
+    Drop cached responses that may include the category.
+    """
+    if instance.user_id is None:
+        invalidate_global()
+    else:
+        invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Category)
+def publish_category_saved(sender, instance, created=False, **kwargs):
+    """
+    Tell the owner's open event streams, or everyone's for a global
+    category, that a category was created or updated.
+    """
+    action = 'created' if created else 'updated'
+    publish(instance.user_id, 'category', {'action': action, 'id': instance.pk})
+
+
+@receiver(post_delete, sender=Category)
+def publish_category_deleted(sender, instance, **kwargs):
+    publish(instance.user_id, 'category', {'action': 'deleted', 'id': instance.pk})
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, created=False, **kwargs):
+    """
+    Drop the cached tokens of a user whose details or status changed.
+    """
+    if not created:
+        invalidate_tokens(*Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Stop accepting a deleted token from the cache.
+    """
+    invalidate_tokens(instance.key)
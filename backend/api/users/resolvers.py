@@ -0,0 +1,52 @@
+from django.utils.functional import cached_property
+
+from api.users.models import Category
+
+
+class CategoryResolver:
+    """
+    Look up the categories visible to a user by id or name.
+
+    The user's own and the global categories are loaded with one query the
+    first time they are needed, so validating, assigning and filtering by
+    category during a request does not hit the database again. Categories
+    of other users are never returned.
+    """
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def by_id(self):
+        return {
+            category.id: category
+            for category in Category.objects.visible_to(self.user)
+        }
+
+    @cached_property
+    def by_name(self):
+        # Global categories first, so that the user's own win on name clashes
+        categories = sorted(self.by_id.values(), key=lambda c: c.user_id is not None)
+        return {category.name.lower(): category for category in categories}
+
+    def get(self, category_id):
+        """
+        Return the visible category with the given id, or None.
+        """
+        try:
+            return self.by_id.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_by_name(self, name):
+        """
+        Return the visible category with the given name, ignoring case, or
+        None.
+        """
+        return self.by_name.get(name.lower())
+
+    def add(self, category):
+        """
+        Make a category created during the request resolvable.
+        """
+        self.by_id[category.id] = category
+        self.by_name[category.name.lower()] = category
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from api.core.metrics import TimedListSerializer, TimedSerializerMixin
 from django.conf import settings
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
@@ -75,18 +76,29 @@ class CreateUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
-    Serializer for Category model
+    Serializer for Category model.
+
+    note_count is read from the ``note_counts`` mapping in the serializer
+    context when the view provides one, so listing categories (or notes
+    with nested categories) does not issue a count query per row.
     """
 
-    note_count = serializers.ReadOnlyField()
+    note_count = serializers.SerializerMethodField()
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Category
         fields = ('id', 'user', 'name', 'color', 'note_count')
         read_only_fields = ('id', 'user', 'note_count')
+        list_serializer_class = TimedListSerializer
+
+    def get_note_count(self, obj):
+        note_counts = self.context.get('note_counts')
+        if note_counts is None:
+            return obj.note_count
+        return note_counts.get(obj.id, 0)
 
     def create(self, validated_data):
         """
@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .factories import UserFactory
+
+
+class TestCachedTokenAuthentication(APITestCase):
+    """
+    Tests authentication with cached tokens.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.token = self.user.auth_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.url = reverse('user-me')
+
+    def token_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url)
+        queries = [
+            query['sql'] for query in captured.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+        return response, queries
+
+    def test_token_is_cached(self):
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertEqual(queries, [])
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(self.url)
+        self.token.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_changes_are_seen(self):
+        self.client.get(self.url)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['first_name'], 'Renamed')
+
+    def test_invalid_token_is_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        for _ in range(2):
+            response, queries = self.token_queries()
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(len(queries), 1)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class TestTokenlessSessionAuthentication(APITestCase):
+    """
+    Tests that token requests skip the session.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.user.set_password('session-password')
+        self.user.save()
+        self.client.login(email=self.user.email, password='session-password')
+        self.url = reverse('user-me')
+
+    def session_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            query['sql'] for query in captured.captured_queries
+            if 'django_session' in query['sql']
+        ]
+
+    def test_session_request_loads_session(self):
+        self.assertEqual(len(self.session_queries()), 1)
+
+    def test_token_request_skips_session(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.user.auth_token.key}')
+        self.assertEqual(self.session_queries(), [])
@@ -2,6 +2,9 @@ import factory
 from unittest.mock import patch
 from faker import Faker
 
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -203,6 +206,46 @@ class TestCategoryViewSet(APITestCase):
         self.assertIsNotNone(user_cat)
         self.assertEqual(user_cat['note_count'], 1)  # We created 1 Note above
 
+    def test_list_query_count_is_constant(self):
+        """
+        Listing categories should not issue a count query per category.
+        """
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url_list)
+        baseline = len(context.captured_queries)
+
+        for _ in range(5):
+            category = CategoryFactory(user=self.user)
+            for _ in range(3):
+                Note.objects.create(title="Note", category=category, user=self.user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url_list)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), baseline)
+
+    def test_note_count_excludes_other_users_notes(self):
+        """
+        note_count only counts the authenticated user's notes, even for
+        global categories shared with other users.
+        """
+        Note.objects.create(title="Mine", category=self.global_category, user=self.user)
+        Note.objects.create(title="Theirs", category=self.global_category, user=self.other_user)
+        response = self.client.get(self.url_list)
+        global_cat = next(c for c in response.data if c['id'] == self.global_category.id)
+        self.assertEqual(global_cat['note_count'], 1)
+
+    def test_cached_list_reflects_new_notes(self):
+        """
+        The cached category list is invalidated when the user adds a note.
+        """
+        self.client.get(self.url_list)
+        Note.objects.create(title="Another", category=self.user_category, user=self.user)
+        response = self.client.get(self.url_list)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        user_cat = next(c for c in response.data if c['id'] == self.user_category.id)
+        self.assertEqual(user_cat['note_count'], 2)
+
     def test_create_category_assigned_to_user(self):
         """
         Creating a category should automatically assign it to the authenticated user,
@@ -281,3 +324,43 @@ class TestCategoryViewSet(APITestCase):
         # If policy allows it:
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Category.objects.filter(pk=self.global_category.pk).exists())
+
+
+class TestAsyncCategoryViews(TestCase):
+    """
+    Tests the async category endpoints.
+    """
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.own = CategoryFactory(user=self.user, name='Own')
+        self.shared = CategoryFactory(name='Shared')
+        CategoryFactory(user=UserFactory(), name='Private')
+        Note.objects.create(user=self.user, category=self.own)
+        self.headers = {'Authorization': f'Token {self.user.auth_token.key}'}
+
+    async def test_list(self):
+        response = await self.async_client.get(
+            reverse('async-category-list'), headers=self.headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {item['name']: item['note_count'] for item in response.json()}
+        self.assertEqual(counts, {'Own': 1, 'Shared': 0})
+
+    async def test_update_own_category(self):
+        response = await self.async_client.patch(
+            reverse('async-category-detail', args=[self.own.id]),
+            {'name': 'Renamed'}, content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        category = await Category.objects.aget(id=self.own.id)
+        self.assertEqual(category.name, 'Renamed')
+
+    async def test_cannot_update_global_category(self):
+        url = reverse('async-category-detail', args=[self.shared.id])
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.async_client.patch(
+            url, {'name': 'Mine'}, content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -3,14 +3,20 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Q
+from django.db.models import F, Q
+from django.utils import timezone
+from api.core.cache import CachedResponseMixin
+from api.core.mixins import AtomicMutationsMixin
+from api.notes.models import Tombstone
+from .mixins import CategoryNoteCountsMixin
 from .permissions import IsUserOrReadOnly, IsOwnerOrReadOnly
 from .serializers import CreateUserSerializer, UserSerializer, CategorySerializer
 
 from .models import User, Category
 
 
-class UserViewSet(mixins.RetrieveModelMixin,
+class UserViewSet(AtomicMutationsMixin,
+                  mixins.RetrieveModelMixin,
                   mixins.UpdateModelMixin,
                   mixins.CreateModelMixin,
                   viewsets.GenericViewSet):
@@ -47,7 +53,7 @@ class UserViewSet(mixins.RetrieveModelMixin,
         return Response(status=status.HTTP_200_OK, data=serializer.data)
 
 
-class RegistrationView(APIView):
+class RegistrationView(AtomicMutationsMixin, APIView):
     """
     API endpoint for user registration
     """
@@ -74,13 +80,16 @@ class RegistrationView(APIView):
         )
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(AtomicMutationsMixin, CachedResponseMixin, CategoryNoteCountsMixin,
+                      viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing categories.
     """
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None
+    cache_namespace = "categories"
+    replica_actions = ("list", "retrieve")
 
     def get_queryset(self):
         # Return both categories belonging to the authenticated user
@@ -92,3 +101,13 @@ class CategoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Automatically associate the new category with the current user
         serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        # Leave a tombstone so that syncing clients drop the category
+        Tombstone.objects.record(Tombstone.CATEGORY, instance.user_id, [instance.pk])
+        # The database uncategorizes the notes without bumping their version
+        # and update time, so that syncing clients would never see them move
+        instance.notes.update(
+            category=None, version=F("version") + 1, updated_at=timezone.now()
+        )
+        instance.delete()
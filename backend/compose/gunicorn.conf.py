@@ -0,0 +1,76 @@
+"""
+Gunicorn configuration for production.
+
+GUNICORN_MODE selects how requests are served:
+
+- ``gthread`` (default): the WSGI app in threaded sync workers.
+- ``uvicorn``: the ASGI app in uvicorn workers, which serves the async
+  endpoints on an event loop.
+
+The app is preloaded in the master process so that workers share its
+memory copy-on-write. Worker and thread counts default to values derived
+from the number of CPUs and can be overridden with WEB_CONCURRENCY and
+GUNICORN_THREADS.
+"""
+import gc
+import multiprocessing
+import os
+import sys
+
+mode = os.environ.get("GUNICORN_MODE", "gthread")
+if mode not in ("gthread", "uvicorn"):
+    raise RuntimeError(f"Unknown GUNICORN_MODE {mode!r}, expected gthread or uvicorn")
+
+cpus = multiprocessing.cpu_count()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+chdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if mode == "uvicorn":
+    wsgi_app = "api.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+    # One event loop per core
+    workers = int(os.environ.get("WEB_CONCURRENCY", cpus))
+else:
+    wsgi_app = "api.wsgi:application"
+    worker_class = "gthread"
+    workers = int(os.environ.get("WEB_CONCURRENCY", cpus * 2 + 1))
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# Recycle workers to bound memory growth, staggered so that they do not
+# all restart at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Heartbeat files on tmpfs, the container's disk can block workers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+
+def pre_fork(server, worker):
+    # Move the preloaded objects out of the collector's reach so that
+    # collections in the workers do not touch, and copy, shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Database connections must not be shared between processes
+    from django.db import connections
+
+    connections.close_all()
+
+
+def worker_exit(server, worker):
+    # Close pooled connections cleanly when a worker is recycled
+    pool_backend = sys.modules.get("api.core.db.backends.postgresql_pool.base")
+    if pool_backend is not None:
+        pool_backend.close_pools()
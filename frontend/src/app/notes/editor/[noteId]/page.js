@@ -1,6 +1,6 @@
 "use client"
 
-import React, { useState, useEffect, useMemo } from 'react'
+import React, { useState, useEffect, useMemo, useRef } from 'react'
 import { useRouter, useParams } from 'next/navigation'
 import { Select, SelectTrigger, SelectValue, SelectContent, SelectItem } from "@/components/ui/select"
 import { Card, CardContent } from "@/components/ui/card"
@@ -11,7 +11,7 @@ import { Circle, X } from 'lucide-react'
 import { useToast } from '@/hooks/use-toast'
 import { useAuth } from '@/context/AuthProvider';
 import withAuth from '@/hoc/withAuth';
-import { formatDate } from '@/lib/utils';
+import { formatDate, diffText } from '@/lib/utils';
 import NewCategoryDialog from '@/components/NewCategoryDialog'
 import CategorySelector from '@/components/CategorySelector'
 
@@ -72,6 +72,8 @@ const NoteEditorPage = () => {
     const [lastEdited, setLastEdited] = useState(null)
     const [version, setVersion] = useState(null)
     const [isSaving, setIsSaving] = useState(false)
+    // last state acknowledged by the server, used to send content deltas
+    const savedNote = useRef(null)
     const params = useParams()
     const noteId = params.noteId
 
@@ -98,22 +100,32 @@ const NoteEditorPage = () => {
       }, [title, content, categoryId])
 
     const saveNote = async (retryCount = 0) => {
+        const saved = savedNote.current
+        // Content-only edits are sent as a delta against the saved version
+        const contentOnly = saved && version !== null
+            && title === saved.title && categoryId === saved.categoryId
+        if (contentOnly && content === saved.content) return
+
         setIsSaving(true)
         try {
-            const response = await fetch(`${process.env.NEXT_PUBLIC_API_BASE_URL}/api/v1/notes/${noteId}/`, {
-                method: 'PATCH',
+            const noteUrl = `${process.env.NEXT_PUBLIC_API_BASE_URL}/api/v1/notes/${noteId}/`
+            const response = await fetch(contentOnly ? `${noteUrl}delta/` : noteUrl, {
+                method: contentOnly ? 'POST' : 'PATCH',
                 headers: {
                     'Authorization': `Token ${getToken()}`,
                     'Content-Type': 'application/json',
+                    ...(version !== null && { 'If-Match': `"${noteId}-${version}"` }),
                 },
-                body: JSON.stringify({
+                body: JSON.stringify(contentOnly ? {
+                    base_version: version,
+                    operations: [diffText(saved.content, content)],
+                } : {
                     title,
                     content,
                     category_id: categoryId,
-                    updated_at: version
                 }),
             })
-            if (response.status === 409) {
+            if (response.status === 409 || response.status === 412) {
                 toast({ title: "Conflict detected. Please reload the note.", variant: "destructive" })
                 return
             }
@@ -121,7 +133,8 @@ const NoteEditorPage = () => {
                 throw new Error('Failed to save note')
             }
             const data = await response.json()
-            setVersion(data.updated_at)
+            setVersion(data.version)
+            savedNote.current = { title, content, categoryId }
         } catch (error) {
             if (retryCount < 3 && error.message === 'Failed to save note') {
                 setTimeout(() => {
@@ -152,7 +165,8 @@ const NoteEditorPage = () => {
                 setCategoryId(data.category.id)
                 setTitle(data.title)
                 setContent(data.content)
-                setVersion(data.updated_at)
+                setVersion(data.version)
+                savedNote.current = { title: data.title, content: data.content, categoryId: data.category.id }
                 setLastEdited(formatDate(data.updated_at))
             } catch (error) {
                 toast({ title: "Error fetching note data.", variant: "destructive" })
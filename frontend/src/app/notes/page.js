@@ -39,15 +39,16 @@ const NewNoteButton = ({ onClick }) => (
 );
 
 // NoteCard component
-const NoteCard = forwardRef(({ note }, ref) => {
+const NoteCard = forwardRef(({ note, category }, ref) => {
   const router = useRouter();
+  const color = category?.color ?? "#cccccc";
   return (
     <Card
       ref={ref}
       className="h-72 rounded-lg shadow border-2 cursor-pointer"
       style={{
-        borderColor: note.category.color,
-        backgroundColor: `${note.category.color}80`,
+        borderColor: color,
+        backgroundColor: `${color}80`,
       }}
       onClick={() => router.push(`/notes/editor/${note.id}`)}
     >
@@ -56,14 +57,14 @@ const NoteCard = forwardRef(({ note }, ref) => {
           <span className="font-bold">
             {formatDate(new Date(note.updated_at))}
           </span>
-          <span>{note.category.name}</span>
+          <span>{category?.name}</span>
         </div>
       </CardHeader>
       <CardContent className="px-4 pt-0 pb-4">
         <CardTitle className="text-2xl font-serif font-bold mb-2">
           {note.title}
         </CardTitle>
-        <p className="line-clamp-6">{note.content}</p>
+        <p className="line-clamp-6">{note.preview}</p>
       </CardContent>
     </Card>
   );
@@ -71,12 +72,14 @@ const NoteCard = forwardRef(({ note }, ref) => {
 NoteCard.displayName = "NoteCard";
 
 // NoteGrid component
-const NoteGrid = ({ notes, lastNoteRef }) => (
+// Notes are listed in compact form, with a category id instead of the category
+const NoteGrid = ({ notes, categories, lastNoteRef }) => (
   <div className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-4">
     {notes.map((note, index) => (
       <NoteCard
         key={note.id}
         note={note}
+        category={categories.find((c) => c.id === note.category_id)}
         ref={index === notes.length - 1 ? lastNoteRef : null}
       />
     ))}
@@ -84,10 +87,16 @@ const NoteGrid = ({ notes, lastNoteRef }) => (
 );
 
 // MainContent component
-const MainContent = ({ notes, isLoading, nextPage, lastNoteRef }) => (
+const MainContent = ({
+  notes,
+  categories,
+  isLoading,
+  nextPage,
+  lastNoteRef,
+}) => (
   <main className="flex-grow p-8">
     {notes.length > 0 ? (
-      <NoteGrid notes={notes} />
+      <NoteGrid notes={notes} categories={categories} />
     ) : isLoading ? (
       <Skeleton className="h-full w-full" />
     ) : (
@@ -206,7 +215,8 @@ const NotesPage = () => {
       setIsLoadingNotes(true);
       try {
         let url =
-          nextPage || `${process.env.NEXT_PUBLIC_API_BASE_URL}/api/v1/notes/`;
+          nextPage ||
+          `${process.env.NEXT_PUBLIC_API_BASE_URL}/api/v1/notes/?compact=1`;
         if (categoryId) {
           const separator = url.includes("?") ? "&" : "?";
           url += `${separator}category_id=${categoryId}`;
@@ -280,6 +290,7 @@ const NotesPage = () => {
         />
         <MainContent
           notes={notes}
+          categories={categories}
           isLoading={isLoadingNotes || isCreating}
           nextPage={nextPage}
           lastNoteRef={lastNoteRef}
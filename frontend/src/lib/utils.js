@@ -19,3 +19,25 @@ export const formatDate = (date) => {
     });
     return `${formattedDate} at ${formattedTime}`;
 }
+
+// Returns a single edit operation that turns `base` into `text`. Positions
+// count Unicode code points, matching the notes delta API.
+export const diffText = (base, text) => {
+    const before = Array.from(base);
+    const after = Array.from(text);
+    let start = 0;
+    while (start < before.length && start < after.length && before[start] === after[start]) {
+        start++;
+    }
+    let endBefore = before.length;
+    let endAfter = after.length;
+    while (endBefore > start && endAfter > start && before[endBefore - 1] === after[endAfter - 1]) {
+        endBefore--;
+        endAfter--;
+    }
+    return {
+        position: start,
+        delete: endBefore - start,
+        insert: after.slice(start, endAfter).join(''),
+    };
+}